@@ -0,0 +1,86 @@
+"""
+Peak memory of encrypt() per mode of operation and payload size.
+
+Peak and retained memory are traced with tracemalloc, the peak is also
+given as a multiple of the payload. Blocks is the change of the number of
+allocated memory blocks (sys.getallocatedblocks) after the result is
+released; more than a few indicate a leak. Every configuration is run
+once before measuring, so caches are filled. The test suite checks the
+peak against a limit (tests/test_memory.py).
+
+Usage::
+
+    python benchmarks/bench_memory.py [--sizes 65536,1048576]
+"""
+
+import argparse
+import os
+import sys
+import tracemalloc
+
+import common
+from common import Identity, TEACipher
+
+from pep272_encryption import MODE_ECB, MODE_CBC, MODE_CFB, MODE_OFB, \
+    MODE_CTR
+from pep272_encryption.util import Counter
+
+
+def modes(block_size):
+    """Names, modes and functions returning fresh keyword arguments, as a
+    counter must not be shared by cipher objects."""
+    iv = b'\x00' * block_size
+    return [
+        ("ECB", MODE_ECB, lambda: {}),
+        ("CBC", MODE_CBC, lambda: {'IV': iv}),
+        ("CFB-8", MODE_CFB, lambda: {'IV': iv}),
+        ("CFB", MODE_CFB, lambda: {'IV': iv,
+                                   'segment_size': 8 * block_size}),
+        ("OFB", MODE_OFB, lambda: {'IV': iv}),
+        ("CTR", MODE_CTR, lambda: {'counter': Counter(block_size=block_size)}),
+    ]
+
+
+def run(create, data):
+    create().encrypt(data)
+    cipher = create()
+
+    blocks = sys.getallocatedblocks()
+    tracemalloc.start()
+    try:
+        cipher.encrypt(data)
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return peak, current, sys.getallocatedblocks() - blocks
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--sizes", default="65536,1048576",
+                        help="comma separated payload sizes in bytes")
+    args = parser.parse_args()
+
+    ciphers = [Identity, TEACipher]
+    if getattr(common, 'AESCipher', None) is not None:
+        ciphers.append(common.AESCipher)
+
+    print("cipher      mode     payload         peak     x  "
+          "retained  blocks")
+
+    for cipher_class in ciphers:
+        for size in map(int, args.sizes.split(",")):
+            data = os.urandom(size)
+            for name, mode, kwargs in modes(cipher_class.block_size):
+                def create():
+                    return cipher_class(b'k' * 16, mode, **kwargs())
+
+                peak, current, blocks = run(create, data)
+                print("{:11} {:7} {:8d} {:12d} {:5.2f} {:9d} {:7d}".format(
+                    cipher_class.__name__, name, size, peak, peak / size,
+                    current, blocks))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Throughput of every mode of operation, to compare builds.
+
+Run it once against the pure Python package and once against a build
+compiled with mypyc; the first line tells which one was imported::
+
+    python benchmarks/bench_modes.py
+    python setup.py build_ext --inplace --mypyc
+    python benchmarks/bench_modes.py
+
+The *Identity* cipher measures the overhead of the modes themselves, which
+is what compiling speeds up; *TEA* adds a pure Python block function.
+
+On PyPy, every mode is run a number of times before measuring, so the
+numbers show the warmed-up throughput of long-running processes rather
+than the interpreter before the JIT compiled the loops::
+
+    pypy3 benchmarks/bench_modes.py --warmup 50
+
+Usage::
+
+    python benchmarks/bench_modes.py [--size BYTES] [--repeat N] [--warmup N]
+"""
+
+import argparse
+import os
+import platform
+
+from common import Identity, TEACipher, measure, throughput
+
+import pep272_encryption
+from pep272_encryption import MODE_ECB, MODE_CBC, MODE_CFB, MODE_OFB, \
+    MODE_CTR, MODE_GCM, MODE_OCB
+from pep272_encryption.util import Counter, ENGINE
+
+#: Name, mode and keyword arguments (called with the block size).
+MODES = [
+    ("ECB", MODE_ECB, lambda size: {}),
+    ("CBC", MODE_CBC, lambda size: {'IV': b'\x00' * size}),
+    ("CFB-8", MODE_CFB, lambda size: {'IV': b'\x00' * size,
+                                      'segment_size': 8}),
+    ("CFB", MODE_CFB, lambda size: {'IV': b'\x00' * size,
+                                    'segment_size': size * 8}),
+    ("OFB", MODE_OFB, lambda size: {'IV': b'\x00' * size}),
+    ("CTR", MODE_CTR, lambda size: {
+        'counter': Counter(nonce=b'\x00' * (size // 2), block_size=size)}),
+    ("GCM", MODE_GCM, lambda size: {'nonce': b'\x00' * 12}),
+    ("OCB", MODE_OCB, lambda size: {'nonce': b'\x00' * 12}),
+]
+
+
+#: Unmeasured runs per mode by default, enough for the PyPy JIT.
+WARMUP = 20 if platform.python_implementation() == 'PyPy' else 0
+
+
+def build():
+    """Return which build of the package has been imported."""
+    path = pep272_encryption.__file__
+    return "pure Python" if path.endswith(('.py', '.pyc')) else \
+        "compiled ({})".format(os.path.basename(path))
+
+
+def run(cipher_class, mode, kwargs, data, repeat, warmup=0):
+    """Return the best time of *repeat* encryptions of *data*, after
+    *warmup* unmeasured ones."""
+    key = b'k' * 16
+
+    def encrypt():
+        cipher_class(key, mode, **kwargs(cipher_class.block_size)).encrypt(
+            data)
+
+    for _ in range(warmup):
+        encrypt()
+
+    return min(measure(encrypt) for _ in range(repeat))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--size", type=int, default=2**16,
+                        help="bytes encrypted per run")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="runs per mode, the best one counts")
+    parser.add_argument("--warmup", type=int, default=WARMUP,
+                        help="unmeasured runs per mode before (default: "
+                             "{})".format(WARMUP))
+    args = parser.parse_args()
+
+    data = os.urandom(args.size // 16 * 16)
+
+    print("Build: {}, xor engine: {}".format(build(), ENGINE))
+    print("Interpreter: {} {}, {} warm-up runs per mode".format(
+        platform.python_implementation(), platform.python_version(),
+        args.warmup))
+    print("mode      Identity          TEA")
+
+    for name, mode, kwargs in MODES:
+        rates = []
+        for cipher_class in (Identity, TEACipher):
+            if mode in (MODE_GCM, MODE_OCB) and cipher_class.block_size != 16:
+                rates.append("{:>13}".format("-"))
+                continue
+
+            size = len(data) // 8 if name == "CFB-8" else len(data)
+            seconds = run(cipher_class, mode, kwargs, data[:size],
+                          args.repeat, args.warmup)
+            rates.append(throughput(size, seconds))
+
+        print("{:<6} {}".format(name, " ".join(rates)))
+
+
+if __name__ == "__main__":
+    main()
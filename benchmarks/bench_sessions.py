@@ -0,0 +1,78 @@
+"""
+Memory per concurrent CTR and OFB stream: cipher objects and sessions.
+
+Creates *count* streams of one key, encrypts a few bytes with each, so
+every stream holds a partially used keystream block, and reports the
+memory traced by tracemalloc divided by the number of streams. Cipher
+objects are the regular ``PEP272Cipher`` instances, sessions are
+``pep272_encryption.session.Session`` objects sharing one ``SessionKey``.
+
+Usage::
+
+    python benchmarks/bench_sessions.py [--count 100000]
+"""
+
+import argparse
+import struct
+import tracemalloc
+
+import common
+from common import Identity
+
+from pep272_encryption import MODE_OFB, MODE_CTR
+from pep272_encryption.session import SessionKey
+from pep272_encryption.util import Counter
+
+
+def iv(n, block_size):
+    return struct.pack(">Q", n).rjust(block_size, b'\x00')
+
+
+def measure(create, count):
+    """Bytes per stream created by *create(n)*."""
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        streams = [create(n) for n in range(count)]
+        for stream in streams:
+            stream.encrypt(b'hello')
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+
+    return (after - before) / count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--count", type=int, default=100000,
+                        help="number of concurrent streams")
+    args = parser.parse_args()
+
+    cipher_class = getattr(common, 'AESCipher', Identity)
+    key = b'k' * 16
+    size = cipher_class.block_size
+
+    print("cipher      mode    streams  cipher object  session      x")
+
+    for name, mode in (("OFB", MODE_OFB), ("CTR", MODE_CTR)):
+        def cipher(n):
+            if mode == MODE_CTR:
+                return cipher_class(key, mode,
+                                    counter=Counter(IV=iv(n, size)))
+            return cipher_class(key, mode, iv(n, size))
+
+        keys = SessionKey(cipher_class, key, mode)
+
+        def session(n):
+            return keys.session(iv(n, size))
+
+        objects = measure(cipher, args.count)
+        sessions = measure(session, args.count)
+        print("{:11} {:7} {:7d} {:14.0f} {:8.0f} {:6.1f}".format(
+            cipher_class.__name__, name, args.count, objects, sessions,
+            objects / sessions))
+
+
+if __name__ == "__main__":
+    main()
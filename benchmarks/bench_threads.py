@@ -0,0 +1,67 @@
+"""
+Throughput of independent cipher objects in a growing number of threads.
+
+Every thread encrypts its own buffer with its own cipher object in CTR
+mode. With the GIL, pure Python ciphers do not get faster with more
+threads; on free-threaded builds (``python3.13t``) throughput should grow
+with the number of threads until the cores are saturated.
+
+Usage::
+
+    python benchmarks/bench_threads.py [--size BYTES] [--threads 1,2,4,8]
+"""
+
+import argparse
+import os
+import threading
+
+from common import TEACipher, gil_enabled, measure, throughput
+
+from pep272_encryption import MODE_CTR
+from pep272_encryption.util import Counter
+
+
+def run(threads, size):
+    barrier = threading.Barrier(threads + 1)
+    data = os.urandom(size)
+
+    def worker():
+        cipher = TEACipher(b'k' * 16, MODE_CTR,
+                           counter=Counter(nonce=os.urandom(4), block_size=8))
+        barrier.wait()
+        cipher.encrypt(data)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in workers:
+        thread.start()
+
+    def start_and_join():
+        barrier.wait()
+        for thread in workers:
+            thread.join()
+
+    return measure(start_and_join)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--size", type=int, default=2**17,
+                        help="bytes encrypted per thread")
+    parser.add_argument("--threads", default="1,2,4,8",
+                        help="comma separated thread counts")
+    args = parser.parse_args()
+
+    print("GIL enabled: {}, CPUs: {}".format(gil_enabled(), os.cpu_count()))
+    print("threads   throughput      speedup")
+
+    base = None
+    for threads in map(int, args.threads.split(",")):
+        seconds = run(threads, args.size)
+        rate = threads * args.size / seconds
+        base = base or rate
+        print("{:7d} {} {:8.2f}x".format(
+            threads, throughput(threads * args.size, seconds), rate / base))
+
+
+if __name__ == "__main__":
+    main()
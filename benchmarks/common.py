@@ -0,0 +1,96 @@
+"""
+Ciphers and helpers shared by the benchmarks.
+
+The benchmarks run against the source tree, so the package does not need
+to be installed.
+"""
+
+import os
+import struct
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir, 'src'))
+
+from pep272_encryption import PEP272Cipher  # noqa: E402
+
+try:
+    from Crypto.Cipher import AES
+except ImportError:  # pycryptodome is optional for benchmarks
+    AES = None
+
+
+class TEACipher(PEP272Cipher):
+    """TEA from the documentation, a block cipher in pure Python."""
+    block_size = 8
+
+    def encrypt_block(self, key, block, **kwargs):
+        v0, v1 = struct.unpack("!2L", block)
+        k = struct.unpack("!4L", key)
+        delta, mask, total = 0x9e3779b9, 0xffffffff, 0
+
+        for _ in range(32):
+            total = (total + delta) & mask
+            v0 = v0 + (((v1 << 4) + k[0]) ^ (v1 + total) ^
+                       ((v1 >> 5) + k[1])) & mask
+            v1 = v1 + (((v0 << 4) + k[2]) ^ (v0 + total) ^
+                       ((v0 >> 5) + k[3])) & mask
+
+        return struct.pack("!2L", v0, v1)
+
+    def decrypt_block(self, key, block, **kwargs):
+        v0, v1 = struct.unpack("!2L", block)
+        k = struct.unpack("!4L", key)
+        delta, mask = 0x9e3779b9, 0xffffffff
+        total = (delta * 32) & mask
+
+        for _ in range(32):
+            v1 = v1 - (((v0 << 4) + k[2]) ^ (v0 + total) ^
+                       ((v0 >> 5) + k[3])) & mask
+            v0 = v0 - (((v1 << 4) + k[0]) ^ (v1 + total) ^
+                       ((v1 >> 5) + k[1])) & mask
+            total = (total - delta) & mask
+
+        return struct.pack("!2L", v0, v1)
+
+
+class Identity(PEP272Cipher):
+    """Does not encrypt at all, measures the overhead of the modes."""
+    block_size = 16
+
+    def encrypt_block(self, key, block, **kwargs):
+        return block
+
+    def decrypt_block(self, key, block, **kwargs):
+        return block
+
+
+if AES is not None:
+    class AESCipher(PEP272Cipher):
+        """AES from pycryptodome, a block cipher implemented in C."""
+        block_size = 16
+
+        def encrypt_block(self, key, block, **kwargs):
+            return AES.new(key, AES.MODE_ECB).encrypt(block)
+
+        def decrypt_block(self, key, block, **kwargs):
+            return AES.new(key, AES.MODE_ECB).decrypt(block)
+
+
+def gil_enabled():
+    """Return if the GIL is enabled; always true before Python 3.13."""
+    check = getattr(sys, '_is_gil_enabled', None)
+    return True if check is None else check()
+
+
+def measure(function, *args):
+    """Return the wall clock time needed to call *function*."""
+    start = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start
+
+
+def throughput(size, seconds):
+    """Format a throughput in MB/s."""
+    return "{:8.2f} MB/s".format(size / seconds / 1e6)
@@ -1,38 +1,26 @@
-from abc import ABC
-
-from pep272_encryption import PEP272Cipher
-from pep272_encryption.util import split_blocks, xor_strings
+from pep272_encryption import PEP272Cipher, Mode, register_mode
+from pep272_encryption.util import xor_strings
 
 MODE_XEX = 500
 
 
-class XEXCipher(ABC, PEP272Cipher):
-    def __init__(self, key, mode, **kwargs):
-        self.key1 = kwargs.pop("key1", b'\x00' * self.block_size)
-        self.key2 = kwargs.pop("key2", b'\x00' * self.block_size)
-
-        PEP272Cipher.__init__(self, key, mode, **kwargs)
-
-    def encrypt(self, string):
-        if self.mode == MODE_XEX:
-            out = []
-            for block in split_blocks(string, self.block_size):
-                inner = xor_strings(block, self.key1)
-                encrypted = self.encrypt_block(self.key, inner, **self.kwargs)
-                outer = xor_strings(encrypted, self.key2)
-                out.append(outer)
-            return b"".join(out)
-        else:
-            PEP272Cipher.encrypt(self, string)
-
-    def decrypt(self, string):
-        if self.mode == MODE_XEX:
-            out = []
-            for block in split_blocks(string, self.block_size):
-                encrypted = xor_strings(block, self.key2)
-                inner = self.decrypt_block(self.key, encrypted, **self.kwargs)
-                plain = xor_strings(inner, self.key1)
-                out.append(plain)
-            return b"".join(out)
-        else:
-            PEP272Cipher.decrypt(self, string)
+def _whiten(cipher, blocks, decrypt, first):
+    name = "key1" if first != decrypt else "key2"
+    key = cipher.kwargs.get(name, b'\x00' * cipher.block_size)
+    return [xor_strings(block, key) for block in blocks]
+
+
+def _before(cipher, blocks, index, decrypt):
+    return _whiten(cipher, blocks, decrypt, True)
+
+
+def _after(cipher, blocks, index, decrypt):
+    return _whiten(cipher, blocks, decrypt, False)
+
+
+register_mode(MODE_XEX, Mode(Mode.BLOCKS, before=_before, after=_after,
+                             parallel=True))
+
+
+class XEXCipher(PEP272Cipher):
+    """Takes the keyword arguments `key1` and `key2` in MODE_XEX."""
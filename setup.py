@@ -5,6 +5,10 @@ Usage (pip):
 Usage (direct):
     setup.py build  # "Build" + Checkup
     setup.py install  # Installation
+
+Compiling the modules with mypyc (optional, needs mypy):
+    PEP272_ENCRYPTION_MYPYC=1 pip install .
+    setup.py bdist_wheel --mypyc
 """
 
 from setuptools import setup, Extension
@@ -15,9 +19,11 @@ from distutils.errors import (
     DistutilsPlatformError
 )
 
+import os
 import re
 import platform
 import sys
+import sysconfig
 import traceback
 
 EXCLUDE_EXTENSION_FLAG = '--exclude-extension'
@@ -32,8 +38,23 @@ BUILD_EXTENSION = not any((
     EXCLUDE_EXTENSION_FLAG in sys.argv
 ))
 
-if EXCLUDE_EXTENSION_FLAG in sys.argv:
-    sys.argv.pop(sys.argv.index(EXCLUDE_EXTENSION_FLAG))
+# Free-threaded builds (PEP 703) do not support the limited API.
+FREE_THREADING = bool(sysconfig.get_config_var("Py_GIL_DISABLED"))
+
+MYPYC_FLAG = '--mypyc'
+BUILD_MYPYC = BUILD_EXTENSION and (
+    MYPYC_FLAG in sys.argv or
+    os.environ.get('PEP272_ENCRYPTION_MYPYC') == '1')
+
+# Modules compiled by mypyc, from the same source as the pure Python ones.
+MYPYC_MODULES = [
+    'src/pep272_encryption/__init__.py',
+    'src/pep272_encryption/util.py',
+]
+
+for flag in (EXCLUDE_EXTENSION_FLAG, MYPYC_FLAG):
+    if flag in sys.argv:
+        sys.argv.pop(sys.argv.index(flag))
 
 
 def get_file(name):
@@ -62,6 +83,22 @@ def find_meta(meta):
     raise RuntimeError("Unable to find __{meta}__ string.".format(meta=meta))
 
 
+def mypyc_extensions():
+    """Extension modules built from MYPYC_MODULES, none if mypyc is
+    missing or cannot compile them."""
+    try:
+        from mypyc.build import mypycify
+        return mypycify(['--implicit-optional'] + MYPYC_MODULES)
+    except ImportError:
+        sys.stderr.write("Could not compile with mypyc - is mypy "
+                         "installed?\n")
+    except (Exception, SystemExit):  # noqa, mypyc exits on type errors
+        sys.stderr.write("Could not compile with mypyc, "
+                         "building without it.\n")
+        traceback.print_exc()
+    return []
+
+
 with open('README.rst') as description_file:
     long_description = description_file.read()
 
@@ -110,8 +147,10 @@ if BUILD_EXTENSION:
         Extension('pep272_encryption._fast_xor',
                   sources=['src/pep272_encryption/fast_xor.c'],
                   optional=True,
-                  py_limited_api=True)
+                  py_limited_api=not FREE_THREADING)
     ]
+    if BUILD_MYPYC:
+        n_args["ext_modules"] += mypyc_extensions()
 
     try:
         setup(**n_args)
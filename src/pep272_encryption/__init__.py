@@ -24,21 +24,31 @@ Example:
 
 """
 
+import hmac
+import os
+
 from abc import abstractmethod
+from functools import partial
+from itertools import islice
 
 try:
     from abc import ABC
 except ImportError:
     from abc import ABCMeta
-    ABC = ABCMeta('ABC', (object,), {})
+    ABC = ABCMeta('ABC', (object,), {})  # type: ignore
 
 try:
     from collections.abc import Mapping
 except ImportError:
-    from collections import Mapping
+    from collections import Mapping  # type: ignore
 
-from .util import xor_strings, b_chr, b_ord, split_blocks, Counter
-from .version import *  # noqa
+from .gcm import GHASH, ghash_tables
+from . import nonceguard, ocb
+from .util import xor_strings, b_chr, b_ord, split_blocks, Counter, \
+    KeyCache, BlockCache, from_bytes, to_bytes
+from .util import mypyc_attr
+from .version import __version__, __author__, __email__, __license__, \
+    __url__
 
 
 MODE_ECB = 1  #:
@@ -47,8 +57,126 @@ MODE_CFB = 3  #:
 MODE_PGP = 4  #:
 MODE_OFB = 5  #:
 MODE_CTR = 6  #:
+MODE_GCM = 11  #:
+MODE_OCB = 12  #:
+
+MODES_AEAD = (MODE_GCM, MODE_OCB)
+
+#: Modes that can be handed to `PEP272Cipher.native_mode()`.
+MODES_NATIVE = (MODE_ECB, MODE_CBC, MODE_CFB, MODE_OFB, MODE_CTR)
+
+#: Number of blocks passed to `encrypt_blocks()` and `decrypt_blocks()` at
+#: once in ECB mode, bounding the number of block objects alive.
+BATCH_BLOCKS = 1024
+
+#: Material derived from keys, shared by all cipher objects.
+_key_cache = KeyCache()
+
+#: Modes added with `register_mode()`, by number.
+_modes = {}  # type: dict
+
+
+@mypyc_attr(native_class=False)
+class Mode(object):
+    """A mode of operation declared in terms of the engines behind the
+    built-in modes, for `register_mode()`.
+
+    *engine* is one of:
+
+    `Mode.BLOCKS`
+        Independent blocks, like *ECB*: batches of blocks go through
+        *before*, `encrypt_blocks()` (or `decrypt_blocks()`) and *after*.
+        Both are called as ``function(cipher, blocks, index, decrypt)``
+        with a list of blocks and the number of blocks processed before,
+        and return a list of blocks. With *parallel*,
+        :py:mod:`pep272_encryption.parallel` may split the input over cipher
+        objects in worker interpreters, each starting at the *index* of its
+        slice. The mode must then be registered on import of the module of
+        the cipher class.
+
+    `Mode.CHAINED`
+        Blocks depending on the previous ones, like *CBC*: *chain* is
+        called as ``chain(cipher, block, decrypt)`` for every block and
+        returns the output block; the chaining value is kept by the cipher
+        object, e.g. in ``cipher.IV``.
+
+    `Mode.KEYSTREAM`
+        A keystream is xored with the data, like *OFB* and *CTR*: *keystream*
+        is called as ``keystream(cipher, count)`` and returns the next
+        *count* keystream blocks. Data can have any length, decryption is
+        the same as encryption.
+
+    :param str engine: See above.
+    :param callable before: Transforms blocks before the block function.
+    :param callable after: Transforms blocks after the block function.
+    :param callable chain: Processes one block of a chained mode.
+    :param callable keystream: Creates keystream blocks.
+    :param bool parallel: If independent blocks can be processed in any
+        order, by different cipher objects.
+    :param bool iv: If the mode requires an IV of *block_size*.
+    """
+
+    BLOCKS = 'blocks'  #:
+    CHAINED = 'chained'  #:
+    KEYSTREAM = 'keystream'  #:
+
+    def __init__(self, engine, before=None, after=None, chain=None,
+                 keystream=None, parallel=False, iv=False):
+        required = {Mode.BLOCKS: True, Mode.CHAINED: chain,
+                    Mode.KEYSTREAM: keystream}
+        if engine not in required:
+            raise ValueError("Unknown engine {!r}".format(engine))
+        if required[engine] is None:
+            raise TypeError("The {} engine requires '{}'".format(
+                engine, engine == Mode.CHAINED and 'chain' or 'keystream'))
+
+        self.engine = engine
+        self.before = before
+        self.after = after
+        self.chain = chain
+        self.keystream = keystream
+        self.parallel = parallel and engine == Mode.BLOCKS
+        self.iv = iv
+
+
+def register_mode(mode, declaration):
+    """Add a mode of operation to all cipher classes.
+
+    Cipher objects created with the number *mode* run it through the same
+    engines as the built-in modes, including batching, `encrypt_into()`
+    and :py:mod:`pep272_encryption.parallel`.
+
+    :param int mode: The number passed as *mode* to cipher classes.
+    :param Mode declaration: How the mode is processed.
+    :raises ValueError: If the number is used by another mode."""
+    if mode in (MODE_ECB, MODE_CBC, MODE_CFB, MODE_PGP, MODE_OFB, MODE_CTR,
+                MODE_GCM, MODE_OCB) or mode in _modes:
+        raise ValueError("Mode {} is registered already".format(mode))
+
+    _modes[mode] = declaration
+
 
+def unregister_mode(mode):
+    """Remove a mode added with `register_mode()`.
 
+    :raises KeyError: If it has not been registered."""
+    del _modes[mode]
+
+
+def _function(method):
+    """The function of a method, also for unbound methods of Python 2."""
+    return getattr(method, '__func__', method)
+
+
+def _iv(cipher):
+    """`PEP272Cipher.IV`, outside of the class for mypyc."""
+    if cipher.mode in (MODE_ECB, MODE_CTR) + MODES_AEAD:
+        return None
+    else:
+        return cipher._status
+
+
+@mypyc_attr(native_class=False)
 class PEP272Cipher(ABC):
     """
     A cipher class as defined in PEP-272_.
@@ -86,6 +214,24 @@ class PEP272Cipher(ABC):
             from :py:mod:`Crypto.Util.Counter`. For security reasons the
             counter output must **never** repeat. Required for *CTR* mode.
 
+        *
+            **nonce** (`bytes`): A value that must never be reused for the
+            same key. *GCM* and *OCB* only, defaults to 16 (*GCM*) or 15
+            (*OCB*, also the maximum) random bytes. The *IV* argument is
+            accepted as an alternative.
+
+        *
+            **mac_len** (`int`): Length of the authentication tag in bytes,
+            up to 16 (the default). At least 4 for *GCM* and 8 for *OCB*.
+
+        *
+            **block_cache** (`int` or
+            :py:class:`~pep272_encryption.util.BlockCache`): Enables a cache
+            of this many blocks (or the given cache) in front of the block
+            cipher, so repeated blocks are only encrypted once. Optional,
+            *ECB* only. Only use it on data, where revealing equal blocks
+            is acceptable anyway; ECB already does.
+
         *
             Additional keyword arguments are passed to the underlying block
             cipher implementation as kwargs.
@@ -98,6 +244,21 @@ class PEP272Cipher(ABC):
        PyCryptodome counters are accepted for *counter* in addition to
        to callables.
 
+    .. versionadded:: 0.4
+       *GCM* and *OCB* modes of operation.
+
+    Cipher objects do not share mutable state, except a lock protected
+    cache of material derived from keys. Different objects can be used
+    from different threads in parallel, also on free-threaded Python
+    builds. A single object is stateful and must not be used by multiple
+    threads at the same time.
+
+    Cipher objects can be pickled, e.g. to hand them to a worker process or
+    to checkpoint a long stream, if *key*, *counter* and keyword arguments
+    can. The pickle holds the state of the mode of operation, including the
+    position within the current keystream block; tables derived from the
+    key are recomputed on load.
+
 
     .. _PEP-272: https://www.python.org/dev/peps/pep-0272/
 
@@ -105,17 +266,8 @@ class PEP272Cipher(ABC):
 
     block_size = NotImplemented
 
-    @property
-    def IV(self):
-        if self.mode in (MODE_ECB, MODE_CTR):
-            return None
-        else:
-            return self._status
-
-    @IV.setter
-    def IV(self, value):
-        raise AttributeError("This property is read-only, and cannot be "
-                             "assigned a new value")
+    #: The IV, or the last ciphertext block in chaining modes.
+    IV = property(_iv)
 
     def __init__(self, key, mode, IV=None, **kwargs):
         "A cipher class as defined in PEP-272"
@@ -128,11 +280,93 @@ class PEP272Cipher(ABC):
 
         self.segment_size = kwargs.pop('segment_size', -1)
         self._counter = kwargs.pop('counter', None)
+        self.block_cache = kwargs.pop('block_cache', None)
+
+        if self.mode in MODES_AEAD:
+            self.nonce = kwargs.pop('nonce', None) or self._status
+            self.mac_len = kwargs.pop('mac_len', 16)
+            self._status = None
 
         self.kwargs = kwargs
 
         self._check_arguments()
-        self._keystream = self._create_keystream()
+
+        if self.mode == MODE_GCM:
+            self._init_gcm()
+        elif self.mode == MODE_OCB:
+            self._init_ocb()
+
+        # Keystream modes: the current keystream block, and how much of it
+        # has been used.
+        self._keystream_block = b""
+        self._keystream_offset = 0
+
+        # Modes of the block engine from register_mode(): blocks processed.
+        self._mode_index = 0
+
+        # Calls are handed to native_mode() until it declines once.
+        self._native = (
+            self.mode in MODES_NATIVE and self.block_cache is None and
+            _function(type(self).native_mode) is not
+            _function(PEP272Cipher.native_mode) and
+            (self.mode != MODE_CTR or isinstance(self._counter, Counter)))
+
+        # Registered on the first call to encrypt(), see nonceguard.
+        self._guard_nonce = None
+        if nonceguard.registry is not None:
+            self._guard_nonce = self._nonce()
+
+    def __getstate__(self):
+        """Returns the state for pickling: key, parameters and the state of
+        the mode of operation, including the position in the keystream.
+
+        Material derived from the key alone, like the GHASH and OCB tables,
+        is left out and derived again (or taken from the cache) on load."""
+        state = self.__dict__.copy()
+        state.pop('_ocb_tables', None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+
+        if self.mode == MODE_GCM:
+            self._ghash._tables = self._ghash_tables()
+        elif self.mode == MODE_OCB:
+            self._ocb_tables = self._ocb_key_tables()
+            self._ocb_hash._tables = self._ocb_tables
+            self._ocb_hash._transform = self._encipher_blocks
+
+    def _nonce(self):
+        """Returns the IV, nonce or first counter block, that must not be
+        used again with the same key, or None.
+
+        A counter with a nonce is represented by its nonce and suffix, as
+        counters of the same nonce overlap, whatever their initial value."""
+        if self.mode in (MODE_CBC, MODE_CFB, MODE_OFB, MODE_PGP) or (
+                self.mode in _modes and _modes[self.mode].iv):
+            return bytes(self._status)
+
+        if self.mode in MODES_AEAD:
+            return bytes(self.nonce)
+
+        counter = self._counter
+        if self.mode == MODE_CTR and isinstance(counter, Counter) and \
+                not getattr(counter, '_registered', True):
+            if counter.nonce:
+                return bytes(counter.nonce) + bytes(counter.suffix)
+            return counter._format(counter.value)
+
+        return None
+
+    def _register_nonce(self):
+        nonce, self._guard_nonce = self._guard_nonce, None
+        registry = nonceguard.registry
+
+        if registry is not None:
+            cls = type(self)
+            scope = "{}.{}".format(cls.__module__, getattr(
+                cls, '__qualname__', cls.__name__)).encode('utf-8')
+            registry.check(scope, self.key, nonce)
 
     def _check_iv(self):
         if self._status is None:
@@ -185,6 +419,24 @@ class PEP272Cipher(ABC):
 
         raise TypeError("counter must be a callable, it is not")
 
+    def _check_aead(self):
+        if self.block_size != 16:
+            raise ValueError("AEAD modes require a block_size of 16")
+
+        max_nonce, min_mac = (16, 4) if self.mode == MODE_GCM else (15, 8)
+
+        if self.nonce is None:
+            self.nonce = os.urandom(max_nonce)
+        elif not self.nonce:
+            raise ValueError("'nonce' cannot have a length of 0")
+        elif self.mode == MODE_OCB and len(self.nonce) > max_nonce:
+            raise ValueError("'nonce' cannot be longer than {} bytes".format(
+                max_nonce))
+
+        if not min_mac <= self.mac_len <= 16:
+            raise ValueError("'mac_len' must be between {} and 16".format(
+                min_mac))
+
     def _check_arguments(self):
         """
         Checks if all required keyword arguments have been set.
@@ -192,8 +444,11 @@ class PEP272Cipher(ABC):
         Tests for:
             - IV when using MODE_CBC, MODE_CFB, MODE_OFB
             - callable counter with MODE_CTR
+            - block size, nonce and tag length with MODE_GCM, MODE_OCB
+            - block cache only with MODE_ECB
         """
-        if self.mode in (MODE_CBC, MODE_CFB, MODE_OFB, MODE_PGP):
+        if self.mode in (MODE_CBC, MODE_CFB, MODE_OFB, MODE_PGP) or (
+                self.mode in _modes and _modes[self.mode].iv):
             self._check_iv()
 
         if self.mode == MODE_CFB:
@@ -202,7 +457,93 @@ class PEP272Cipher(ABC):
         if self.mode == MODE_CTR:
             self._check_counter()
 
-    def encrypt(self, string):
+        if self.mode in MODES_AEAD:
+            self._check_aead()
+
+        if self.block_cache is not None:
+            self._check_block_cache()
+
+    def _check_block_cache(self):
+        if self.mode != MODE_ECB:
+            raise TypeError("'block_cache' is only supported in ECB mode")
+
+        if not isinstance(self.block_cache, BlockCache):
+            self.block_cache = BlockCache(self.block_cache)
+        self.block_cache._bind((type(self), bytes(self.key),
+                                sorted(self.kwargs.items())))
+
+    def _key_material(self, name, factory):
+        """Returns material precomputed from the key, like tables or
+        subkeys. It is shared between all cipher objects of the same class,
+        key and keyword arguments."""
+        try:
+            cache_key = (type(self), name, self.key,
+                         tuple(sorted(self.kwargs.items())))
+            hash(cache_key)
+        except TypeError:  # e.g. a bytearray key
+            return factory()
+
+        return _key_cache.get(cache_key, factory)
+
+    def _ghash_tables(self):
+        """Multiplication tables of the hash subkey, cached per key."""
+        return self._key_material("ghash", partial(self._zero_block_tables,
+                                                   ghash_tables))
+
+    def _ocb_key_tables(self):
+        """L_*, L_$ and L_i of OCB, cached per key."""
+        return self._key_material("ocb", partial(self._zero_block_tables,
+                                                 ocb.ocb_tables))
+
+    def _zero_block_tables(self, function):
+        """Applies *function* to the encrypted zero block."""
+        return function(self.encrypt_block(self.key, b'\x00' * 16,
+                                           **self.kwargs))
+
+    def _encipher_blocks(self, blocks):
+        """Encrypts a batch of blocks with the key of this object."""
+        return self.encrypt_blocks(self.key, blocks, **self.kwargs)
+
+    def _init_gcm(self):
+        """Derives hash subkey, pre-counter block and counter for GCM."""
+        tables = self._ghash_tables()
+
+        if len(self.nonce) == 12:
+            j0 = self.nonce + b'\x00\x00\x00\x01'
+        else:
+            nonce_hash = GHASH(tables)
+            nonce_hash.update(self.nonce)
+            nonce_hash.flush()
+            nonce_hash.update(b'\x00' * 8 +
+                              to_bytes(len(self.nonce) * 8, 8, 'big'))
+            j0 = nonce_hash.digest()
+
+        self._tag_mask = self.encrypt_block(self.key, j0, **self.kwargs)
+        self._counter = Counter(  # inc32: only the last 32 bits count
+            nonce=j0[:12],
+            initial_value=(from_bytes(j0[12:], 'big') + 1) & 0xffffffff,
+            block_size=16)
+
+        self._ghash = GHASH(tables)
+        self._aad_length = self._data_length = 0
+        self._data_started = False
+        self._tag = None
+
+    def _init_ocb(self):
+        """Derives the offset sequence and the initial offset for OCB."""
+        self._ocb_tables = self._ocb_key_tables()
+
+        self._offset = ocb.initial_offset(
+            partial(self.encrypt_block, self.key, **self.kwargs),
+            self.nonce, self.mac_len)
+        self._checksum = self._block_index = 0
+        self._ocb_buffer = bytearray()
+
+        self._ocb_hash = ocb.OCBHash(self._encipher_blocks, self._ocb_tables)
+        self._data_started = self._finished = False
+        self._tag = None
+
+    def encrypt(self, string=None):
         """Encrypt data with the key and the parameters set at initialization.
 
         The cipher object is stateful; encryption of a long block
@@ -226,7 +567,12 @@ class PEP272Cipher(ABC):
          - For `MODE_CFB`, *string* length (in bytes) must be a multiple
            of *segment_size*/8.
 
-         - For `MODE_CTR` and `MODE_OFB`, *string* can be of any length.
+         - For `MODE_CTR`, `MODE_OFB`, `MODE_GCM` and `MODE_OCB`, *string*
+           can be of any length.
+
+        `MODE_OCB` holds back incomplete blocks, the output can be shorter
+        than *string*. Call it without *string* to finish encryption and
+        get the rest of the ciphertext.
 
         :param bytes string: The piece of data to encrypt.
         :raises ValueError:
@@ -236,36 +582,48 @@ class PEP272Cipher(ABC):
         :raises TypeError:
             When the counter callable in CTR returns data with the wrong
             length.
+        :raises pep272_encryption.nonceguard.NonceReuseError:
+            On the first call, when the IV or nonce has been used before
+            and a nonce registry is installed.
 
         :return:
             The encrypted data, as a byte string. It is as long as
-            *string*.
+            *string* (except for `MODE_OCB`).
         :rtype: bytes
         """
+        if self._guard_nonce is not None:
+            self._register_nonce()
+
+        if self._native:
+            out = self._encrypt_native(string, False)
+            if out is not None:
+                return out
+
         if self.mode in (MODE_OFB, MODE_CTR):
             return self._encrypt_with_keystream(string)
 
         if self.mode == MODE_CFB:
             return self._encrypt_cfb(string)
 
-        if self.mode not in (MODE_ECB, MODE_CBC):
-            raise ValueError("Unknown mode of operation")
+        if self.mode == MODE_GCM:
+            return self._encrypt_gcm(string)
 
-        out = []
+        if self.mode == MODE_OCB:
+            return self._encrypt_ocb(string)
 
-        for block in split_blocks(string, self.block_size):
-            if self.mode == MODE_ECB:
-                ecd = self.encrypt_block(self.key, block, **self.kwargs)
-            else:  # self.mode == MODE_CBC
-                xored = xor_strings(self._status, block)
-                ecd = self._status = self.encrypt_block(self.key, xored,
-                                                        **self.kwargs)
+        if self.mode == MODE_ECB:
+            return self._encrypt_batches(self.encrypt_blocks, string, 0)
 
-            out.append(ecd)
+        declaration = _modes.get(self.mode)
+        if declaration is not None:
+            return self._encrypt_registered(declaration, string, False)
 
-        return b"".join(out)
+        if self.mode != MODE_CBC:
+            raise ValueError("Unknown mode of operation")
+
+        return self._encrypt_cbc(string)
 
-    def decrypt(self, string):
+    def decrypt(self, string=None):
         """Decrypt data with the key and the parameters set at initialization.
 
         The cipher object is stateful; decryption of a long block
@@ -289,7 +647,12 @@ class PEP272Cipher(ABC):
          - For `MODE_CFB`, *string* length (in bytes) must be a multiple
            of *segment_size*/8.
 
-         - For `MODE_CTR` and `MODE_OFB`, *string* can be of any length.
+         - For `MODE_CTR`, `MODE_OFB`, `MODE_GCM` and `MODE_OCB`, *string*
+           can be of any length.
+
+        `MODE_OCB` holds back incomplete blocks, the output can be shorter
+        than *string*. Call it without *string* to finish decryption and
+        get the rest of the plaintext.
 
         :param bytes string: The piece of data to decrypt.
         :raises ValueError:
@@ -301,33 +664,358 @@ class PEP272Cipher(ABC):
 
         :return:
             The decrypted data, as a byte string. It is as long as
-            *string*.
+            *string* (except for `MODE_OCB`).
         :rtype: bytes
         """
         if self.mode in (MODE_OFB, MODE_CTR):
-            return self.encrypt(string)
+            if self._guard_nonce is None:
+                return self.encrypt(string)
+
+            # Decryption does not register the nonce, see nonceguard.
+            guard, self._guard_nonce = self._guard_nonce, None
+            try:
+                return self.encrypt(string)
+            finally:
+                self._guard_nonce = guard
+
+        if self._native:
+            out = self._encrypt_native(string, True)
+            if out is not None:
+                return out
 
         if self.mode == MODE_CFB:
             return self._encrypt_cfb(string, True)
 
-        if self.mode not in (MODE_ECB, MODE_CBC):
+        if self.mode == MODE_GCM:
+            return self._encrypt_gcm(string, True)
+
+        if self.mode == MODE_OCB:
+            return self._encrypt_ocb(string, True)
+
+        if self.mode == MODE_ECB:
+            return self._encrypt_batches(self.decrypt_blocks, string, 1)
+
+        declaration = _modes.get(self.mode)
+        if declaration is not None:
+            return self._encrypt_registered(declaration, string, True)
+
+        if self.mode != MODE_CBC:
             raise ValueError("Unknown mode of operation")
 
-        out = []
+        return self._encrypt_cbc(string, True)
 
-        for block in split_blocks(string, self.block_size):
-            if self.mode == MODE_ECB:
-                dec = self.decrypt_block(self.key, block, **self.kwargs)
-            else:  # self.mode == MODE_CBC
-                decrypted_but_not_xored = self.decrypt_block(self.key,
-                                                             block,
-                                                             **self.kwargs)
-                dec = xor_strings(self._status, decrypted_but_not_xored)
-                self._status = block
+    def encrypt_into(self, string, out):
+        """Encrypt data like `encrypt()`, but write the ciphertext to the
+        writable buffer *out* instead of returning a new byte string.
 
-            out.append(dec)
+        With buffers from a :py:class:`~pep272_encryption.util.BufferPool`,
+        a long-running process encrypts without allocating an output
+        buffer per call:
 
-        return b"".join(out)
+            >>> with pool.buffer(len(data)) as out:
+            ...     c.encrypt_into(data, out)
+            ...     sock.sendall(out)
+
+        *ECB*, *CBC*, *CFB*, *OFB*, *CTR* and *GCM* write into *out*
+        directly; *OCB* and objects delegating to `native_mode()` copy
+        their result.
+
+        :param bytes string: The piece of data to encrypt.
+        :param out: A writable buffer (e.g. `bytearray`), at least as long
+            as the output.
+        :raises ValueError: When *out* is too short, or as `encrypt()`.
+        :return: The number of bytes written.
+        :rtype: int"""
+        return self._crypt_into(string, out, False)
+
+    def decrypt_into(self, string, out):
+        """Decrypt data like `decrypt()`, but write the plaintext to the
+        writable buffer *out*. See `encrypt_into()`.
+
+        :param bytes string: The piece of data to decrypt.
+        :param out: A writable buffer, at least as long as the output.
+        :raises ValueError: When *out* is too short, or as `decrypt()`.
+        :return: The number of bytes written.
+        :rtype: int"""
+        return self._crypt_into(string, out, True)
+
+    def _crypt_into(self, data, out, decrypt):
+        view = memoryview(out)
+        if view.readonly:
+            raise TypeError("'out' must be a writable buffer")
+
+        direct = not self._native and data is not None and (self.mode in (
+            MODE_ECB, MODE_CBC, MODE_CFB, MODE_OFB, MODE_CTR, MODE_GCM) or
+            self.mode in _modes)
+
+        if not direct:
+            result = (self.decrypt if decrypt else self.encrypt)(data)
+            if len(result) > len(view):
+                raise ValueError("'out' is too short, {} bytes are "
+                                 "needed".format(len(result)))
+            view[:len(result)] = result
+            return len(result)
+
+        if len(data) > len(view):
+            raise ValueError("'out' is too short, {} bytes are "
+                             "needed".format(len(data)))
+
+        if not decrypt and self._guard_nonce is not None:
+            self._register_nonce()
+
+        target = view[:len(data)]
+
+        if self.mode in _modes:
+            self._encrypt_registered(_modes[self.mode], data, decrypt, target)
+        elif self.mode in (MODE_OFB, MODE_CTR):
+            self._encrypt_with_keystream(data, target)
+        elif self.mode == MODE_CFB:
+            self._encrypt_cfb(data, decrypt, target)
+        elif self.mode == MODE_GCM:
+            self._encrypt_gcm(data, decrypt, target)
+        elif self.mode == MODE_ECB:
+            self._encrypt_batches(
+                self.decrypt_blocks if decrypt else self.encrypt_blocks,
+                data, int(decrypt), target)
+        else:
+            self._encrypt_cbc(data, decrypt, target)
+
+        return len(data)
+
+    def iterencrypt(self, chunks):
+        """Encrypt an iterable of data chunks of any size.
+
+        Ciphertext is yielded as soon as complete blocks (or segments in
+        `MODE_CFB`) are available; the rest is carried over to the next
+        chunk. At most one incomplete block is kept, so arbitrarily long
+        streams can be encrypted:
+
+            >>> for piece in c.iterencrypt(socket_chunks):
+            ...     out.write(piece)
+
+        The stream must end with a complete block for `MODE_ECB`,
+        `MODE_CBC` and `MODE_CFB`. In `MODE_OCB` encryption is finished
+        when *chunks* is exhausted.
+
+        :param chunks: An iterable of byte strings.
+        :raises ValueError:
+            When the total length is not a multiple of the block size,
+            as described in `encrypt()`.
+        :return: A generator of ciphertext pieces.
+        """
+        return self._iter_crypt(chunks, self.encrypt)
+
+    def iterdecrypt(self, chunks):
+        """Decrypt an iterable of data chunks of any size.
+
+        See `iterencrypt()`.
+
+        :param chunks: An iterable of byte strings.
+        :raises ValueError:
+            When the total length is not a multiple of the block size,
+            as described in `decrypt()`.
+        :return: A generator of plaintext pieces.
+        """
+        return self._iter_crypt(chunks, self.decrypt)
+
+    def _unit_size(self):
+        """Returns the length input of `encrypt()` must be a multiple of."""
+        if self.mode in (MODE_ECB, MODE_CBC):
+            return self.block_size
+        if self.mode == MODE_CFB:
+            return self.segment_size // 8
+        if self.mode in _modes and \
+                _modes[self.mode].engine != Mode.KEYSTREAM:
+            return self.block_size
+        return 1
+
+    def _iter_crypt(self, chunks, function):
+        """Applies *function* to complete units of *chunks*."""
+        unit = self._unit_size()
+        carry = bytearray()
+
+        for chunk in chunks:
+            if unit == 1:
+                out = function(chunk)
+                if out:
+                    yield out
+                continue
+
+            view = memoryview(chunk)
+            start = 0
+
+            if carry:
+                start = min(unit - len(carry), len(view))
+                carry += view[:start]
+                if len(carry) < unit:
+                    continue
+                yield function(bytes(carry))
+                del carry[:]
+
+            end = start + (len(view) - start) // unit * unit
+            if end > start:
+                yield function(view[start:end].tobytes())
+
+            carry += view[end:]
+
+        if carry:
+            function(bytes(carry))  # raises the usual ValueError
+
+        if self.mode == MODE_OCB:
+            out = function()
+            if out:
+                yield out
+
+    def update(self, assoc_data):
+        """Authenticate associated data, that is not encrypted.
+
+        Only available for AEAD modes (`MODE_GCM`, `MODE_OCB`). It can be
+        called multiple times, but only before `encrypt()` or `decrypt()`.
+
+        :param bytes assoc_data: The piece of associated data.
+        :raises TypeError: When called after encryption has started or
+            in a mode without authentication."""
+        self._check_aead_phase("update()")
+
+        if self._data_started:
+            raise TypeError("update() can only be called before "
+                            "encrypt() or decrypt()")
+
+        if self.mode == MODE_GCM:
+            self._ghash.update(assoc_data)
+            self._aad_length += len(assoc_data)
+        else:
+            self._ocb_hash.update(assoc_data)
+
+    def digest(self):
+        """Compute the authentication tag of all data processed so far.
+
+        After calling it, no more data can be encrypted or decrypted.
+
+        :return: The tag, *mac_len* bytes long.
+        :rtype: bytes
+        :raises TypeError: In `MODE_OCB`, if `encrypt()` or `decrypt()`
+            still hold back data."""
+        self._check_aead_mode("digest()")
+
+        if self._tag is None and self.mode == MODE_GCM:
+            self._ghash.flush()
+            self._ghash.update(to_bytes(self._aad_length * 8, 8, 'big') +
+                               to_bytes(self._data_length * 8, 8, 'big'))
+            self._tag = xor_strings(self._ghash.digest(),
+                                    self._tag_mask)[:self.mac_len]
+
+        elif self._tag is None:  # self.mode == MODE_OCB
+            if self._ocb_buffer:
+                raise TypeError("digest() requires encryption or decryption"
+                                " to be finished, call it without data")
+
+            tag = self.encrypt_block(self.key, to_bytes(
+                self._checksum ^ self._offset ^ self._ocb_tables[1],
+                16, 'big'), **self.kwargs)
+            self._tag = to_bytes(from_bytes(tag, 'big') ^
+                                 self._ocb_hash.digest(),
+                                 16, 'big')[:self.mac_len]
+
+        return self._tag
+
+    def verify(self, received_mac_tag):
+        """Check the authentication tag of all data processed so far.
+
+        :param bytes received_mac_tag: The expected tag.
+        :raises ValueError: When the tag does not match."""
+        if not hmac.compare_digest(self.digest(), received_mac_tag):
+            raise ValueError("MAC check failed")
+
+    def encrypt_and_digest(self, plaintext):
+        """Encrypt *plaintext* and compute the tag in one step.
+
+        :param bytes plaintext: The last piece of data to encrypt.
+        :return: ciphertext and tag
+        :rtype: tuple"""
+        ciphertext = self.encrypt(plaintext)
+        if self.mode == MODE_OCB:
+            ciphertext += self.encrypt()
+        return ciphertext, self.digest()
+
+    def decrypt_and_verify(self, ciphertext, received_mac_tag):
+        """Decrypt *ciphertext* and check the tag in one step.
+
+        :param bytes ciphertext: The last piece of data to decrypt.
+        :param bytes received_mac_tag: The expected tag.
+        :raises ValueError: When the tag does not match.
+        :return: The plaintext.
+        :rtype: bytes"""
+        plaintext = self.decrypt(ciphertext)
+        if self.mode == MODE_OCB:
+            plaintext += self.decrypt()
+        self.verify(received_mac_tag)
+        return plaintext
+
+    def _check_aead_mode(self, method):
+        if self.mode not in MODES_AEAD:
+            raise TypeError("{} is only available in AEAD modes".format(
+                method))
+
+    def _check_aead_phase(self, method):
+        self._check_aead_mode(method)
+
+        if self._tag is not None:
+            raise TypeError("{} cannot be called after the tag has been "
+                            "computed".format(method))
+
+    def encrypt_blocks(self, key, blocks, **kwargs):
+        """Encrypt multiple independent blocks.
+
+        Used by modes of operation where blocks do not depend on each other
+        (*ECB*, *OCB*). Overwrite it to process a whole batch at once, e.g.
+        with a vectorized or parallel implementation.
+
+        :param bytes key: The symmetric encryption key.
+        :param blocks: An iterable of plaintext blocks.
+        :param \\**kwargs: Additional parameters passed to `__init__`.
+
+        :returns: list of ciphertext blocks
+        :rtype: list"""
+        return [self.encrypt_block(key, block, **kwargs) for block in blocks]
+
+    def decrypt_blocks(self, key, blocks, **kwargs):
+        """Decrypt multiple independent blocks.
+
+        See :py:meth:`encrypt_blocks`.
+
+        :param bytes key: The symmetric encryption key.
+        :param blocks: An iterable of ciphertext blocks.
+        :param \\**kwargs: Additional parameters passed to `__init__`.
+
+        :returns: list of plaintext blocks
+        :rtype: list"""
+        return [self.decrypt_block(key, block, **kwargs) for block in blocks]
+
+    def native_mode(self, key, mode, params, **kwargs):
+        """Create an object running a whole mode of operation in an
+        underlying library, e.g. ``AES.new(key, AES.MODE_CBC, iv=...)``.
+
+        Overwrite it, if the block function wraps a library that implements
+        the modes itself. Every call of `encrypt()` or `decrypt()` creates
+        a new object starting from the current state, so the cipher object
+        keeps its state (and *IV*) as if the generic engine had been used.
+        In *OFB* and *CTR* mode only whole blocks are delegated. Return
+        None to decline; the generic engine is then used for all further
+        calls. It is never called with a *block_cache*.
+
+        :param bytes key: The symmetric encryption key.
+        :param int mode: One of `MODES_NATIVE`.
+        :param dict params: *IV* for *CBC*, *CFB* and *OFB*, and
+            *segment_size* for *CFB*. For *CTR*, *counter* is a
+            :py:class:`~pep272_encryption.util.Counter` with the values
+            to use, see its *nonce*, *value*, *suffix* and *endian*
+            attributes.
+        :param \\**kwargs: Additional parameters passed to `__init__`.
+
+        :returns: An object with `encrypt()` and `decrypt()`, or None.
+        """
+        return None
 
     @abstractmethod
     def encrypt_block(self, key, block, **kwargs):
@@ -359,44 +1047,392 @@ class PEP272Cipher(ABC):
         :rtype: bytes"""
         raise NotImplementedError
 
-    def _encrypt_with_keystream(self, data):
-        """Encrypts data with the set keystream."""
-        xor = [x ^ y for (x, y) in zip(map(b_ord, data),
-                                       self._keystream)]
-        return bytes(bytearray(xor))  # Faster
+    def _encrypt_with_keystream(self, data, out=None):
+        """Encrypts data with the keystream, starting with the unused rest
+        of the current keystream block. Writes to *out* instead of
+        returning the result, if given."""
+        size = self.block_size
+        view = memoryview(data)
+        offset = self._keystream_offset
+        target = bytearray(len(view)) if out is None else out
+
+        start = min(len(view), len(self._keystream_block) - offset)
+        target[:start] = xor_strings(
+            view[:start], self._keystream_block[offset:offset + start])
+        self._keystream_offset += start
+
+        for i in range(start, len(view), size * BATCH_BLOCKS):
+            chunk = view[i:i + size * BATCH_BLOCKS]
+            count = (len(chunk) + size - 1) // size
+            keystream = self._keystream_blocks(count)
+
+            target[i:i + len(chunk)] = xor_strings(chunk, keystream)
+            self._keystream_block = keystream[-size:]
+            self._keystream_offset = len(chunk) - (count - 1) * size
+
+        return bytes(target) if out is None else None
+
+    def _encrypt_native(self, data, decrypt):
+        """Hands *data* to the object created by `native_mode()`. In OFB and
+        CTR mode the rest of the current keystream block and an incomplete
+        last block are processed here. Returns None, if the generic engine
+        has to be used."""
+        size = self.block_size
+        keystream = self.mode in (MODE_OFB, MODE_CTR)
+        unit = size if keystream else self._unit_size()
+        head = 0
+        if keystream:
+            head = min(len(data),
+                       len(self._keystream_block) - self._keystream_offset)
+        length = (len(data) - head) // unit * unit
+        end = head + length
+
+        if not length or (not keystream and length != len(data)):
+            return None
+
+        view = memoryview(data)
+        whole = view[head:end] if length < len(data) else data
+        out = self._encrypt_with_keystream(view[:head]) if head else b""
+
+        if self.mode == MODE_CTR:
+            params = {'counter': self._counter.reserve(length // size)}
+        elif self.mode == MODE_CFB:
+            params = {'IV': self._status, 'segment_size': self.segment_size}
+        elif self.mode == MODE_ECB:
+            params = {}
+        else:
+            params = {'IV': self._status}
 
-    def _encrypt_cfb(self, data, decrypt=False):
-        """Encrypts data in CFB mode."""
+        native = self.native_mode(self.key, self.mode, params, **self.kwargs)
+
+        if native is None:
+            self._native = False
+            if not keystream:
+                return None
+
+            # The counter values have been reserved already.
+            counter = self._counter
+            self._counter = params.get('counter', counter)
+            try:
+                out += self._encrypt_with_keystream(whole)
+            finally:
+                self._counter = counter
+        else:
+            result = (native.decrypt if decrypt and not keystream
+                      else native.encrypt)(whole)
+            out += result
+
+            chained = whole if decrypt else result
+            if self.mode == MODE_CBC:
+                self._status = bytes(chained[-size:])
+            elif self.mode == MODE_CFB:
+                self._status = (self._status + bytes(chained[-size:]))[-size:]
+            elif self.mode == MODE_OFB:
+                self._status = xor_strings(result[-size:],
+                                           view[end - size:end])
+
+            self._keystream_block = b""
+            self._keystream_offset = 0
+
+        if end < len(data):
+            out += self._encrypt_with_keystream(view[end:])
+
+        return out
+
+    def _encrypt_gcm(self, data, decrypt=False, out=None):
+        """Encrypts data in GCM mode, authenticating the ciphertext in the
+        same call. Writes to *out* instead of returning the result, if
+        given."""
+        self._check_aead_phase("decrypt()" if decrypt else "encrypt()")
+
+        if not self._data_started:
+            self._ghash.flush()  # associated data is padded
+            self._data_started = True
+
+        if decrypt:
+            self._ghash.update(data)
+
+        if out is None:
+            result = self._encrypt_with_keystream(data)
+        else:
+            self._encrypt_with_keystream(data, out)
+            result = out[:len(data)]
+
+        if not decrypt:
+            self._ghash.update(result)
+
+        self._data_length += len(data)
+
+        return result if out is None else None
+
+    def _encrypt_ocb(self, data, decrypt=False):
+        """Encrypts data in OCB mode. Complete blocks are processed in
+        batches, an incomplete block is held back until more data arrives
+        or *data* is None."""
+        self._check_aead_phase("decrypt()" if decrypt else "encrypt()")
+
+        if self._finished:
+            raise TypeError("encryption or decryption has been finished")
+
+        self._data_started = True
+
+        if data is None:
+            self._finished = True
+            return self._finish_ocb(decrypt)
+
+        view = memoryview(data)
+        buffer = self._ocb_buffer
         out = []
+        start = 0
+
+        if buffer:
+            start = 16 - len(buffer)
+            buffer += view[:start]
+            if len(buffer) < 16:
+                return b""
+            out.append(self._ocb_blocks(bytes(buffer), decrypt))
+            del buffer[:]
+
+        end = start + (len(view) - start) // 16 * 16
+        for i in range(start, end, 16 * ocb.BATCH_BLOCKS):
+            out.append(self._ocb_blocks(
+                view[i:min(end, i + 16 * ocb.BATCH_BLOCKS)].tobytes(),
+                decrypt))
 
-        for block in split_blocks(data, self.segment_size // 8):
+        buffer += view[end:]
+
+        return b"".join(out)
+
+    def _ocb_blocks(self, data, decrypt):
+        """Processes a batch of complete blocks in OCB mode."""
+        transform = self.decrypt_blocks if decrypt else self.encrypt_blocks
+
+        out, self._offset, self._block_index = ocb.whiten(
+            partial(transform, self.key, **self.kwargs),
+            self._ocb_tables[2], self._offset, self._block_index, data)
+
+        self._checksum ^= ocb.fold(from_bytes(out if decrypt else data,
+                                              'big'), len(data) // 16)
+
+        return out
+
+    def _finish_ocb(self, decrypt):
+        """Processes the final incomplete block in OCB mode."""
+        rest = bytes(self._ocb_buffer)
+        del self._ocb_buffer[:]
+
+        if not rest:
+            return b""
+
+        self._offset ^= self._ocb_tables[0]
+        pad = self.encrypt_block(self.key, to_bytes(self._offset, 16, 'big'),
+                                 **self.kwargs)
+        out = xor_strings(rest, pad)
+
+        self._checksum ^= ocb.pad(out if decrypt else rest)
+
+        return out
+
+    def _encrypt_batches(self, transform, data, direction, out=None):
+        """Applies *transform* (`encrypt_blocks()` or `decrypt_blocks()`)
+        to all blocks of *data*, `BATCH_BLOCKS` at a time. Goes through
+        the block cache, if enabled. Writes to *out* instead of returning
+        the result, if given."""
+        blocks = split_blocks(data, self.block_size)
+        cache = self.block_cache
+        target = bytearray(len(data)) if out is None else out
+        function = partial(transform, self.key, **self.kwargs)
+        position = 0
+
+        while True:
+            batch = list(islice(blocks, BATCH_BLOCKS))
+            if not batch:
+                return bytes(target) if out is None else None
+
+            end = position + len(batch) * self.block_size
+            if cache is None:
+                target[position:end] = b"".join(function(batch))
+            else:
+                target[position:end] = b"".join(
+                    cache.map(direction, batch, function))
+            position = end
+
+    def _encrypt_cfb(self, data, decrypt=False, out=None):
+        """Encrypts data in CFB mode. Writes to *out* instead of returning
+        the result, if given."""
+        size = self.segment_size // 8
+        target = bytearray(len(data)) if out is None else out
+        position = 0
+
+        for block in split_blocks(data, size):
             encrypted_iv = self.encrypt_block(self.key, self._status)
             ecd = xor_strings(encrypted_iv, block)
 
-            iv_p1 = self._status[self.segment_size // 8:]
+            iv_p1 = self._status[size:]
             iv_p2 = block if decrypt else ecd
 
             self._status = iv_p1 + iv_p2
 
-            out.append(ecd)
+            target[position:position + size] = ecd
+            position += size
 
-        return b"".join(out)
+        return bytes(target) if out is None else None
 
-    def _create_keystream(self):
-        "Creates a keystream (generator object) for OFB or CTR mode."
-        if self.mode not in (MODE_OFB, MODE_CTR):
-            # Coverage somehow does not work here
-            return  # pragma: no cover
+    def _encrypt_cbc(self, data, decrypt=False, out=None):
+        """Encrypts data in CBC mode. Writes to *out* instead of returning
+        the result, if given."""
+        size = self.block_size
+        target = bytearray(len(data)) if out is None else out
+        position = 0
 
-        while True:
-            if self.mode == MODE_OFB:
-                _next = self._status
-            elif self.mode == MODE_CTR:
-                _next = self._counter()
-                if len(_next) != self.block_size:
-                    raise TypeError("Counter length must be block_size")
+        for block in split_blocks(data, size):
+            if decrypt:
+                decrypted_but_not_xored = self.decrypt_block(self.key,
+                                                             block,
+                                                             **self.kwargs)
+                piece = xor_strings(self._status, decrypted_but_not_xored)
+                # may be a view of a reused buffer
+                self._status = bytes(block)
+            else:
+                xored = xor_strings(self._status, block)
+                piece = self._status = self.encrypt_block(self.key, xored,
+                                                          **self.kwargs)
+
+            target[position:position + size] = piece
+            position += size
+
+        return bytes(target) if out is None else None
+
+    def _encrypt_registered(self, declaration, data, decrypt, out=None):
+        """Encrypts data in a mode added with `register_mode()`. Writes to
+        *out* instead of returning the result, if given."""
+        if declaration.engine == Mode.KEYSTREAM:
+            return self._encrypt_with_keystream(data, out)
+
+        if declaration.engine == Mode.BLOCKS:
+            return self._encrypt_batches(
+                partial(self._registered_blocks, declaration, decrypt),
+                data, int(decrypt), out)
+
+        size = self.block_size
+        target = bytearray(len(data)) if out is None else out
+        position = 0
+
+        for block in split_blocks(data, size):
+            target[position:position + size] = declaration.chain(
+                self, block, decrypt)
+            position += size
+
+        return bytes(target) if out is None else None
+
+    def _registered_blocks(self, declaration, decrypt, key, blocks,
+                           **kwargs):
+        """Processes a batch of blocks of a registered block mode."""
+        index = self._mode_index
+
+        if declaration.before is not None:
+            blocks = declaration.before(self, blocks, index, decrypt)
+
+        blocks = (self.decrypt_blocks if decrypt else self.encrypt_blocks)(
+            key, blocks, **kwargs)
+
+        if declaration.after is not None:
+            blocks = declaration.after(self, blocks, index, decrypt)
+
+        self._mode_index = index + len(blocks)
+        return blocks
+
+    def _keystream_blocks(self, count):
+        """Creates the next *count* keystream blocks for OFB, CTR or GCM
+        mode, or a registered mode. Counter blocks are encrypted in one
+        batch."""
+        declaration = _modes.get(self.mode)
+        if declaration is not None:
+            return declaration.keystream(self, count)
+
+        if self.mode == MODE_OFB:
+            blocks = []
+            for _ in range(count):
+                self._status = self.encrypt_block(self.key, self._status,
+                                                  **self.kwargs)
+                blocks.append(self._status)
+            return b"".join(blocks)
+
+        counters = []
+        for _ in range(count):
+            counters.append(self._counter())
+            if len(counters[-1]) != self.block_size:
+                raise TypeError("Counter length must be block_size")
+
+        blocks = self.encrypt_blocks(self.key, counters, **self.kwargs)
+        self._status = blocks[-1]
+        return b"".join(blocks)
+
+
+@mypyc_attr(native_class=False)
+class StreamCipher(PEP272Cipher):
+    """Base class for stream ciphers.
+
+    Overwrite :py:meth:`keystream`, or :py:meth:`encrypt_stream` and
+    :py:meth:`decrypt_stream` for ciphers that do not simply xor a
+    keystream. `encrypt()` and `decrypt()` hand the whole input to them in
+    one call, instead of splitting it into blocks of a single byte.
+
+    Stream ciphers only support `MODE_ECB`, which stands for "no mode of
+    operation" here.
+    """
+    block_size = 1  # type: ignore
+
+    def _check_arguments(self):
+        if self.mode != MODE_ECB:
+            raise ValueError("Stream ciphers only support ECB mode")
+        if self.block_cache is not None:
+            raise TypeError("'block_cache' is not supported by stream "
+                            "ciphers")
+
+        PEP272Cipher._check_arguments(self)
+
+    def keystream(self, length):
+        """Return the next *length* bytes of the keystream.
+
+        :param int length: Number of bytes.
+        :raises NotImplementedError: This method is to be overridden.
+        :rtype: bytes"""
+        raise NotImplementedError
+
+    def encrypt_stream(self, data):
+        """Encrypt *data*, by default by xoring it with the keystream.
+
+        :param bytes data: The data to encrypt, of any length.
+        :rtype: bytes"""
+        return xor_strings(data, self.keystream(len(data)))
+
+    def decrypt_stream(self, data):
+        """Decrypt *data*, the same as :py:meth:`encrypt_stream` by
+        default.
+
+        :param bytes data: The data to decrypt, of any length.
+        :rtype: bytes"""
+        return self.encrypt_stream(data)
+
+    def encrypt_block(self, key, block, **kwargs):
+        return self.encrypt_stream(block)
+
+    def decrypt_block(self, key, block, **kwargs):
+        return self.decrypt_stream(block)
+
+    def _encrypt_batches(self, transform, data, direction, out=None):
+        """Hands all of *data* to the stream functions at once."""
+        result = (self.decrypt_stream if direction else
+                  self.encrypt_stream)(data)
+
+        if out is None:
+            return bytes(result)
+
+        out[:len(result)] = result
+        return None
 
-            self._status = self.encrypt_block(self.key, _next, **self.kwargs)
 
-            for k in self._status:
-                yield b_ord(k)
+if not PEP272Cipher.__abstractmethods__:  # compiled by mypyc
+    setattr(PEP272Cipher, '__abstractmethods__',
+            frozenset(('encrypt_block', 'decrypt_block')))
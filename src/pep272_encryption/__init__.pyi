@@ -1,15 +1,69 @@
 from abc import abstractmethod
-from typing import Any, ByteString, Callable, Generator, Mapping, Optional, \
-    Union
+from typing import Any, ByteString, Callable, Dict, Iterable, Iterator, \
+    List, Mapping, Optional, Tuple, Union
 
 from abc import ABC
 
+from .util import BlockCache
+
 MODE_ECB: int
 MODE_CBC: int
 MODE_CFB: int
 MODE_PGP: int
 MODE_OFB: int
 MODE_CTR: int
+MODE_GCM: int
+MODE_OCB: int
+
+MODES_AEAD: Tuple[int, ...]
+MODES_NATIVE: Tuple[int, ...]
+
+BATCH_BLOCKS: int
+
+Blocks = List[bytes]
+
+
+class Mode(object):
+    BLOCKS: str
+    CHAINED: str
+    KEYSTREAM: str
+
+    engine: str
+    before: Optional[Callable[[PEP272Cipher, Blocks, int, bool], Blocks]]
+    after: Optional[Callable[[PEP272Cipher, Blocks, int, bool], Blocks]]
+    chain: Optional[Callable[[PEP272Cipher, bytes, bool], bytes]]
+    keystream: Optional[Callable[[PEP272Cipher, int], bytes]]
+    parallel: bool
+    iv: bool
+
+    def __init__(self, engine: str,
+                 before: Callable[[PEP272Cipher, Blocks, int, bool],
+                                  Blocks] = None,
+                 after: Callable[[PEP272Cipher, Blocks, int, bool],
+                                 Blocks] = None,
+                 chain: Callable[[PEP272Cipher, bytes, bool], bytes] = None,
+                 keystream: Callable[[PEP272Cipher, int], bytes] = None,
+                 parallel: bool = False, iv: bool = False) -> None:
+        ...
+
+
+_modes: Dict[int, Mode]
+
+
+def register_mode(mode: int, declaration: Mode) -> None:
+    ...
+
+
+def unregister_mode(mode: int) -> None:
+    ...
+
+
+def _function(method: Callable) -> Callable:
+    ...
+
+
+def _iv(cipher: PEP272Cipher) -> Union[None, ByteString]:
+    ...
 
 
 class PEP272Cipher(ABC):
@@ -22,16 +76,40 @@ class PEP272Cipher(ABC):
     mode: int
     segment_size: int
 
+    nonce: ByteString
+    mac_len: int
+
+    block_cache: Optional[BlockCache]
+
     _counter: Callable[[], ByteString]
     _status: ByteString
-    _keystream: Optional[Generator[int, None, None]]
+    _keystream_block: bytes
+    _keystream_offset: int
+    _native: bool
+    _guard_nonce: Optional[bytes]
+    _mode_index: int
 
     def __init__(self, key: Any, mode: int, IV: ByteString = None, *,
                  counter: Union[Callable[[], ByteString], Mapping] = None,
                  segment_size: int = 0,
+                 nonce: ByteString = None,
+                 mac_len: int = 16,
+                 block_cache: Union[int, BlockCache] = None,
                  **kwargs):
         ...
 
+    def __getstate__(self) -> Dict[str, Any]:
+        ...
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        ...
+
+    def _nonce(self) -> Optional[bytes]:
+        ...
+
+    def _register_nonce(self) -> None:
+        ...
+
     def _check_iv(self) -> None:
         ...
 
@@ -41,22 +119,149 @@ class PEP272Cipher(ABC):
     def _check_counter(self) -> None:
         ...
 
+    def _check_aead(self) -> None:
+        ...
+
+    def _check_block_cache(self) -> None:
+        ...
+
     def _check_arguments(self) -> None:
         ...
 
-    def _create_keystream(self) -> Optional[Generator[int, None, None]]:
+    def _key_material(self, name: str, factory: Callable[[], Any]) -> Any:
+        ...
+
+    def _ghash_tables(self) -> Tuple[List[int], ...]:
+        ...
+
+    def _ocb_key_tables(self) -> Tuple[int, int, Tuple[int, ...]]:
+        ...
+
+    def _zero_block_tables(self, function: Callable[[bytes], Any]) -> Any:
+        ...
+
+    def _encipher_blocks(self, blocks: Iterable[ByteString]) -> List[bytes]:
+        ...
+
+    def _init_gcm(self) -> None:
+        ...
+
+    def _init_ocb(self) -> None:
+        ...
+
+    def _keystream_blocks(self, count: int) -> bytes:
+        ...
+
+    def _encrypt_with_keystream(self, data: ByteString,
+                                out: memoryview=None) -> Optional[bytes]:
+        ...
+
+    def _encrypt_registered(self, declaration: Mode, data: ByteString,
+                            decrypt: bool,
+                            out: memoryview=None) -> Optional[bytes]:
+        ...
+
+    def _registered_blocks(self, declaration: Mode, decrypt: bool, key: Any,
+                           blocks: Blocks, **kwargs) -> Blocks:
+        ...
+
+    def _encrypt_native(self, data: ByteString,
+                        decrypt: bool) -> Optional[bytes]:
+        ...
+
+    def _encrypt_gcm(self, data: ByteString, decrypt: bool=...,
+                     out: memoryview=None) -> Optional[bytes]:
+        ...
+
+    def _encrypt_ocb(self, data: Optional[ByteString],
+                     decrypt: bool=...) -> bytes:
+        ...
+
+    def _ocb_blocks(self, data: bytes, decrypt: bool) -> bytes:
+        ...
+
+    def _finish_ocb(self, decrypt: bool) -> bytes:
+        ...
+
+    def _encrypt_batches(self, transform: Callable[..., List[bytes]],
+                         data: ByteString, direction: int,
+                         out: memoryview=None) -> Optional[bytes]:
+        ...
+
+    def _encrypt_cfb(self, data: ByteString, decrypt: bool=...,
+                     out: memoryview=None) -> Optional[bytes]:
+        ...
+
+    def _encrypt_cbc(self, data: ByteString, decrypt: bool=...,
+                     out: memoryview=None) -> Optional[bytes]:
+        ...
+
+    def encrypt(self, string: Optional[ByteString]=None) -> bytes:
+        ...
+
+    def decrypt(self, string: Optional[ByteString]=None) -> bytes:
+        ...
+
+    def encrypt_into(self, string: Optional[ByteString],
+                     out: Union[bytearray, memoryview]) -> int:
+        ...
+
+    def decrypt_into(self, string: Optional[ByteString],
+                     out: Union[bytearray, memoryview]) -> int:
+        ...
+
+    def _crypt_into(self, data: Optional[ByteString],
+                    out: Union[bytearray, memoryview], decrypt: bool) -> int:
+        ...
+
+    def iterencrypt(self, chunks: Iterable[ByteString]
+                    ) -> Iterator[bytes]:
+        ...
+
+    def iterdecrypt(self, chunks: Iterable[ByteString]
+                    ) -> Iterator[bytes]:
+        ...
+
+    def _unit_size(self) -> int:
+        ...
+
+    def _iter_crypt(self, chunks: Iterable[ByteString],
+                    function: Callable[..., bytes]) -> Iterator[bytes]:
         ...
 
-    def _encrypt_with_keystream(self, data: ByteString) -> bytes:
+    def update(self, assoc_data: ByteString) -> None:
         ...
 
-    def _encrypt_cfb(self, data: ByteString, decrypt: bool=...) -> bytes:
+    def digest(self) -> bytes:
         ...
 
-    def encrypt(self, string: ByteString) -> bytes:
+    def verify(self, received_mac_tag: ByteString) -> None:
         ...
 
-    def decrypt(self, string: ByteString) -> bytes:
+    def encrypt_and_digest(self, plaintext: ByteString
+                           ) -> Tuple[bytes, bytes]:
+        ...
+
+    def decrypt_and_verify(self, ciphertext: ByteString,
+                           received_mac_tag: ByteString) -> bytes:
+        ...
+
+    def _check_aead_mode(self, method: str) -> None:
+        ...
+
+    def _check_aead_phase(self, method: str) -> None:
+        ...
+
+    def encrypt_blocks(self, key, blocks: Iterable[ByteString],
+                       **kwargs) -> List[ByteString]:
+        ...
+
+    def decrypt_blocks(self, key, blocks: Iterable[ByteString],
+                       **kwargs) -> List[ByteString]:
+        ...
+
+    def native_mode(self, key, mode: int, params: Dict[str, Any],
+                    **kwargs) -> Optional[Any]:
         ...
 
     @abstractmethod
@@ -65,4 +270,31 @@ class PEP272Cipher(ABC):
 
     @abstractmethod
     def decrypt_block(self, key, block: ByteString, **kwargs) -> ByteString:
-        ...
\ No newline at end of file
+        ...
+
+
+class StreamCipher(PEP272Cipher):
+    def _check_arguments(self) -> None:
+        ...
+
+    def keystream(self, length: int) -> bytes:
+        ...
+
+    def encrypt_stream(self, data: ByteString) -> bytes:
+        ...
+
+    def decrypt_stream(self, data: ByteString) -> bytes:
+        ...
+
+    def encrypt_block(self, key: bytes, block: ByteString,
+                      **kwargs: Any) -> bytes:
+        ...
+
+    def decrypt_block(self, key: bytes, block: ByteString,
+                      **kwargs: Any) -> bytes:
+        ...
+
+    def _encrypt_batches(self, transform: Callable[..., List[bytes]],
+                         data: ByteString, direction: int,
+                         out: memoryview=None) -> Optional[bytes]:
+        ...
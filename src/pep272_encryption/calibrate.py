@@ -0,0 +1,269 @@
+"""
+Calibration of the crossover sizes between implementations of the same
+operation, stored in :py:data:`pep272_encryption.util.thresholds`:
+
+``"xor"``
+    Input length from which the pure Python XOR is faster than the C
+    extension; infinite if it never is.
+
+``"parallel"``
+    Smallest slice size, for which a worker of
+    :py:mod:`pep272_encryption.parallel` pays off.
+
+When a threshold is needed for the first time, the values are loaded
+from the cache file or measured with a few micro-benchmarks, which are
+then stored in the cache file. Results are cached per interpreter,
+version and machine.
+
+Environment variables:
+
+``PEP272_ENCRYPTION_THRESHOLDS``
+    Fixed thresholds like ``xor=none,parallel=65536``, for deterministic
+    deployments. Missing values use the defaults; nothing is measured.
+
+``PEP272_ENCRYPTION_CALIBRATE``
+    Set to ``0`` to use the defaults instead of measuring, a cache file
+    is still read.
+
+``PEP272_ENCRYPTION_CACHE``
+    Path of the cache file, defaults to
+    ``$XDG_CACHE_HOME/pep272-encryption/calibration.json``.
+
+"""
+
+import json
+import os
+import platform
+import threading
+
+from timeit import default_timer
+
+from . import PEP272Cipher, MODE_ECB
+from .util import thresholds, fast_xor, _xor_fallback, from_bytes, \
+    to_bytes
+from .version import __version__
+
+#: Thresholds used when nothing is measured.
+DEFAULTS = {
+    'xor': None,
+    'parallel': 2**16
+}
+
+#: Sizes tried by the benchmarks.
+SIZES = tuple(2**i for i in range(4, 21, 2))
+
+_lock = threading.Lock()
+_loaded = []
+
+
+def cache_file():
+    """Path of the cache file.
+
+    :rtype: str"""
+    path = os.environ.get('PEP272_ENCRYPTION_CACHE')
+    if path:
+        return path
+
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(
+        os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'pep272-encryption', 'calibration.json')
+
+
+def signature():
+    """Identifies the machine and interpreter the values are valid for.
+
+    :rtype: str"""
+    return "{}-{}-{}-{}-{}".format(
+        __version__, platform.python_implementation(),
+        platform.python_version(), platform.machine(),
+        'c' if fast_xor is not None else 'py')
+
+
+def parse(value):
+    """Parse thresholds given as ``name=size,name=none``.
+
+    :raises ValueError: For unknown names or invalid sizes.
+    :rtype: dict"""
+    result = {}
+    for item in value.split(','):
+        if not item.strip():
+            continue
+
+        name, _, size = item.partition('=')
+        name, size = name.strip(), size.strip().lower()
+        if name not in DEFAULTS:
+            raise ValueError("Unknown threshold {!r}".format(name))
+
+        result[name] = None if size in ('none', '') else int(size)
+
+    return result
+
+
+def apply(values):
+    """Use *values*, missing ones are taken from :py:data:`DEFAULTS`.
+
+    :param dict values: Threshold sizes by name, None means never."""
+    merged = dict(DEFAULTS)
+    merged.update(values)
+
+    for name, size in merged.items():
+        thresholds[name] = float('inf') if size is None else size
+
+
+def load():
+    """Load the thresholds once: from the environment, the cache file, or
+    by measuring them. Called on first use of a threshold.
+
+    :return: The thresholds, None means never.
+    :rtype: dict"""
+    with _lock:
+        if _loaded:
+            return _loaded[0]
+
+        apply({})  # used while measuring
+
+        if 'PEP272_ENCRYPTION_THRESHOLDS' in os.environ:
+            values = parse(os.environ['PEP272_ENCRYPTION_THRESHOLDS'])
+        else:
+            values = _read_cache()
+            if values is None and \
+                    os.environ.get('PEP272_ENCRYPTION_CALIBRATE') != '0':
+                values = measure()
+                _write_cache(values)
+
+        values = dict(DEFAULTS, **(values or {}))
+        apply(values)
+        _loaded.append(values)
+        return values
+
+
+def calibrate(save=True):
+    """Measure the thresholds now and use them.
+
+    :param bool save: If the result is written to the cache file.
+    :return: The thresholds, None means never.
+    :rtype: dict"""
+    values = measure()
+    if save:
+        _write_cache(values)
+
+    with _lock:
+        apply(values)
+        del _loaded[:]
+        _loaded.append(dict(DEFAULTS, **values))
+
+    return values
+
+
+def measure():
+    """Run the micro-benchmarks without using the results.
+
+    :rtype: dict"""
+    values = {}
+    if fast_xor is not None:
+        values['xor'] = _measure_xor()
+
+    from . import parallel
+    if 'interpreters' in parallel.available_backends() and \
+            (getattr(os, 'cpu_count', lambda: 1)() or 1) > 1:
+        values['parallel'] = _measure_parallel(parallel)
+
+    return values
+
+
+def _best(function, repeat=3):
+    """Best time of *repeat* runs, each run long enough to be measurable."""
+    number = 1
+    while True:
+        start = default_timer()
+        for _ in range(number):
+            function()
+        elapsed = default_timer() - start
+        if elapsed > 0.002 or number >= 2**16:
+            break
+        number *= 4
+
+    best = elapsed
+    for _ in range(repeat - 1):
+        start = default_timer()
+        for _ in range(number):
+            function()
+        best = min(best, default_timer() - start)
+
+    return best / number
+
+
+def _crossover(first, second):
+    """Smallest size for which *second* is faster than *first*."""
+    for size in SIZES:
+        if _best(lambda: second(size)) < _best(lambda: first(size)):
+            return size
+    return None
+
+
+def _measure_xor():
+    data = dict((size, os.urandom(size)) for size in SIZES)
+    return _crossover(lambda size: fast_xor(data[size], data[size]),
+                      lambda size: _xor_fallback(data[size], data[size]))
+
+
+class _ProbeCipher(PEP272Cipher):
+    """Pure Python block function with a typical cost per block."""
+    block_size = 16
+
+    def encrypt_block(self, key, block, **kwargs):
+        value = from_bytes(block, 'big')
+        for _ in range(8):
+            value = (value * 0x9e3779b97f4a7c15 + 1) & (2**128 - 1)
+        return to_bytes(value, 16, 'big')
+
+    decrypt_block = encrypt_block
+
+
+def _measure_parallel(parallel):
+    cipher = _ProbeCipher(b'calibration key!', MODE_ECB)
+    data = os.urandom(2 * SIZES[-1])
+    old = parallel.MIN_SLICE_SIZE
+
+    def run_parallel(size):
+        parallel.MIN_SLICE_SIZE = size
+        try:
+            parallel.encrypt(cipher, data[:2 * size], workers=2,
+                             backend='interpreters')
+        finally:
+            parallel.MIN_SLICE_SIZE = old
+
+    return _crossover(lambda size: cipher.encrypt(data[:2 * size]),
+                      run_parallel)
+
+
+def _read_cache():
+    try:
+        with open(cache_file()) as cache:
+            return json.load(cache).get(signature())
+    except (EnvironmentError, ValueError, AttributeError):
+        return None
+
+
+def _write_cache(values):
+    path = cache_file()
+    try:
+        with open(path) as cache:
+            content = json.load(cache)
+        if not isinstance(content, dict):
+            content = {}
+    except (EnvironmentError, ValueError):
+        content = {}
+
+    content[signature()] = values
+
+    try:
+        directory = os.path.dirname(path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        temporary = "{}.{}.tmp".format(path, os.getpid())
+        with open(temporary, 'w') as cache:
+            json.dump(content, cache, indent=2, sort_keys=True)
+        getattr(os, 'replace', os.rename)(temporary, path)
+    except EnvironmentError:  # read-only home, the values still apply
+        pass
@@ -0,0 +1,61 @@
+from typing import Any, ByteString, Callable, Dict, Optional, Tuple
+
+from . import PEP272Cipher
+
+DEFAULTS: Dict[str, Optional[int]]
+SIZES: Tuple[int, ...]
+
+
+def cache_file() -> str:
+    ...
+
+
+def signature() -> str:
+    ...
+
+
+def parse(value: str) -> Dict[str, Optional[int]]:
+    ...
+
+
+def apply(values: Dict[str, Optional[int]]) -> None:
+    ...
+
+
+def load() -> Dict[str, Optional[int]]:
+    ...
+
+
+def calibrate(save: bool=True) -> Dict[str, Optional[int]]:
+    ...
+
+
+def measure() -> Dict[str, Optional[int]]:
+    ...
+
+
+def _best(function: Callable[[], Any], repeat: int=3) -> float:
+    ...
+
+
+def _crossover(first: Callable[[int], Any],
+               second: Callable[[int], Any]) -> Optional[int]:
+    ...
+
+
+class _ProbeCipher(PEP272Cipher):
+    def encrypt_block(self, key, block: ByteString,
+                      **kwargs) -> ByteString:
+        ...
+
+    def decrypt_block(self, key, block: ByteString,
+                      **kwargs) -> ByteString:
+        ...
+
+
+def _read_cache() -> Optional[Dict[str, Optional[int]]]:
+    ...
+
+
+def _write_cache(values: Dict[str, Optional[int]]) -> None:
+    ...
@@ -0,0 +1,113 @@
+"""
+Cascades of block ciphers, e.g. triple encryption (*EDE*), run as a single
+block cipher by one mode of operation.
+
+Instead of chaining whole cipher objects, with one pass over the data and
+one output buffer per layer, :py:class:`CascadeCipher` applies the block
+functions of all layers to each block before the mode continues. In modes
+that process independent blocks (*ECB*, *CTR*, *GCM*, *OCB*), each batch
+of blocks goes through ``encrypt_blocks`` of one layer after another, so
+ciphers with a fast multi-block implementation keep it.
+
+Example:
+
+::
+
+    >>> class TripleTEA(CascadeCipher):
+    ...     block_size = 8
+    ...     layers = ede(TEACipher, 16)
+    >>> cipher = TripleTEA(key_48_bytes, MODE_CBC, iv)
+
+"""
+
+from . import PEP272Cipher, MODE_ECB
+
+
+class CascadeCipher(PEP272Cipher):
+    """Block cipher applying the block functions of several ciphers in
+    turn.
+
+    Subclasses set :py:attr:`block_size` and :py:attr:`layers`. The key is
+    the concatenation of the keys of all layers, see :py:attr:`layers`.
+    Additional keyword arguments are passed to every layer.
+    """
+
+    #: Tuples of ``(cipher_class, key_offset, key_size, decrypt)``, applied
+    #: from first to last for encryption: *cipher_class* gets the
+    #: *key_size* bytes of the key from *key_offset* on, and its block
+    #: function decrypts instead of encrypts if *decrypt* is true. Layers
+    #: may share key bytes.
+    layers = ()
+
+    def _check_arguments(self):
+        PEP272Cipher._check_arguments(self)
+
+        if not self.layers:
+            raise TypeError("A cascade needs at least one layer")
+
+        key_size = max(offset + size for _, offset, size, _ in self.layers)
+        if len(self.key) != key_size:
+            raise ValueError("Key must be {} bytes long".format(key_size))
+
+        self._layers = []
+        for cipher_class, offset, size, decrypt in self.layers:
+            if cipher_class.block_size != self.block_size:
+                raise ValueError("All layers must have a block_size of "
+                                 "{}".format(self.block_size))
+
+            layer = cipher_class(self.key[offset:offset + size], MODE_ECB,
+                                 **self.kwargs)
+            self._layers.append((layer, decrypt))
+
+    def encrypt_block(self, key, block, **kwargs):
+        """Encrypts *block* with all layers, first to last."""
+        for layer, decrypt in self._layers:
+            function = layer.decrypt_block if decrypt else \
+                layer.encrypt_block
+            block = function(layer.key, block, **layer.kwargs)
+        return block
+
+    def decrypt_block(self, key, block, **kwargs):
+        """Decrypts *block* with all layers, last to first."""
+        for layer, decrypt in reversed(self._layers):
+            function = layer.encrypt_block if decrypt else \
+                layer.decrypt_block
+            block = function(layer.key, block, **layer.kwargs)
+        return block
+
+    def encrypt_blocks(self, key, blocks, **kwargs):
+        """Encrypts a batch of blocks with all layers, handing the whole
+        batch to ``encrypt_blocks`` (or ``decrypt_blocks``) of each."""
+        blocks = list(blocks)
+        for layer, decrypt in self._layers:
+            function = layer.decrypt_blocks if decrypt else \
+                layer.encrypt_blocks
+            blocks = function(layer.key, blocks, **layer.kwargs)
+        return blocks
+
+    def decrypt_blocks(self, key, blocks, **kwargs):
+        """Decrypts a batch of blocks with all layers, in reverse order."""
+        blocks = list(blocks)
+        for layer, decrypt in reversed(self._layers):
+            function = layer.encrypt_blocks if decrypt else \
+                layer.decrypt_blocks
+            blocks = function(layer.key, blocks, **layer.kwargs)
+        return blocks
+
+
+def ede(cipher_class, key_size, keying=3):
+    """Layers for triple encryption: encrypt, decrypt, encrypt.
+
+    :param cipher_class: The block cipher of all three layers.
+    :param int key_size: Key size of *cipher_class*.
+    :param int keying: Number of independent keys, like the keying options
+        of Triple DES: 3 (key is K1 K2 K3), 2 (K1 K2, K3 = K1) or 1 (K1,
+        equivalent to single encryption).
+    :return: Value for :py:attr:`CascadeCipher.layers`.
+    :rtype: tuple"""
+    if keying not in (1, 2, 3):
+        raise ValueError("'keying' must be 1, 2 or 3")
+
+    offsets = {1: (0, 0, 0), 2: (0, 1, 0), 3: (0, 1, 2)}[keying]
+    return tuple((cipher_class, offset * key_size, key_size, decrypt)
+                 for offset, decrypt in zip(offsets, (False, True, False)))
@@ -0,0 +1,32 @@
+from typing import ByteString, Iterable, List, Tuple, Type
+
+from . import PEP272Cipher
+
+_Layer = Tuple[Type[PEP272Cipher], int, int, bool]
+
+
+class CascadeCipher(PEP272Cipher):
+    layers: Tuple[_Layer, ...]
+    _layers: List[Tuple[PEP272Cipher, bool]]
+
+    def _check_arguments(self) -> None:
+        ...
+
+    def encrypt_block(self, key, block: ByteString, **kwargs) -> ByteString:
+        ...
+
+    def decrypt_block(self, key, block: ByteString, **kwargs) -> ByteString:
+        ...
+
+    def encrypt_blocks(self, key, blocks: Iterable[ByteString],
+                       **kwargs) -> List[ByteString]:
+        ...
+
+    def decrypt_blocks(self, key, blocks: Iterable[ByteString],
+                       **kwargs) -> List[ByteString]:
+        ...
+
+
+def ede(cipher_class: Type[PEP272Cipher], key_size: int,
+        keying: int=3) -> Tuple[_Layer, ...]:
+    ...
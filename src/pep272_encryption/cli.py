@@ -0,0 +1,439 @@
+"""
+Command line tool to encrypt and decrypt files with a cipher class built
+on :py:class:`~pep272_encryption.PEP272Cipher`.
+
+Usage:
+
+::
+
+    python -m pep272_encryption encrypt --cipher package.module:Cipher \\
+        --key-file secret.key --mode CTR --nonce 0011223344556677 \\
+        plain.bin encrypted.bin
+
+Reading, encryption and writing run in separate threads connected by
+bounded queues, so disk I/O overlaps with computation while only a few
+chunks are held in memory. Regular input files are memory-mapped instead
+of read. In ECB and CTR mode each chunk is split across workers with
+:py:mod:`pep272_encryption.parallel`.
+
+The output is written to a temporary file next to it, which replaces the
+output file only after the whole input has been processed, so a failed
+run leaves an existing output file untouched. In the AEAD modes the tag
+is appended to the ciphertext; when decrypting, it is removed and
+checked before the plaintext is moved into place. Therefore AEAD
+decryption cannot write to stdout, which would pass on unauthenticated
+plaintext.
+
+"""
+
+import argparse
+import binascii
+import mmap
+import os
+import sys
+import threading
+import time
+
+from importlib import import_module
+
+try:
+    import queue
+except ImportError:  # Python 2
+    import Queue as queue
+
+from . import parallel
+from . import MODE_ECB, MODE_CBC, MODE_CFB, MODE_OFB, MODE_CTR, MODE_GCM, \
+    MODE_OCB, MODES_AEAD
+from .util import Counter
+
+#: Modes of operation selectable on the command line.
+MODES = {
+    'ECB': MODE_ECB,
+    'CBC': MODE_CBC,
+    'CFB': MODE_CFB,
+    'OFB': MODE_OFB,
+    'CTR': MODE_CTR,
+    'GCM': MODE_GCM,
+    'OCB': MODE_OCB
+}
+
+#: Default number of bytes per chunk.
+CHUNK_SIZE = 2**20
+
+#: Number of chunks that can wait between two stages.
+QUEUE_SIZE = 2
+
+_DONE = object()
+
+
+def load_cipher(path):
+    """Import a cipher class given as ``package.module:Class`` or
+    ``package.module.Class``.
+
+    :raises ValueError: If the path does not name an attribute of a
+        module."""
+    module, sep, name = path.rpartition(':')
+    if not sep:
+        module, _, name = path.rpartition('.')
+
+    if not module or not name:
+        raise ValueError("Cipher must be given as module:Class, "
+                         "not {!r}".format(path))
+
+    cls = import_module(module)
+    for part in name.split('.'):
+        cls = getattr(cls, part)
+
+    return cls
+
+
+def create_parser():
+    """Create the argument parser.
+
+    :rtype: argparse.ArgumentParser"""
+    parser = argparse.ArgumentParser(
+        prog="python -m pep272_encryption",
+        description="Encrypt or decrypt a file with a PEP-272 cipher.")
+
+    parser.add_argument("action", choices=("encrypt", "decrypt"))
+    parser.add_argument("input", help="input file, - for stdin")
+    parser.add_argument("output", help="output file, - for stdout")
+
+    parser.add_argument("-c", "--cipher", required=True,
+                        help="import path of the cipher class, "
+                             "e.g. package.module:Cipher")
+    key = parser.add_mutually_exclusive_group(required=True)
+    key.add_argument("-k", "--key", type=_hex, help="hex encoded key")
+    key.add_argument("--key-file", help="file containing the raw key")
+
+    parser.add_argument("-m", "--mode", type=str.upper, default="CTR",
+                        choices=sorted(MODES), help="default: CTR")
+    parser.add_argument("--iv", type=_hex,
+                        help="hex encoded IV (CBC, CFB, OFB)")
+    parser.add_argument("--nonce", type=_hex,
+                        help="hex encoded nonce (CTR, GCM, OCB)")
+    parser.add_argument("--segment-size", type=int,
+                        help="segment size in bits (CFB)")
+    parser.add_argument("--mac-len", type=int,
+                        help="tag length in bytes (GCM, OCB)")
+
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE,
+                        help="bytes per chunk, default: %(default)s")
+    parser.add_argument("--workers", type=int,
+                        help="parallel workers (ECB, CTR), default: CPUs")
+    parser.add_argument("--backend", choices=parallel.BACKENDS,
+                        help="parallel backend (ECB, CTR)")
+    parser.add_argument("-q", "--quiet", action="store_true",
+                        help="do not report the throughput")
+
+    return parser
+
+
+def _hex(value):
+    try:
+        return binascii.unhexlify(value)
+    except (TypeError, ValueError, binascii.Error):
+        raise argparse.ArgumentTypeError("invalid hex value")
+
+
+def create_cipher(args):
+    """Create the cipher object described by the parsed arguments.
+
+    :rtype: pep272_encryption.PEP272Cipher"""
+    cls = load_cipher(args.cipher)
+    mode = MODES[args.mode]
+
+    if args.key_file:
+        with open(args.key_file, 'rb') as key_file:
+            key = key_file.read()
+    else:
+        key = args.key
+
+    kwargs = {}
+    if args.iv is not None:
+        kwargs['IV'] = args.iv
+    if args.segment_size is not None:
+        kwargs['segment_size'] = args.segment_size
+    if args.mac_len is not None:
+        kwargs['mac_len'] = args.mac_len
+
+    if mode == MODE_CTR:
+        if args.nonce is None:
+            raise ValueError("CTR mode requires --nonce")
+        kwargs['counter'] = Counter(nonce=args.nonce,
+                                    block_size=cls.block_size)
+    elif mode in MODES_AEAD:
+        if args.nonce is None:
+            raise ValueError("AEAD modes require --nonce")
+        kwargs['nonce'] = args.nonce
+
+    return cls(key, mode, **kwargs)
+
+
+def _open_input(path):
+    """Returns a readable binary file and a memory map of it, if it can
+    be mapped."""
+    if path == '-':
+        return getattr(sys.stdin, 'buffer', sys.stdin), None
+
+    source = open(path, 'rb')
+    try:
+        mapped = mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ)
+        return source, mapped
+    except (ValueError, EnvironmentError):  # empty files, devices
+        return source, None
+
+
+def _open_output(path):
+    """Returns a writable binary file and the path of the temporary file
+    to rename to *path* when done, or `None` for stdout."""
+    if path == '-':
+        return getattr(sys.stdout, 'buffer', sys.stdout), None
+
+    directory, name = os.path.split(os.path.abspath(path))
+    temporary = os.path.join(directory, ".{}.{}.tmp".format(
+        name, binascii.hexlify(os.urandom(4)).decode('ascii')))
+    descriptor = os.open(temporary, os.O_WRONLY | os.O_CREAT | os.O_EXCL |
+                         getattr(os, 'O_BINARY', 0), 0o666)
+    return os.fdopen(descriptor, 'wb'), temporary
+
+
+def _close_input(source, mapped):
+    if mapped is not None:
+        try:
+            mapped.close()
+        except BufferError:  # closed when the last view is released
+            pass
+    if source is not getattr(sys.stdin, 'buffer', sys.stdin):
+        source.close()
+
+
+def _read_chunks(source, mapped, chunk_size):
+    if mapped is not None:
+        try:
+            view = memoryview(mapped)
+        except TypeError:  # Python 2
+            view = mapped
+
+        for start in range(0, len(view), chunk_size):
+            yield view[start:start + chunk_size]
+        return
+
+    while True:
+        chunk = source.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+
+def _hold_back(chunks, length, tail):
+    """Yields *chunks* without the last *length* bytes, which are stored
+    in the list *tail*."""
+    held = b''
+    for chunk in chunks:
+        if len(chunk) < length:  # only the last chunk is short
+            held = bytes(held) + bytes(chunk)
+            continue
+        if held:
+            yield held
+        held = chunk
+
+    if len(held) < length:
+        raise ValueError("Input is shorter than the tag")
+
+    if len(held) > length:
+        yield held[:len(held) - length]
+    tail.append(bytes(held[len(held) - length:]))
+
+
+def _put(target, item, stop):
+    while not stop.is_set():
+        try:
+            target.put(item, timeout=0.1)
+            return
+        except queue.Full:
+            pass
+
+
+def _put_done(target, stop):
+    """Puts the `_DONE` sentinel, also after *stop* was set: waiting chunks
+    are discarded then to make room for it."""
+    _put(target, _DONE, stop)
+    if stop.is_set():
+        while True:
+            try:
+                target.get_nowait()
+            except queue.Empty:
+                break
+        target.put_nowait(_DONE)
+
+
+def _get(source, stop):
+    while True:
+        try:
+            return source.get(timeout=0.1)
+        except queue.Empty:
+            if stop.is_set():
+                return _DONE
+
+
+def _produce(chunks, target, stop, errors):
+    """Reader stage: moves *chunks* into *target*."""
+    try:
+        for chunk in chunks:
+            _put(target, chunk, stop)
+            if stop.is_set():
+                return
+    except Exception as error:  # re-raised by the main thread
+        errors.append(error)
+    finally:
+        _put_done(target, stop)
+
+
+def _consume(destination, source, stop, errors):
+    """Writer stage: writes the chunks from *source*."""
+    try:
+        for chunk in iter(lambda: _get(source, stop), _DONE):
+            destination.write(chunk)
+    except Exception as error:
+        errors.append(error)
+        stop.set()
+
+
+def _finish_output(destination, temporary, path, keep, errors):
+    """Closes the temporary output file and renames it to *path* if
+    *keep* is true, otherwise removes it. Errors are added to *errors*."""
+    try:
+        destination.close()
+    except EnvironmentError as error:
+        errors.append(error)
+        keep = False
+
+    if keep:
+        try:
+            getattr(os, 'replace', os.rename)(temporary, path)
+            return
+        except EnvironmentError as error:
+            errors.append(error)
+
+    try:
+        os.remove(temporary)
+    except EnvironmentError as error:
+        errors.append(error)
+
+
+def _transform(cipher, chunks, decrypt, workers, backend):
+    """Cipher stage."""
+    if cipher.mode in (MODE_ECB, MODE_CTR):
+        function = parallel.decrypt if decrypt else parallel.encrypt
+        for chunk in chunks:
+            yield function(cipher, chunk, workers, backend)
+    else:
+        function = cipher.iterdecrypt if decrypt else cipher.iterencrypt
+        for chunk in function(chunks):
+            yield chunk
+
+
+def run(args, stderr=None):
+    """Encrypt or decrypt a file as described by the parsed arguments.
+
+    :return: The number of bytes read.
+    :rtype: int"""
+    stderr = stderr or sys.stderr
+    cipher = create_cipher(args)
+    decrypt = args.action == "decrypt"
+    if decrypt and cipher.mode in MODES_AEAD and args.output == '-':
+        raise ValueError("AEAD decryption cannot write to stdout, the "
+                         "plaintext is only authenticated at the end")
+
+    chunk_size = max(1, args.chunk_size // cipher.block_size) * \
+        cipher.block_size
+
+    source, mapped = _open_input(args.input)
+    try:
+        destination, temporary = _open_output(args.output)
+    except BaseException:
+        _close_input(source, mapped)
+        raise
+
+    stop = threading.Event()
+    errors = []
+    read, written = queue.Queue(QUEUE_SIZE), queue.Queue(QUEUE_SIZE)
+    stats = {'read': 0}
+    tag = []
+    done = False
+
+    def counted(chunks):
+        for chunk in chunks:
+            stats['read'] += len(chunk)
+            yield chunk
+
+    chunks = counted(_read_chunks(source, mapped, chunk_size))
+    if decrypt and cipher.mode in MODES_AEAD:
+        chunks = _hold_back(chunks, cipher.mac_len, tag)
+
+    reader = threading.Thread(target=_produce,
+                              args=(chunks, read, stop, errors))
+    writer = threading.Thread(target=_consume,
+                              args=(destination, written, stop, errors))
+    reader.daemon = writer.daemon = True
+
+    start = time.time()
+    reader.start()
+    writer.start()
+
+    try:
+        for chunk in _transform(cipher, iter(lambda: _get(read, stop), _DONE),
+                                decrypt, args.workers, args.backend):
+            if errors:
+                break
+            _put(written, chunk, stop)
+
+        if not errors and cipher.mode in MODES_AEAD:
+            if decrypt:
+                cipher.verify(tag[0])
+            else:
+                _put(written, cipher.digest(), stop)
+        done = True
+    except BaseException:
+        stop.set()
+        raise
+    finally:
+        _put_done(written, stop)
+        writer.join()
+        reader.join()
+
+        _close_input(source, mapped)
+        if temporary is not None:
+            _finish_output(destination, temporary, args.output,
+                           done and not errors, errors)
+
+    if errors:
+        raise errors[0]
+
+    elapsed = max(time.time() - start, 1e-9)
+    if not args.quiet:
+        stderr.write("{} {} bytes in {:.3f} s ({:.2f} MiB/s)\n".format(
+            "Decrypted" if decrypt else "Encrypted", stats['read'], elapsed,
+            stats['read'] / elapsed / 2**20))
+
+    return stats['read']
+
+
+def main(argv=None):
+    """Entry point of ``python -m pep272_encryption``.
+
+    :param list argv: Arguments, defaults to ``sys.argv[1:]``.
+    :return: The exit status.
+    :rtype: int"""
+    parser = create_parser()
+    args = parser.parse_args(argv)
+
+    try:
+        run(args)
+    except (ValueError, TypeError, ImportError, AttributeError,
+            EnvironmentError) as error:
+        sys.stderr.write("{}: error: {}\n".format(parser.prog, error))
+        return 1
+
+    return 0
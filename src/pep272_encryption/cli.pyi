@@ -0,0 +1,65 @@
+import argparse
+import mmap
+import threading
+
+from typing import (Any, BinaryIO, Dict, Iterable, Iterator, List, Optional,
+                    Sequence, TextIO, Tuple, Type)
+
+from . import PEP272Cipher
+
+MODES: Dict[str, int]
+CHUNK_SIZE: int
+QUEUE_SIZE: int
+
+
+def load_cipher(path: str) -> Type[PEP272Cipher]:
+    ...
+
+
+def create_parser() -> argparse.ArgumentParser:
+    ...
+
+
+def create_cipher(args: argparse.Namespace) -> PEP272Cipher:
+    ...
+
+
+def _open_input(path: str) -> Tuple[BinaryIO, Optional[mmap.mmap]]:
+    ...
+
+
+def _open_output(path: str) -> Tuple[BinaryIO, Optional[str]]:
+    ...
+
+
+def _close_input(source: BinaryIO, mapped: Optional[mmap.mmap]) -> None:
+    ...
+
+
+def _read_chunks(source: BinaryIO, mapped: Optional[mmap.mmap],
+                 chunk_size: int) -> Iterator[Any]:
+    ...
+
+
+def _hold_back(chunks: Iterable[Any], length: int,
+               tail: List[bytes]) -> Iterator[Any]:
+    ...
+
+
+def _finish_output(destination: BinaryIO, temporary: str, path: str,
+                   keep: bool, errors: List[BaseException]) -> None:
+    ...
+
+
+def _transform(cipher: PEP272Cipher, chunks: Iterable[Any], decrypt: bool,
+               workers: Optional[int],
+               backend: Optional[str]) -> Iterator[bytes]:
+    ...
+
+
+def run(args: argparse.Namespace, stderr: TextIO=None) -> int:
+    ...
+
+
+def main(argv: Sequence[str]=None) -> int:
+    ...
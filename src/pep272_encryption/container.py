@@ -0,0 +1,306 @@
+"""
+Chunked container format for *CBC* and *CFB* mode, with independent
+chunks that are encrypted in parallel and can be read at random offsets.
+
+The payload is split into chunks of a fixed size. Every chunk is encrypted
+with its own cipher object, whose IV is derived from the base IV and the
+chunk number *i* as ``E_K(base IV XOR i)``, so IVs stay unpredictable.
+Chunks are processed by the workers of :py:mod:`pep272_encryption.parallel`
+if the cipher class allows it.
+
+Layout, all integers big endian:
+
+============  ============================================================
+Header        ``PEP272C1``, mode (1 byte), segment size in bytes (1 byte,
+              CFB only), IV length (1 byte), chunk size (4 bytes), base IV
+Chunks        Ciphertext of each chunk; the last one is zero-padded to
+              whole blocks (CBC) or segments (CFB)
+Index         Offset of each chunk in the file (8 bytes each)
+Footer        Offset of the index (8 bytes), payload size (8 bytes),
+              ``PEP272C1``
+============  ============================================================
+
+Chunks are not authenticated, combine the container with a MAC (e.g.
+:py:class:`~pep272_encryption.stream.EncryptThenMAC` over the whole file)
+if the storage is not trusted.
+
+Example:
+
+::
+
+    >>> with open('data.p272', 'wb') as target:
+    ...     with ContainerWriter(target, YourCipher, key) as writer:
+    ...         writer.write(payload)
+    >>> with open('data.p272', 'rb') as source:
+    ...     part = ContainerReader(source, YourCipher, key).read(2**30, 4096)
+
+"""
+
+import os
+import pickle
+import struct
+
+from . import parallel
+from . import MODE_CBC, MODE_CFB
+from .util import xor_strings, to_bytes
+
+#: First and last bytes of every container.
+MAGIC = b'PEP272C1'
+
+#: Modes a container can use.
+MODES = (MODE_CBC, MODE_CFB)
+
+#: Default payload bytes per chunk.
+CHUNK_SIZE = 2**16
+
+_HEADER = struct.Struct('>8sBBBI')
+_FOOTER = struct.Struct('>QQ8s')
+_OFFSET = struct.Struct('>Q')
+
+
+class _Container(object):
+    """Cipher parameters and chunk processing shared by reader and
+    writer."""
+
+    def __init__(self, cipher_class, key, mode, iv, segment_size,
+                 chunk_size, workers, backend, kwargs):
+        if mode not in MODES:
+            raise ValueError("Containers support CBC and CFB mode only")
+
+        if mode == MODE_CFB:
+            kwargs = dict(kwargs, segment_size=segment_size or 8)
+
+        # Checks the parameters and holds the base IV.
+        self._template = cipher_class(key, mode, iv, **kwargs)
+
+        if cipher_class.block_size < 8:
+            raise ValueError("Containers require a block size of at least "
+                             "8 bytes")
+
+        unit = self._template._unit_size()
+        if chunk_size < unit or chunk_size % unit or chunk_size >= 2**32:
+            raise ValueError("'chunk_size' must be a multiple of {} bytes "
+                             "below 4 GiB".format(unit))
+
+        self.cipher_class = cipher_class
+        self.key = key
+        self.mode = mode
+        self.iv = iv
+        self.segment_size = self._template.segment_size
+        self.chunk_size = chunk_size
+        self.workers = workers or getattr(os, 'cpu_count', lambda: 1)() or 1
+        self.backend = parallel._select_backend(backend)
+        self._kwargs = kwargs
+        self._spec = parallel._class_spec(self._template)
+
+    def chunk_iv(self, number):
+        """Return the IV of chunk *number*.
+
+        :rtype: bytes"""
+        size = self.cipher_class.block_size
+        return self._template.encrypt_block(
+            self.key, xor_strings(self.iv, to_bytes(number, size, 'big')),
+            **self._template.kwargs)
+
+    def _crypt_chunks(self, data, first, decrypt):
+        """Encrypts or decrypts consecutive chunks in *data*, starting
+        with chunk number *first*."""
+        view = memoryview(data)
+        chunks = [(start, min(start + self.chunk_size, len(view)), number)
+                  for number, start in enumerate(
+                      range(0, len(view), self.chunk_size), first)]
+
+        if self._spec is None:
+            out = []
+            for start, end, number in chunks:
+                cipher = self.cipher_class(self.key, self.mode,
+                                           self.chunk_iv(number),
+                                           **self._kwargs)
+                function = cipher.decrypt if decrypt else cipher.encrypt
+                out.append(function(view[start:end].tobytes()))
+            return out
+
+        extra = dict((name, self._kwargs[name]) for name in ('segment_size',)
+                     if name in self._kwargs)
+        slices = [(start, end, pickle.dumps(
+                   dict(extra, IV=self.chunk_iv(number)), protocol=2))
+                  for start, end, number in chunks]
+
+        return parallel._BACKENDS[self.backend](self._spec, decrypt, view,
+                                                slices)
+
+
+class ContainerWriter(_Container):
+    """Writes a container to a binary file.
+
+    Written data is collected until a chunk for every worker is complete,
+    then these chunks are encrypted at once. Call :py:meth:`close` (or use
+    it as context manager) to write the last chunk and the index.
+
+    :param fileobj: Binary file opened for writing, at its start.
+    :param cipher_class: A subclass of
+        :py:class:`~pep272_encryption.PEP272Cipher`.
+    :param bytes key: The key.
+    :param int mode: :py:data:`~pep272_encryption.MODE_CBC` or
+        :py:data:`~pep272_encryption.MODE_CFB`.
+    :param bytes IV: Base IV, random by default.
+    :param int segment_size: CFB segment size in bits, defaults to 8.
+    :param int chunk_size: Payload bytes per chunk, a multiple of the
+        block or segment size.
+    :param int workers: Chunks encrypted at once, defaults to the number
+        of CPUs.
+    :param str backend: See :py:data:`pep272_encryption.parallel.BACKENDS`.
+    :param \\**kwargs: Passed to the cipher class.
+    """
+
+    def __init__(self, fileobj, cipher_class, key, mode=MODE_CBC, IV=None,
+                 segment_size=None, chunk_size=CHUNK_SIZE, workers=None,
+                 backend=None, **kwargs):
+        IV = IV or os.urandom(cipher_class.block_size)
+        _Container.__init__(self, cipher_class, key, mode, IV, segment_size,
+                            chunk_size, workers, backend, kwargs)
+
+        self.fileobj = fileobj
+        self.size = 0
+        self.closed = False
+        self._buffer = bytearray()
+        self._offsets = []
+
+        segment = max(self.segment_size, 0) // 8  # 0 in CBC mode
+        fileobj.write(_HEADER.pack(MAGIC, mode, segment, len(IV),
+                                   chunk_size) + IV)
+        self._position = _HEADER.size + len(IV)
+
+    def write(self, data):
+        """Add *data* to the payload.
+
+        :param bytes data: The next piece of the payload."""
+        if self.closed:
+            raise ValueError("write() on a closed container")
+
+        self._buffer += data
+        self.size += len(data)
+
+        batch = self.chunk_size * self.workers
+        if len(self._buffer) >= batch:
+            complete = len(self._buffer) // batch * batch
+            data, self._buffer = (self._buffer[:complete],
+                                  self._buffer[complete:])
+            self._flush(data)
+
+    def close(self):
+        """Write the last chunk, the index and the footer. The file
+        object is not closed."""
+        if self.closed:
+            return
+
+        if self._buffer:
+            self._buffer += b'\x00' * (-len(self._buffer) %
+                                       self._template._unit_size())
+            self._flush(self._buffer)
+            self._buffer = bytearray()
+
+        index = b"".join(_OFFSET.pack(offset) for offset in self._offsets)
+        self.fileobj.write(index + _FOOTER.pack(self._position, self.size,
+                                                MAGIC))
+        self.closed = True
+
+    def _flush(self, data):
+        chunks = self._crypt_chunks(data, len(self._offsets), False)
+        for chunk in chunks:
+            self._offsets.append(self._position)
+            self._position += len(chunk)
+
+        self.fileobj.write(b"".join(chunks))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+
+
+class ContainerReader(_Container):
+    """Reads byte ranges of a container, decrypting only the chunks that
+    overlap them.
+
+    Mode, base IV and chunk size are read from the file.
+
+    :param fileobj: Binary file opened for reading, must be seekable.
+    :param cipher_class: The cipher class used for writing.
+    :param bytes key: The key.
+    :param int workers: Chunks decrypted at once, defaults to the number
+        of CPUs.
+    :param str backend: See :py:data:`pep272_encryption.parallel.BACKENDS`.
+    :param \\**kwargs: Passed to the cipher class.
+    :raises ValueError: If the file is not a container.
+    """
+
+    def __init__(self, fileobj, cipher_class, key, workers=None,
+                 backend=None, **kwargs):
+        fileobj.seek(0)
+        header = fileobj.read(_HEADER.size)
+        if len(header) != _HEADER.size:
+            raise ValueError("Not a container: file is too short")
+
+        magic, mode, segment, iv_length, chunk_size = _HEADER.unpack(header)
+        if magic != MAGIC:
+            raise ValueError("Not a container: unknown format")
+
+        iv = fileobj.read(iv_length)
+        _Container.__init__(self, cipher_class, key, mode, iv, segment * 8,
+                            chunk_size, workers, backend, kwargs)
+
+        fileobj.seek(-_FOOTER.size, os.SEEK_END)
+        index_offset, self.size, magic = _FOOTER.unpack(
+            fileobj.read(_FOOTER.size))
+        if magic != MAGIC:
+            raise ValueError("Not a container: footer is missing")
+
+        self.fileobj = fileobj
+        self._offsets = self._read_index(index_offset)
+
+    def _read_index(self, index_offset):
+        """Returns the chunk offsets, followed by the end of the last
+        chunk."""
+        count = -(-self.size // self.chunk_size)
+        self.fileobj.seek(index_offset)
+        index = self.fileobj.read(count * _OFFSET.size)
+        if len(index) != count * _OFFSET.size:
+            raise ValueError("Not a container: index is truncated")
+
+        return [_OFFSET.unpack_from(index, i * _OFFSET.size)[0]
+                for i in range(count)] + [index_offset]
+
+    def __len__(self):
+        return self.size
+
+    def read(self, offset=0, length=None):
+        """Decrypt *length* bytes of the payload from *offset* on.
+
+        :param int offset: Position in the payload.
+        :param int length: Number of bytes, defaults to the rest.
+        :return: The plaintext, shorter at the end of the payload.
+        :rtype: bytes"""
+        if offset < 0 or (length is not None and length < 0):
+            raise ValueError("'offset' and 'length' must not be negative")
+
+        end = self.size if length is None else min(self.size,
+                                                    offset + length)
+        if offset >= end:
+            return b""
+
+        first = offset // self.chunk_size
+        last = (end - 1) // self.chunk_size
+        out = []
+
+        for batch in range(first, last + 1, self.workers):
+            numbers = range(batch, min(batch + self.workers, last + 1))
+            start = self._offsets[numbers[0]]
+            self.fileobj.seek(start)
+            data = self.fileobj.read(self._offsets[numbers[-1] + 1] - start)
+            out.extend(self._crypt_chunks(data, numbers[0], True))
+
+        skip = offset - first * self.chunk_size
+        return b"".join(out)[skip:skip + end - offset]
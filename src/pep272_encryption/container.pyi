@@ -0,0 +1,86 @@
+from typing import Any, BinaryIO, ByteString, Dict, List, Optional, Type
+
+from . import PEP272Cipher
+
+MAGIC: bytes
+MODES: tuple
+CHUNK_SIZE: int
+
+
+class _Container(object):
+    cipher_class: Type[PEP272Cipher]
+    key: bytes
+    mode: int
+    iv: bytes
+    segment_size: int
+    chunk_size: int
+    workers: int
+    backend: str
+    _template: PEP272Cipher
+    _kwargs: Dict[str, Any]
+    _spec: Optional[bytes]
+
+    def __init__(self, cipher_class: Type[PEP272Cipher], key: bytes,
+                 mode: int, iv: bytes, segment_size: Optional[int],
+                 chunk_size: int, workers: Optional[int],
+                 backend: Optional[str], kwargs: Dict[str, Any]) -> None:
+        ...
+
+    def chunk_iv(self, number: int) -> bytes:
+        ...
+
+    def _crypt_chunks(self, data: ByteString, first: int,
+                      decrypt: bool) -> List[bytes]:
+        ...
+
+
+class ContainerWriter(_Container):
+    fileobj: BinaryIO
+    size: int
+    closed: bool
+    _buffer: bytearray
+    _offsets: List[int]
+    _position: int
+
+    def __init__(self, fileobj: BinaryIO, cipher_class: Type[PEP272Cipher],
+                 key: bytes, mode: int=..., IV: bytes=None,
+                 segment_size: int=None, chunk_size: int=CHUNK_SIZE,
+                 workers: int=None, backend: str=None,
+                 **kwargs: Any) -> None:
+        ...
+
+    def write(self, data: ByteString) -> None:
+        ...
+
+    def close(self) -> None:
+        ...
+
+    def _flush(self, data: ByteString) -> None:
+        ...
+
+    def __enter__(self) -> 'ContainerWriter':
+        ...
+
+    def __exit__(self, exc_type: Any, exc_value: Any,
+                 traceback: Any) -> None:
+        ...
+
+
+class ContainerReader(_Container):
+    fileobj: BinaryIO
+    size: int
+    _offsets: List[int]
+
+    def __init__(self, fileobj: BinaryIO, cipher_class: Type[PEP272Cipher],
+                 key: bytes, workers: int=None, backend: str=None,
+                 **kwargs: Any) -> None:
+        ...
+
+    def _read_index(self, index_offset: int) -> List[int]:
+        ...
+
+    def __len__(self) -> int:
+        ...
+
+    def read(self, offset: int=0, length: int=None) -> bytes:
+        ...
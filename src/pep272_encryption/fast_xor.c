@@ -1,38 +1,62 @@
 #define PY_SSIZE_T_CLEAN
 #include <Python.h>
 
-#include <stdlib.h>
-
-
-static PyObject* fast_xor(PyObject *self, PyObject *args, PyObject *kwargs) {
-    Py_ssize_t a_length, b_length, length;
-    char *a, *b, *out;
-
+/*
+ * The module has no state and fast_xor only touches its arguments and the
+ * newly created result, so it is safe to run without the GIL and in
+ * sub-interpreters with their own GIL.
+ *
+ * Py_buffer ("y*") is part of the limited API since Python 3.11 only;
+ * older limited API builds fall back to read-only bytes ("y#").
+ */
+#if defined(Py_LIMITED_API) && Py_LIMITED_API+0 < 0x030B0000
+#define FAST_XOR_NO_BUFFER
+#endif
+
+
+static PyObject* fast_xor(PyObject *self, PyObject *args) {
+    Py_ssize_t a_length, b_length, length, i;
+    const unsigned char *a, *b;
+    unsigned char *out;
+    PyObject *output;
+#ifndef FAST_XOR_NO_BUFFER
+    Py_buffer a_view, b_view;
+#endif
+
+#ifdef FAST_XOR_NO_BUFFER
     if(!PyArg_ParseTuple(args, "y#y#",
                          &a, &a_length, &b, &b_length)) {
         return NULL;
     }
-
-    if (NULL == a || NULL == b) {
-        PyErr_SetString(PyExc_TypeError, "One of the parameters is None");
+#else
+    /* Holding the buffers keeps a bytearray from being resized by another
+       thread while it is read. */
+    if(!PyArg_ParseTuple(args, "y*y*", &a_view, &b_view)) {
         return NULL;
     }
 
+    a = (const unsigned char *) a_view.buf;
+    b = (const unsigned char *) b_view.buf;
+    a_length = a_view.len;
+    b_length = b_view.len;
+#endif
+
     length = a_length < b_length ? a_length : b_length;
 
-    if (0 == length) {
-        return Py_BuildValue("y#", "\0", 0);
-    }
+    output = PyBytes_FromStringAndSize(NULL, length);
 
-    out = malloc(length);
+    if (NULL != output) {
+        out = (unsigned char *) PyBytes_AsString(output);
 
-    Py_ssize_t i;
-    for (i = 0; i < length; i++) {
-        out[i] = a[i] ^ b[i];
+        for (i = 0; i < length; i++) {
+            out[i] = a[i] ^ b[i];
+        }
     }
 
-    PyObject* output = Py_BuildValue("y#", out, length);
-    free(out);
+#ifndef FAST_XOR_NO_BUFFER
+    PyBuffer_Release(&a_view);
+    PyBuffer_Release(&b_view);
+#endif
 
     return output;
 };
@@ -44,15 +68,30 @@ static PyMethodDef fastXorMethods[] = {
 };
 
 
+static PyModuleDef_Slot fastXorSlots[] = {
+#ifdef Py_mod_multiple_interpreters
+    {Py_mod_multiple_interpreters, Py_MOD_PER_INTERPRETER_GIL_SUPPORTED},
+#endif
+#ifdef Py_mod_gil
+    {Py_mod_gil, Py_MOD_GIL_NOT_USED},
+#endif
+    {0, NULL}
+};
+
+
 static struct PyModuleDef fastXorModule = {
     PyModuleDef_HEAD_INIT,
     "_fast_xor",
     NULL,
-    -1,
-    fastXorMethods
+    0,
+    fastXorMethods,
+    fastXorSlots,
+    NULL,
+    NULL,
+    NULL
 };
 
 PyMODINIT_FUNC
-PyInit__fast_xor() {
-    return PyModule_Create(&fastXorModule);
+PyInit__fast_xor(void) {
+    return PyModuleDef_Init(&fastXorModule);
 }
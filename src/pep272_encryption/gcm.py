@@ -0,0 +1,123 @@
+"""
+GHASH, the universal hash function of the Galois/Counter Mode (GCM).
+
+Multiplications in GF(2^128) use 8-bit Shoup tables: for the hash subkey
+*H* one table of 256 precomputed products is built per byte position, so
+that multiplying a block by *H* costs 16 table lookups and XORs instead of
+128 conditional shifts.
+
+The tables only depend on *H*; :py:class:`pep272_encryption.PEP272Cipher`
+caches them per key.
+
+"""
+
+from .util import from_bytes, to_bytes
+
+#: Reduction constant of the GCM polynomial x^128 + x^7 + x^2 + x + 1
+#: in GCM's reflected bit order.
+_R = 0xE1 << 120
+
+
+def ghash_tables(h):
+    """Precompute the multiplication tables for the hash subkey *h*.
+
+    The tables are returned in reverse byte order, so the least
+    significant byte of a block is looked up in the first table.
+
+    :param bytes h: The hash subkey, the encrypted all-zero block.
+    :rtype: tuple"""
+    value = from_bytes(h, 'big')
+
+    # powers[j] is H * x^j, bit j of a block being x^j.
+    powers = []
+    for _ in range(128):
+        powers.append(value)
+        value = (value >> 1) ^ _R if value & 1 else value >> 1
+
+    tables = []
+    for position in range(16):
+        table = [0] * 256
+        for bit in range(8):
+            table[0x80 >> bit] = powers[8 * position + bit]
+        for byte in range(1, 256):
+            lowest = byte & -byte
+            if byte != lowest:
+                table[byte] = table[byte ^ lowest] ^ table[lowest]
+        tables.append(table)
+
+    return tuple(reversed(tables))
+
+
+def gf_multiply(tables, x):
+    """Multiply the block *x* (an integer) by the hash subkey.
+
+    :param tuple tables: Tables created by :py:func:`ghash_tables`.
+    :param int x: The block to multiply, as big endian integer.
+    :rtype: int"""
+    z = 0
+    for table in tables:
+        z ^= table[x & 0xff]
+        x >>= 8
+    return z
+
+
+class GHASH(object):
+    """Incremental GHASH computation.
+
+    Data can be fed in pieces of any length, incomplete blocks are kept
+    until more data arrives or :py:meth:`flush` pads them with zeros.
+
+    :param tuple tables: Tables created by :py:func:`ghash_tables`.
+    """
+
+    def __init__(self, tables):
+        self._tables = tables
+        self._state = 0
+        self._buffer = bytearray()
+
+    def __getstate__(self):
+        """The tables are not pickled, the owner restores them."""
+        state = self.__dict__.copy()
+        del state['_tables']
+        return state
+
+    def update(self, data):
+        """Feed *data* into the hash.
+
+        :param bytes data: The data to authenticate."""
+        tables = self._tables
+        state = self._state
+        view = memoryview(data)
+        offset = 0
+
+        if self._buffer:
+            offset = 16 - len(self._buffer)
+            self._buffer += view[:offset]
+            if len(self._buffer) < 16:
+                return
+            state = gf_multiply(tables, state ^ from_bytes(
+                bytes(self._buffer), 'big'))
+            del self._buffer[:]
+
+        end = offset + (len(view) - offset) // 16 * 16
+        for i in range(offset, end, 16):
+            state = gf_multiply(tables, state ^ from_bytes(
+                view[i:i + 16].tobytes(), 'big'))
+
+        self._buffer += view[end:]
+        self._state = state
+
+    def flush(self):
+        """Pad a pending incomplete block with zeros and hash it."""
+        if self._buffer:
+            self._buffer += b'\x00' * (16 - len(self._buffer))
+            self._state = gf_multiply(self._tables, self._state ^ from_bytes(
+                bytes(self._buffer), 'big'))
+            del self._buffer[:]
+
+    def digest(self):
+        """Return the current hash value, after padding pending data.
+
+        :rtype: bytes"""
+        self.flush()
+        return to_bytes(self._state, 16, 'big')
@@ -0,0 +1,27 @@
+from typing import Any, ByteString, Dict, List, Tuple
+
+Tables = Tuple[List[int], ...]
+
+
+def ghash_tables(h: ByteString) -> Tables:
+    ...
+
+def gf_multiply(tables: Tables, x: int) -> int:
+    ...
+
+
+class GHASH:
+    def __init__(self, tables: Tables):
+        ...
+
+    def __getstate__(self) -> Dict[str, Any]:
+        ...
+
+    def update(self, data: ByteString) -> None:
+        ...
+
+    def flush(self) -> None:
+        ...
+
+    def digest(self) -> bytes:
+        ...
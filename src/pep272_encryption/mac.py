@@ -0,0 +1,189 @@
+"""
+Message authentication codes built from the block function of a
+:py:class:`~pep272_encryption.PEP272Cipher`.
+
+Both MACs process the message as it arrives: only the chaining value and
+at most one pending block are kept, so memory use does not depend on the
+message length and no ciphertext is produced.
+
+Example:
+
+::
+
+    >>> mac = CMAC(YourCipher(key, MODE_ECB))
+    >>> mac.update(b'first part')
+    >>> mac.update(b'second part')
+    >>> tag = mac.digest()
+
+"""
+
+import binascii
+import hmac
+
+from .util import from_bytes, to_bytes
+
+#: Constants for the subkey derivation of CMAC, by block size.
+_RB = {
+    8: 0x1B,
+    16: 0x87
+}
+
+
+class CBCMAC(object):
+    """Raw CBC-MAC.
+
+    The raw CBC-MAC is only secure for messages of one fixed length,
+    that is a multiple of the block size. Use :py:class:`CMAC` otherwise.
+
+    :param cipher: A cipher object; its block function, key and keyword
+        arguments are used. The mode of operation does not matter.
+    :type cipher: pep272_encryption.PEP272Cipher
+    :param bytes msg: Optional first piece of the message.
+    :param int mac_len: Length of the tag, defaults to the block size.
+    """
+
+    def __init__(self, cipher, msg=None, mac_len=None):
+        self._cipher = cipher
+        self.block_size = cipher.block_size
+        self.digest_size = mac_len or self.block_size
+
+        if not 0 < self.digest_size <= self.block_size:
+            raise ValueError("'mac_len' must be between 1 and block_size")
+
+        self._state = 0
+        self._pending = bytearray(self.block_size)  # reused, never resized
+        self._pending_length = 0
+
+        if msg is not None:
+            self.update(msg)
+
+    def _encipher(self, value):
+        """Encrypt the block given as integer."""
+        cipher = self._cipher
+        return from_bytes(cipher.encrypt_block(
+            cipher.key, to_bytes(value, self.block_size, 'big'),
+            **cipher.kwargs), 'big')
+
+    def update(self, msg):
+        """Continue authentication with the next piece of the message.
+
+        The last block is held back until :py:meth:`digest`, as it is
+        treated differently.
+
+        :param bytes msg: The next piece of the message."""
+        view = memoryview(msg)
+        size = self.block_size
+        pending = self._pending
+        filled = self._pending_length
+
+        if filled + len(view) <= size:
+            pending[filled:filled + len(view)] = view
+            self._pending_length += len(view)
+            return
+
+        start = size - filled
+        pending[filled:] = view[:start]
+        state = self._encipher(self._state ^ from_bytes(bytes(pending),
+                                                        'big'))
+
+        # Keep the last (possibly complete) block pending.
+        end = start + (len(view) - start - 1) // size * size
+        for i in range(start, end, size):
+            state = self._encipher(state ^ from_bytes(
+                view[i:i + size].tobytes(), 'big'))
+
+        self._pending_length = len(view) - end
+        pending[:self._pending_length] = view[end:]
+        self._state = state
+
+    def _last_block(self):
+        if self._pending_length == self.block_size:
+            return from_bytes(bytes(self._pending), 'big')
+
+        raise ValueError("CBC-MAC input length must be a multiple of "
+                         "block_size")
+
+    def digest(self):
+        """Return the tag of the message processed so far.
+
+        More data can be added with :py:meth:`update` afterwards.
+
+        :rtype: bytes"""
+        tag = self._encipher(self._state ^ self._last_block())
+        return to_bytes(tag, self.block_size, 'big')[:self.digest_size]
+
+    def hexdigest(self):
+        """Return the tag as hex encoded string.
+
+        :rtype: str"""
+        return binascii.hexlify(self.digest()).decode('ascii')
+
+    def verify(self, mac_tag):
+        """Check the tag in constant time.
+
+        :param bytes mac_tag: The expected tag.
+        :raises ValueError: When the tag does not match."""
+        if not hmac.compare_digest(self.digest(), mac_tag):
+            raise ValueError("MAC check failed")
+
+    def hexverify(self, hex_mac_tag):
+        """Check the hex encoded tag in constant time.
+
+        :param str hex_mac_tag: The expected tag.
+        :raises ValueError: When the tag does not match."""
+        self.verify(binascii.unhexlify(hex_mac_tag))
+
+    def copy(self):
+        """Return a copy, that can continue independently.
+
+        :rtype: CBCMAC"""
+        other = self.__class__.__new__(self.__class__)
+        other.__dict__.update(self.__dict__)
+        other._pending = bytearray(self._pending)
+        return other
+
+
+class CMAC(CBCMAC):
+    """CMAC (OMAC1) as specified in NIST SP 800-38B and RFC 4493.
+
+    Works with block ciphers with 64 or 128 bit blocks. The subkeys K1 and
+    K2 are cached per key.
+
+    :param cipher: A cipher object; its block function, key and keyword
+        arguments are used. The mode of operation does not matter.
+    :type cipher: pep272_encryption.PEP272Cipher
+    :param bytes msg: Optional first piece of the message.
+    :param int mac_len: Length of the tag, defaults to the block size.
+    """
+
+    def __init__(self, cipher, msg=None, mac_len=None):
+        if cipher.block_size not in _RB:
+            raise ValueError("CMAC requires a block_size of 8 or 16")
+
+        CBCMAC.__init__(self, cipher, None, mac_len)
+        self._subkeys = cipher._key_material("cmac", self._derive_subkeys)
+
+        if msg is not None:
+            self.update(msg)
+
+    def _derive_subkeys(self):
+        bits = 8 * self.block_size
+        mask = 2**bits - 1
+
+        def double(value):
+            if value >> (bits - 1):
+                return ((value << 1) & mask) ^ _RB[self.block_size]
+            return value << 1
+
+        k1 = double(self._encipher(0))
+        return k1, double(k1)
+
+    def _last_block(self):
+        pending = from_bytes(bytes(self._pending), 'big')
+
+        if self._pending_length == self.block_size:
+            return pending ^ self._subkeys[0]
+
+        bits = 8 * (self.block_size - self._pending_length)
+        padded = pending >> bits << bits | 1 << (bits - 1)
+        return padded ^ self._subkeys[1]
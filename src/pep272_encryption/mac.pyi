@@ -0,0 +1,43 @@
+from typing import ByteString, Optional, Tuple
+
+from . import PEP272Cipher
+
+
+class CBCMAC:
+    block_size: int
+    digest_size: int
+
+    def __init__(self, cipher: PEP272Cipher, msg: ByteString=None,
+                 mac_len: int=None):
+        ...
+
+    def _encipher(self, value: int) -> int:
+        ...
+
+    def _last_block(self) -> int:
+        ...
+
+    def update(self, msg: ByteString) -> None:
+        ...
+
+    def digest(self) -> bytes:
+        ...
+
+    def hexdigest(self) -> str:
+        ...
+
+    def verify(self, mac_tag: ByteString) -> None:
+        ...
+
+    def hexverify(self, hex_mac_tag: str) -> None:
+        ...
+
+    def copy(self) -> 'CBCMAC':
+        ...
+
+
+class CMAC(CBCMAC):
+    _subkeys: Tuple[int, int]
+
+    def _derive_subkeys(self) -> Tuple[int, int]:
+        ...
@@ -0,0 +1,300 @@
+"""
+Opt-in detection of reused nonces and IVs.
+
+Once a registry is installed, every cipher object registers its IV (CBC,
+CFB, OFB, PGP), nonce (GCM, OCB) or counter nonce (CTR with a
+:py:class:`~pep272_encryption.util.Counter`, the first counter block if
+it has no nonce) together with its class and key on the first call to
+``encrypt()``, and raises
+:py:exc:`NonceReuseError` if the combination has been used before.
+Decryption never registers anything. Random nonces created by
+:py:class:`~pep272_encryption.util.Counter` are checked when the counter
+is created and are drawn again if they have been seen before.
+
+The registry is a scalable Bloom filter: memory grows with the number of
+nonces, but stays far below an exact set, and each check takes the same
+time, however many nonces are stored. It never misses a reused nonce, but
+reports a fresh one as reused with a probability of at most *error_rate*,
+as long as *max_bytes* is not reached. Beyond that, the last filter keeps
+taking nonces and the false positive rate rises (see
+:py:attr:`NonceRegistry.saturated`).
+
+Keys are not stored, only bits derived from a hash of class, key and
+nonce. With a *path*, the registry is loaded from and saved to a local
+file, so it survives restarts.
+
+Example:
+
+::
+
+    >>> nonceguard.install(path='/var/lib/app/nonces.bloom')
+    >>> YourCipher(key, MODE_CBC, iv).encrypt(data)
+    >>> YourCipher(key, MODE_CBC, iv).encrypt(data)
+    Traceback (most recent call last):
+    ...
+    NonceReuseError: Nonce or IV has been used with this key before
+    >>> nonceguard.uninstall()  # saves the registry
+
+"""
+
+import hashlib
+import math
+import os
+import struct
+import threading
+
+#: The installed registry, None if reuse is not checked.
+registry = None
+
+_MAGIC = b'P272NGD1'
+_HEADER = struct.Struct('>8sI')
+_FILTER = struct.Struct('>QQQI')
+_HASHES = struct.Struct('>QQ')
+
+
+class NonceReuseError(ValueError):
+    """A nonce or IV is used a second time with the same key."""
+
+
+class BloomFilter(object):
+    """Bloom filter for a fixed number of items.
+
+    Items are digests of at least 16 bytes; the bit positions are derived
+    from them by double hashing.
+
+    :param int capacity: Number of items for the false positive rate.
+    :param float error_rate: False positive rate at *capacity* items.
+    """
+
+    def __init__(self, capacity, error_rate):
+        if capacity < 1:
+            raise ValueError("'capacity' must be positive")
+        if not 0 < error_rate < 1:
+            raise ValueError("'error_rate' must be between 0 and 1")
+
+        bits = int(math.ceil(-capacity * math.log(error_rate) /
+                             math.log(2) ** 2))
+        self.capacity = capacity
+        self.count = 0
+        self.hashes = max(1, int(round(bits / float(capacity) *
+                                       math.log(2))))
+        self.bits = bits
+        self._array = bytearray((bits + 7) // 8)
+
+    @property
+    def nbytes(self):
+        """Memory used by the bits.
+
+        :rtype: int"""
+        return len(self._array)
+
+    def _positions(self, digest):
+        first, second = _HASHES.unpack_from(digest)
+        second |= 1  # never 0 modulo a power of two
+        return [(first + i * second) % self.bits
+                for i in range(self.hashes)]
+
+    def __contains__(self, digest):
+        array = self._array
+        for position in self._positions(digest):
+            if not array[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+    def add(self, digest):
+        """Add an item.
+
+        :return: If the item was (probably) there already.
+        :rtype: bool"""
+        array = self._array
+        present = True
+        for position in self._positions(digest):
+            mask = 1 << (position & 7)
+            if not array[position >> 3] & mask:
+                array[position >> 3] |= mask
+                present = False
+
+        if not present:
+            self.count += 1
+        return present
+
+
+class NonceRegistry(object):
+    """Scalable Bloom filter of used nonces.
+
+    When a filter holds *capacity* items, a filter twice as large with a
+    lower false positive rate is added, so the overall rate stays below
+    *error_rate*, until the filters would exceed *max_bytes*.
+
+    The registry can be shared between threads.
+
+    :param int capacity: Items of the first filter.
+    :param float error_rate: Overall false positive rate.
+    :param int max_bytes: Memory cap for all filters.
+    :param str path: File to load the registry from, if it exists, and to
+        save it to.
+    """
+
+    def __init__(self, capacity=2**16, error_rate=1e-9, max_bytes=2**26,
+                 path=None):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.max_bytes = max_bytes
+        self.path = path
+        self.saturated = False
+        self._lock = threading.Lock()
+        self._filters = []
+
+        if path is not None and os.path.exists(path):
+            self._load(path)
+
+        if not self._filters:
+            self._filters.append(self._new_filter(0))
+
+    def _new_filter(self, number):
+        # Rates halve with each filter, their sum stays below error_rate.
+        return BloomFilter(self.capacity * 2**number,
+                           self.error_rate / 2**(number + 1))
+
+    @property
+    def nbytes(self):
+        """Memory used by all filters.
+
+        :rtype: int"""
+        return sum(bloom.nbytes for bloom in self._filters)
+
+    def __len__(self):
+        """Number of registered nonces; nonces mistaken for registered
+        ones are not counted."""
+        return sum(bloom.count for bloom in self._filters)
+
+    @staticmethod
+    def _digest(scope, key, nonce):
+        parts = (scope, bytes(key), bytes(nonce))
+        data = b"".join(struct.pack('>I', len(part)) + part
+                        for part in parts)
+        return hashlib.sha256(data).digest()
+
+    def add(self, scope, key, nonce):
+        """Register *nonce* for *key*.
+
+        :param bytes scope: Separates users of the same keys, e.g. the
+            cipher class.
+        :return: If the nonce has (probably) been registered before.
+        :rtype: bool"""
+        digest = self._digest(scope, key, nonce)
+
+        with self._lock:
+            for bloom in self._filters:
+                if digest in bloom:
+                    return True
+
+            last = self._filters[-1]
+            last.add(digest)
+
+            if last.count >= last.capacity and not self.saturated:
+                new = self._new_filter(len(self._filters))
+                if self.nbytes + new.nbytes <= self.max_bytes:
+                    self._filters.append(new)
+                else:
+                    self.saturated = True
+
+        return False
+
+    def check(self, scope, key, nonce):
+        """Register *nonce* for *key*.
+
+        :raises NonceReuseError: If it has been registered before."""
+        if self.add(scope, key, nonce):
+            raise NonceReuseError("Nonce or IV has been used with this key "
+                                  "before")
+
+    def save(self, path=None):
+        """Write the registry to *path*, or the path given at
+        initialization. The file is replaced atomically."""
+        path = path or self.path
+        if path is None:
+            raise ValueError("No path to save the registry to")
+
+        with self._lock:
+            data = [_HEADER.pack(_MAGIC, len(self._filters))]
+            for bloom in self._filters:
+                data.append(_FILTER.pack(bloom.capacity, bloom.count,
+                                         bloom.bits, bloom.hashes))
+                data.append(bytes(bloom._array))
+
+        temporary = '{}.{}.tmp'.format(path, os.getpid())
+        with open(temporary, 'wb') as target:
+            target.write(b"".join(data))
+            target.flush()
+            os.fsync(target.fileno())
+
+        getattr(os, 'replace', os.rename)(temporary, path)
+
+    def _load(self, path):
+        with open(path, 'rb') as source:
+            data = source.read()
+
+        if len(data) < _HEADER.size:
+            raise ValueError("Not a nonce registry: {}".format(path))
+
+        magic, count = _HEADER.unpack_from(data)
+        if magic != _MAGIC:
+            raise ValueError("Not a nonce registry: {}".format(path))
+
+        offset = _HEADER.size
+        for _ in range(count):
+            if offset + _FILTER.size > len(data):
+                raise ValueError("Nonce registry is truncated: {}".format(
+                    path))
+
+            capacity, items, bits, hashes = _FILTER.unpack_from(data, offset)
+            offset += _FILTER.size
+
+            bloom = BloomFilter.__new__(BloomFilter)
+            bloom.capacity, bloom.count = capacity, items
+            bloom.bits, bloom.hashes = bits, hashes
+            bloom._array = bytearray(data[offset:offset + (bits + 7) // 8])
+            offset += len(bloom._array)
+
+            if len(bloom._array) != (bits + 7) // 8:
+                raise ValueError("Nonce registry is truncated: {}".format(
+                    path))
+            self._filters.append(bloom)
+
+
+def install(instance=None, **kwargs):
+    """Check nonces of all cipher objects created from now on.
+
+    :param instance: The registry to use, by default a new one created
+        with *kwargs*.
+    :type instance: NonceRegistry
+    :param \\**kwargs: See :py:class:`NonceRegistry`.
+    :rtype: NonceRegistry"""
+    global registry
+    registry = instance or NonceRegistry(**kwargs)
+    return registry
+
+
+def uninstall():
+    """Stop checking nonces. The registry is saved, if it has a path."""
+    global registry
+    current, registry = registry, None
+    if current is not None and current.path is not None:
+        current.save()
+
+
+def random_nonce(size, tries=8):
+    """Return *size* random bytes, that are not in the installed registry.
+
+    :raises NonceReuseError: If the registry is too full to find one.
+    :rtype: bytes"""
+    current = registry
+
+    for _ in range(tries):
+        nonce = os.urandom(size)
+        if current is None or not current.add(b'Counter', b'', nonce):
+            return nonce
+
+    raise NonceReuseError("No unused random nonce found, the nonce registry "
+                          "is full")
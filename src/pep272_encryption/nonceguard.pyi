@@ -0,0 +1,87 @@
+import threading
+
+from typing import List, Optional
+
+registry: Optional['NonceRegistry']
+
+
+class NonceReuseError(ValueError):
+    ...
+
+
+class BloomFilter(object):
+    capacity: int
+    count: int
+    hashes: int
+    bits: int
+    _array: bytearray
+
+    def __init__(self, capacity: int, error_rate: float) -> None:
+        ...
+
+    @property
+    def nbytes(self) -> int:
+        ...
+
+    def _positions(self, digest: bytes) -> List[int]:
+        ...
+
+    def __contains__(self, digest: bytes) -> bool:
+        ...
+
+    def add(self, digest: bytes) -> bool:
+        ...
+
+
+class NonceRegistry(object):
+    capacity: int
+    error_rate: float
+    max_bytes: int
+    path: Optional[str]
+    saturated: bool
+    _lock: threading.Lock
+    _filters: List[BloomFilter]
+
+    def __init__(self, capacity: int=2**16, error_rate: float=1e-9,
+                 max_bytes: int=2**26, path: str=None) -> None:
+        ...
+
+    def _new_filter(self, number: int) -> BloomFilter:
+        ...
+
+    @property
+    def nbytes(self) -> int:
+        ...
+
+    def __len__(self) -> int:
+        ...
+
+    @staticmethod
+    def _digest(scope: bytes, key: bytes, nonce: bytes) -> bytes:
+        ...
+
+    def add(self, scope: bytes, key: bytes, nonce: bytes) -> bool:
+        ...
+
+    def check(self, scope: bytes, key: bytes, nonce: bytes) -> None:
+        ...
+
+    def save(self, path: str=None) -> None:
+        ...
+
+    def _load(self, path: str) -> None:
+        ...
+
+
+def install(instance: NonceRegistry=None, capacity: int=...,
+            error_rate: float=..., max_bytes: int=...,
+            path: str=None) -> NonceRegistry:
+    ...
+
+
+def uninstall() -> None:
+    ...
+
+
+def random_nonce(size: int, tries: int=8) -> bytes:
+    ...
@@ -0,0 +1,189 @@
+"""
+Building blocks of the Offset Codebook Mode (OCB3) as specified in
+`RFC 7253 <https://tools.ietf.org/html/rfc7253>`_.
+
+Every block of OCB is whitened with an offset before and after the block
+cipher call, so all blocks can be handed to the block cipher as one batch.
+Offsets, checksums and sums are 128-bit integers; the offsets of a whole
+batch are combined with the data in one wide XOR, and checksums are folded
+from the whole batch at once instead of block by block.
+
+The offset sequence L_i only depends on the key;
+:py:class:`pep272_encryption.PEP272Cipher` caches it per key.
+
+"""
+
+from .util import from_bytes, to_bytes, split_blocks
+
+MASK = 2**128 - 1
+
+#: Number of blocks whitened and enciphered in one batch.
+BATCH_BLOCKS = 4096
+
+
+def double(value):
+    """Multiply a 128-bit integer by x in GF(2^128)."""
+    return ((value << 1) ^ (0x87 if value >> 127 else 0)) & MASK
+
+
+def ntz(number):
+    """Number of trailing zero bits of a positive integer."""
+    return (number & -number).bit_length() - 1
+
+
+def ocb_tables(l_star):
+    """Precompute L_*, L_$ and L_0, L_1, ... L_63.
+
+    :param bytes l_star: The encrypted all-zero block.
+    :return: L_*, L_$ and the tuple of all L_i
+    :rtype: tuple"""
+    l_star = from_bytes(l_star, 'big')
+    l_dollar = double(l_star)
+
+    l_table = [double(l_dollar)]
+    for _ in range(63):
+        l_table.append(double(l_table[-1]))
+
+    return l_star, l_dollar, tuple(l_table)
+
+
+def initial_offset(encipher, nonce, mac_len):
+    """Compute Offset_0 from the nonce.
+
+    :param callable encipher: Encrypts a single block.
+    :param bytes nonce: The nonce, between 1 and 15 bytes long.
+    :param int mac_len: The tag length in bytes.
+    :rtype: int"""
+    formatted = (((mac_len * 8) % 128) << 121 |
+                 1 << (8 * len(nonce)) |
+                 from_bytes(nonce, 'big'))
+    bottom = formatted & 63
+
+    ktop = from_bytes(encipher(to_bytes(formatted ^ bottom, 16, 'big')),
+                      'big')
+    stretch = ktop << 64 | ((ktop >> 64) ^ (ktop >> 56)) & (2**64 - 1)
+
+    return (stretch >> (64 - bottom)) & MASK
+
+
+def fold(value, count):
+    """XOR all *count* 128-bit blocks of the integer *value* together.
+
+    Each step XORs the upper half of the remaining blocks into the lower
+    half, so only a logarithmic number of wide operations is needed.
+
+    :rtype: int"""
+    result = 0
+    while count > 1:
+        if count % 2:
+            result ^= value & MASK
+            value >>= 128
+            count -= 1
+
+        count //= 2
+        value = (value >> (128 * count)) ^ (value & ((1 << 128 * count) - 1))
+
+    return result ^ value
+
+
+def pad(data):
+    """Pad an incomplete block with a single one bit and zeros.
+
+    :rtype: int"""
+    bits = 8 * len(data)
+    return from_bytes(data, 'big') << (128 - bits) | 1 << (127 - bits)
+
+
+def whiten(transform, l_table, offset, index, data, after=True):
+    """Apply *transform* to all full blocks of *data*, each whitened with
+    its offset before and after: ``Offset_i ^ T(data_i ^ Offset_i)``.
+
+    :param callable transform: Takes an iterable of blocks and returns a
+        list of transformed blocks, like
+        :py:meth:`~pep272_encryption.PEP272Cipher.encrypt_blocks`.
+    :param tuple l_table: The L_i values.
+    :param int offset: The offset of the previous block.
+    :param int index: The number of the previous block.
+    :param bytes data: Whole blocks to process.
+    :param bool after: If the output is whitened, too.
+    :return: transformed data, last offset and last block number
+    :rtype: tuple"""
+    count = len(data) // 16
+    offsets = []
+
+    for i in range(index + 1, index + count + 1):
+        offset ^= l_table[ntz(i)]
+        offsets.append(to_bytes(offset, 16, 'big'))
+
+    wide = from_bytes(b''.join(offsets), 'big')
+    inputs = to_bytes(from_bytes(data, 'big') ^ wide, len(data), 'big')
+    outputs = b''.join(transform(split_blocks(inputs, 16)))
+
+    if after:
+        outputs = to_bytes(from_bytes(outputs, 'big') ^ wide, len(data),
+                           'big')
+
+    return outputs, offset, index + count
+
+
+class OCBHash(object):
+    """Incremental HASH of the associated data (RFC 7253, section 4.1).
+
+    :param callable transform: Encrypts a list of blocks.
+    :param tuple tables: Tables created by :py:func:`ocb_tables`.
+    """
+
+    def __init__(self, transform, tables):
+        self._transform = transform
+        self._tables = tables
+        self._offset = self._sum = self._index = 0
+        self._buffer = bytearray()
+
+    def __getstate__(self):
+        """The transform and tables are not pickled, the owner restores
+        them."""
+        state = self.__dict__.copy()
+        del state['_transform'], state['_tables']
+        return state
+
+    def update(self, data):
+        """Feed associated data into the hash.
+
+        :param bytes data: The data to authenticate."""
+        view = memoryview(data)
+        offset = 0
+
+        if self._buffer:
+            offset = 16 - len(self._buffer)
+            self._buffer += view[:offset]
+            if len(self._buffer) < 16:
+                return
+            self._hash_blocks(bytes(self._buffer))
+            del self._buffer[:]
+
+        end = offset + (len(view) - offset) // 16 * 16
+        for start in range(offset, end, 16 * BATCH_BLOCKS):
+            self._hash_blocks(
+                view[start:min(end, start + 16 * BATCH_BLOCKS)].tobytes())
+
+        self._buffer += view[end:]
+
+    def _hash_blocks(self, data):
+        encrypted, self._offset, self._index = whiten(
+            self._transform, self._tables[2], self._offset, self._index,
+            data, after=False)
+        self._sum ^= fold(from_bytes(encrypted, 'big'), len(data) // 16)
+
+    def digest(self):
+        """Return the hash of all associated data.
+
+        :rtype: int"""
+        result = self._sum
+
+        if self._buffer:
+            cipher_input = pad(bytes(self._buffer)) ^ self._offset ^ \
+                self._tables[0]
+            result ^= from_bytes(self._transform(
+                [to_bytes(cipher_input, 16, 'big')])[0], 'big')
+
+        return result
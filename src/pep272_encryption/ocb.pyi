@@ -0,0 +1,46 @@
+from typing import Any, ByteString, Callable, Dict, Iterable, List, Tuple
+
+MASK: int
+BATCH_BLOCKS: int
+
+Tables = Tuple[int, int, Tuple[int, ...]]
+Transform = Callable[[Iterable[ByteString]], List[ByteString]]
+
+
+def double(value: int) -> int:
+    ...
+
+def ntz(number: int) -> int:
+    ...
+
+def ocb_tables(l_star: ByteString) -> Tables:
+    ...
+
+def initial_offset(encipher: Callable[[bytes], ByteString],
+                   nonce: ByteString, mac_len: int) -> int:
+    ...
+
+def fold(value: int, count: int) -> int:
+    ...
+
+def pad(data: ByteString) -> int:
+    ...
+
+def whiten(transform: Transform, l_table: Tuple[int, ...], offset: int,
+           index: int, data: bytes, after: bool=True
+           ) -> Tuple[bytes, int, int]:
+    ...
+
+
+class OCBHash:
+    def __init__(self, transform: Transform, tables: Tables):
+        ...
+
+    def __getstate__(self) -> Dict[str, Any]:
+        ...
+
+    def update(self, data: ByteString) -> None:
+        ...
+
+    def digest(self) -> int:
+        ...
@@ -0,0 +1,272 @@
+"""
+Parallel encryption and decryption in the modes of operation, that process
+blocks independently of each other: *ECB*, *CTR* and modes registered as
+parallel (see :py:func:`pep272_encryption.register_mode`).
+
+Large buffers are split into block aligned slices. Each slice is processed
+by its own cipher object, created from the class path, key and keyword
+arguments of the original one. The original cipher object is advanced as
+if it had processed the data itself, so calls can be mixed with its own
+`encrypt()` and `decrypt()`.
+
+Other modes, stream ciphers, cipher classes with their own ``__init__``
+and *CTR* ciphers without a :py:class:`~pep272_encryption.util.Counter` are
+processed by the cipher object directly.
+
+Available backends:
+
+``"interpreters"``
+    Sub-interpreters with their own GIL (PEP 684, PEP 734), available on
+    Python 3.14+. Pure Python block ciphers run truly in parallel and the
+    input is shared with the workers as a buffer instead of being copied.
+
+``"serial"``
+    Slices are processed one after another in the calling thread.
+
+Without a *backend* argument, the fastest available backend is used,
+falling back to ``"serial"`` on older Python versions.
+
+Example:
+
+::
+
+    >>> cipher = YourCipher(key, MODE_CTR, counter=Counter())
+    >>> ciphertext = parallel.encrypt(cipher, large_buffer)
+
+"""
+
+import os
+import pickle
+import sys
+import threading
+
+from importlib import import_module
+
+from . import PEP272Cipher, StreamCipher, MODE_ECB, MODE_CTR, _modes
+from .util import Counter, thresholds
+
+try:
+    from concurrent import interpreters
+except ImportError:  # Python < 3.14
+    interpreters = None
+
+try:
+    from concurrent.futures import ThreadPoolExecutor
+except ImportError:  # Python 2 without the futures backport
+    ThreadPoolExecutor = None
+
+#: Slices are at least this many bytes long, smaller inputs use less
+#: workers. If None, the calibrated threshold is used, see
+#: :py:mod:`pep272_encryption.calibrate`.
+MIN_SLICE_SIZE = None
+
+#: Names of all backends, fastest first.
+BACKENDS = ('interpreters', 'serial')
+
+
+def available_backends():
+    """Return the names of the backends usable with this interpreter.
+
+    :rtype: tuple"""
+    return tuple(backend for backend in BACKENDS
+                 if backend != 'interpreters' or (
+                     interpreters is not None and
+                     ThreadPoolExecutor is not None))
+
+
+def encrypt(cipher, data, workers=None, backend=None):
+    """Encrypt *data* with *cipher*, using multiple workers if possible.
+
+    :param cipher: The cipher object to encrypt with.
+    :type cipher: pep272_encryption.PEP272Cipher
+    :param bytes data: The data to encrypt, see
+        :py:meth:`~pep272_encryption.PEP272Cipher.encrypt`.
+    :param int workers: Maximum number of workers, defaults to the
+        number of CPUs.
+    :param str backend: One of :py:data:`BACKENDS`.
+    :raises ValueError: When the backend is unknown or not available.
+    :rtype: bytes"""
+    return _run(cipher, data, False, workers, backend)
+
+
+def decrypt(cipher, data, workers=None, backend=None):
+    """Decrypt *data* with *cipher*, using multiple workers if possible.
+
+    See :py:func:`encrypt`.
+
+    :rtype: bytes"""
+    return _run(cipher, data, True, workers, backend)
+
+
+def _select_backend(backend):
+    available = available_backends()
+
+    if backend is None:
+        return available[0]
+
+    if backend not in BACKENDS:
+        raise ValueError("Unknown backend {!r}, possible values are: "
+                         "{}".format(backend, ", ".join(BACKENDS)))
+
+    if backend not in available:
+        raise ValueError("Backend {!r} is not available".format(backend))
+
+    return backend
+
+
+def _spec(cipher):
+    """Returns what a worker needs to re-create *cipher*, or None if it
+    cannot be re-created or its mode cannot be parallelized."""
+    if isinstance(cipher, StreamCipher):  # the keystream depends on all data
+        return None
+
+    if cipher.mode == MODE_CTR:
+        if not isinstance(cipher._counter, Counter):
+            return None
+
+    elif cipher.mode != MODE_ECB and not (
+            cipher.mode in _modes and _modes[cipher.mode].parallel):
+        return None
+
+    return _class_spec(cipher)
+
+
+def _class_spec(cipher):
+    """Returns class, key, mode and keyword arguments of *cipher* for
+    :py:func:`_run_slice`, or None if workers cannot re-create it."""
+    cls = type(cipher)
+
+    if cls.__init__ is not PEP272Cipher.__init__:
+        return None
+
+    # Workers import the class, so it must be reachable from its module.
+    qualname = getattr(cls, '__qualname__', cls.__name__)
+    if '<locals>' in qualname or cls.__module__ == '__main__':
+        return None
+
+    thresholds['parallel']  # loads them, so workers do not calibrate
+    spec = (cls.__module__, qualname, cipher.key, cipher.mode,
+            cipher.kwargs, list(sys.path), dict(thresholds))
+
+    try:
+        return pickle.dumps(spec, protocol=2)
+    except (pickle.PicklingError, TypeError, AttributeError):
+        return None
+
+
+def _run(cipher, data, decrypt, workers, backend):
+    backend = _select_backend(backend)
+    function = cipher.decrypt if decrypt else cipher.encrypt
+    block_size = cipher.block_size
+
+    spec = _spec(cipher)
+    if spec is None or (cipher.mode != MODE_CTR and len(data) % block_size):
+        return function(data)
+
+    if not decrypt and cipher._guard_nonce is not None:
+        cipher._register_nonce()  # the workers' cipher objects do not
+
+    view = memoryview(data)
+    head = b""
+
+    rest = len(cipher._keystream_block) - cipher._keystream_offset
+    if rest:  # CTR: use up the current keystream block first
+        head = function(view[:rest].tobytes())
+        view = view[rest:]
+
+    blocks = len(view) // block_size
+    workers = workers or getattr(os, 'cpu_count', lambda: 1)() or 1
+    min_size = MIN_SLICE_SIZE or thresholds['parallel']
+    count = max(1, min(workers, len(view) // min_size))
+
+    slices = []
+    start = 0
+    for i in range(count):
+        size = blocks // count + (i < blocks % count)
+        if not size:
+            continue
+
+        extra = None
+        if cipher.mode == MODE_CTR:
+            extra = pickle.dumps({'counter': cipher._counter.reserve(size)},
+                                 protocol=2)
+        elif cipher.mode != MODE_ECB:  # registered: index of the first block
+            extra = pickle.dumps({'_mode_index': cipher._mode_index + start},
+                                 protocol=2)
+
+        slices.append((start * block_size, (start + size) * block_size,
+                       extra))
+        start += size
+
+    out = head + b"".join(_BACKENDS[backend](spec, decrypt, view, slices))
+    cipher._mode_index += blocks
+
+    tail = view[blocks * block_size:]
+    if len(tail):  # only in CTR mode
+        out += function(tail.tobytes())
+
+    return out
+
+
+def _run_slice(spec, decrypt, data, extra):
+    """Processes one slice; runs in the worker. *extra* are pickled
+    keyword arguments for this slice only, like its counter. Registered modes
+    get the index of the first block of the slice instead."""
+    module, qualname, key, mode, kwargs, path, values = pickle.loads(spec)
+    thresholds.update(values)  # never calibrate in workers
+
+    for entry in path:
+        if entry not in sys.path:
+            sys.path.append(entry)
+
+    cls = import_module(module)
+    for name in qualname.split('.'):
+        cls = getattr(cls, name)
+
+    index = 0
+    if extra is not None:
+        kwargs = dict(kwargs, **pickle.loads(extra))
+        index = kwargs.pop('_mode_index', 0)
+
+    cipher = cls(key, mode, **kwargs)
+    cipher._mode_index = index
+    return (cipher.decrypt if decrypt else cipher.encrypt)(bytes(data))
+
+
+def _run_serial(spec, decrypt, view, slices):
+    return [_run_slice(spec, decrypt, view[start:end], extra)
+            for start, end, extra in slices]
+
+
+def _run_interpreters(spec, decrypt, view, slices):
+    not_shareable = getattr(interpreters, 'NotShareableError', TypeError)
+    local = threading.local()
+    created = []
+
+    def task(piece):
+        start, end, extra = piece
+
+        interpreter = getattr(local, 'interpreter', None)
+        if interpreter is None:
+            interpreter = local.interpreter = interpreters.create()
+            created.append(interpreter)
+
+        try:
+            return interpreter.call(_run_slice, spec, decrypt,
+                                    view[start:end], extra)
+        except not_shareable:  # memoryview cannot be shared, copy it
+            return interpreter.call(_run_slice, spec, decrypt,
+                                    view[start:end].tobytes(), extra)
+
+    try:
+        with ThreadPoolExecutor(len(slices)) as pool:
+            return list(pool.map(task, slices))
+    finally:
+        for interpreter in created:
+            interpreter.close()
+
+
+_BACKENDS = {
+    'interpreters': _run_interpreters,
+    'serial': _run_serial
+}
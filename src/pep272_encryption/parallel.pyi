@@ -0,0 +1,49 @@
+from typing import ByteString, List, Optional, Tuple
+
+from . import PEP272Cipher
+
+MIN_SLICE_SIZE: Optional[int]
+BACKENDS: Tuple[str, ...]
+
+_Slice = Tuple[int, int, Optional[bytes]]
+
+
+def available_backends() -> Tuple[str, ...]:
+    ...
+
+
+def encrypt(cipher: PEP272Cipher, data: ByteString, workers: int=None,
+            backend: str=None) -> bytes:
+    ...
+
+
+def decrypt(cipher: PEP272Cipher, data: ByteString, workers: int=None,
+            backend: str=None) -> bytes:
+    ...
+
+
+def _select_backend(backend: Optional[str]) -> str:
+    ...
+
+
+def _spec(cipher: PEP272Cipher) -> Optional[bytes]:
+    ...
+
+
+def _class_spec(cipher: PEP272Cipher) -> Optional[bytes]:
+    ...
+
+
+def _run_slice(spec: bytes, decrypt: bool, data: ByteString,
+               extra: Optional[bytes]) -> bytes:
+    ...
+
+
+def _run_serial(spec: bytes, decrypt: bool, view: memoryview,
+                slices: List[_Slice]) -> List[bytes]:
+    ...
+
+
+def _run_interpreters(spec: bytes, decrypt: bool, view: memoryview,
+                      slices: List[_Slice]) -> List[bytes]:
+    ...
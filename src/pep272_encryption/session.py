@@ -0,0 +1,135 @@
+"""
+Compact keystream sessions for servers with many concurrent streams.
+
+A cipher object per connection carries a ``__dict__``, its keyword
+arguments and the state of every mode of operation. A
+:py:class:`Session` only keeps the state of one *CTR* or *OFB* stream in
+``__slots__``: the counter value or the last output block, and the unused
+rest of the current keystream block. Everything derived from the key is
+held once by a :py:class:`SessionKey`, shared by all sessions with that
+key. ``benchmarks/bench_sessions.py`` reports the memory per session.
+
+Example:
+
+::
+
+    >>> keys = SessionKey(YourCipher, key, MODE_CTR)
+    >>> session = keys.session(first_counter_block)
+    >>> ciphertext = session.encrypt(b'data of any length')
+
+"""
+
+from . import PEP272Cipher, MODE_ECB, MODE_OFB, MODE_CTR, nonceguard, \
+    _function
+from .util import from_bytes, to_bytes
+
+
+class SessionKey(object):
+    """Material of one key, shared by its sessions.
+
+    :param cipher_class: A subclass of
+        :py:class:`~pep272_encryption.PEP272Cipher`.
+    :param key: The key.
+    :param int mode: `MODE_CTR` or `MODE_OFB`.
+    :param kwargs: Keyword arguments of the block function.
+    """
+
+    def __init__(self, cipher_class, key, mode, **kwargs):
+        if mode not in (MODE_CTR, MODE_OFB):
+            raise ValueError("Sessions support CTR and OFB mode only")
+
+        self.mode = mode
+        #: Cipher object in ECB mode, its block functions create the
+        #: keystream of all sessions.
+        self.cipher = cipher_class(key, MODE_ECB, **kwargs)
+        self.block_size = self.cipher.block_size
+
+        self._scope = "{}.{}".format(cipher_class.__module__, getattr(
+            cipher_class, '__qualname__', cipher_class.__name__)
+        ).encode('utf-8')
+
+    def session(self, iv):
+        """Start a session.
+
+        :param bytes iv: The IV in OFB mode, or the first counter block in
+            CTR mode. The counter block is incremented as a whole, like
+            ``Counter(IV=iv)``, but an overflow raises a `ValueError`
+            instead of wrapping around.
+        :rtype: Session"""
+        if len(iv) != self.block_size:
+            raise ValueError("'IV' length must be block_size ({})".format(
+                self.block_size))
+
+        return Session(self, iv)
+
+
+class Session(object):
+    """State of a single stream in CTR or OFB mode, created by
+    :py:meth:`SessionKey.session`.
+
+    Like a cipher object, a session continues where the previous call
+    stopped and must not be used by multiple threads at the same time.
+    """
+
+    __slots__ = ('_key', '_status', '_keystream_block', '_keystream_offset',
+                 '_guard_nonce')
+
+    def __init__(self, key, iv):
+        self._key = key
+        if key.mode == MODE_CTR:  # the next counter value
+            self._status = from_bytes(iv, 'big')
+        else:  # the last output block
+            self._status = bytes(iv)
+
+        self._keystream_block = b""
+        self._keystream_offset = 0
+
+        # Checked on the first encrypt(), like by cipher objects.
+        self._guard_nonce = None
+        if nonceguard.registry is not None:
+            self._guard_nonce = bytes(iv)
+
+    @property
+    def block_size(self):
+        return self._key.block_size
+
+    def encrypt(self, string):
+        """Encrypt data of any length.
+
+        :raises ~pep272_encryption.nonceguard.NonceReuseError: If a
+            registry is installed and the IV has been used with the key
+            before.
+        :raises ValueError: If the counter overflows."""
+        if self._guard_nonce is not None:
+            nonce, self._guard_nonce = self._guard_nonce, None
+            registry = nonceguard.registry
+
+            if registry is not None:
+                registry.check(self._key._scope, self._key.cipher.key, nonce)
+
+        return _function(PEP272Cipher._encrypt_with_keystream)(self, string)
+
+    def decrypt(self, string):
+        """Decrypt data of any length, the same as encryption."""
+        return _function(PEP272Cipher._encrypt_with_keystream)(self, string)
+
+    def _keystream_blocks(self, count):
+        cipher = self._key.cipher
+        size = self._key.block_size
+
+        if self._key.mode == MODE_OFB:
+            blocks = []
+            for _ in range(count):
+                self._status = cipher.encrypt_block(cipher.key, self._status,
+                                                    **cipher.kwargs)
+                blocks.append(self._status)
+            return b"".join(blocks)
+
+        value = self._status
+        if value + count > 2 ** (8 * size):
+            raise ValueError("Counter overflow detected.")
+
+        self._status = value + count
+        return b"".join(cipher.encrypt_blocks(
+            cipher.key, [to_bytes(value + n, size, 'big')
+                         for n in range(count)], **cipher.kwargs))
@@ -0,0 +1,41 @@
+from typing import Any, ByteString, Optional, Type, Union
+
+from . import PEP272Cipher
+
+
+class SessionKey(object):
+    mode: int
+    cipher: PEP272Cipher
+    block_size: int
+    _scope: bytes
+
+    def __init__(self, cipher_class: Type[PEP272Cipher], key: Any, mode: int,
+                 **kwargs: Any) -> None:
+        ...
+
+    def session(self, iv: ByteString) -> Session:
+        ...
+
+
+class Session(object):
+    _key: SessionKey
+    _status: Union[int, bytes]
+    _keystream_block: bytes
+    _keystream_offset: int
+    _guard_nonce: Optional[bytes]
+
+    def __init__(self, key: SessionKey, iv: ByteString) -> None:
+        ...
+
+    @property
+    def block_size(self) -> int:
+        ...
+
+    def encrypt(self, string: ByteString) -> bytes:
+        ...
+
+    def decrypt(self, string: ByteString) -> bytes:
+        ...
+
+    def _keystream_blocks(self, count: int) -> bytes:
+        ...
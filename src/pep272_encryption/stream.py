@@ -0,0 +1,293 @@
+"""
+Streaming combinations of a cipher object with other processing steps.
+
+:py:class:`EncryptThenMAC` authenticates the ciphertext of any mode of
+operation with a MAC from :py:mod:`hmac` or :py:mod:`hashlib`. Every
+piece of ciphertext is fed into the MAC right after it has been produced,
+while it is still in the CPU cache, so the data is passed over once and
+no second copy of the ciphertext is needed.
+
+:py:func:`transcrypt` decrypts a stream with one cipher object and
+encrypts it with another one, e.g. to rotate keys, without holding more
+than one chunk of plaintext.
+
+Example:
+
+::
+
+    >>> etm = EncryptThenMAC(YourCipher(key, MODE_CTR, counter=counter),
+    ...                      hmac.new(mac_key, digestmod='sha256'))
+    >>> etm.update(header)
+    >>> with open('big.bin', 'rb') as source:
+    ...     for chunk in etm.iterencrypt(iter(lambda: source.read(2**20),
+    ...                                       b'')):
+    ...         destination.write(chunk)
+    >>> tag = etm.digest()
+
+"""
+
+import binascii
+import hmac
+
+try:
+    from math import gcd
+except ImportError:  # Python 2
+    from fractions import gcd
+
+from . import parallel
+from . import MODE_ECB, MODE_CTR, MODE_OCB, MODES_AEAD
+
+#: Bytes encrypted and authenticated in one step.
+PIECE_SIZE = 2**16
+
+#: Default number of bytes read at once by :py:func:`transcrypt`.
+CHUNK_SIZE = 2**20
+
+
+class EncryptThenMAC(object):
+    """Encrypt-then-MAC over a cipher object.
+
+    The MAC covers the associated data given to :py:meth:`update`
+    followed by the ciphertext. Associated data is not length-prefixed,
+    so it should have a fixed length (e.g. the IV or nonce), or carry its
+    own length.
+
+    :param cipher: The cipher object, in any mode without its own
+        authentication.
+    :type cipher: pep272_encryption.PEP272Cipher
+    :param mac: A keyed MAC object like ``hmac.new(key, digestmod=...)``
+        or ``hashlib.blake2b(key=...)``, or a callable without arguments
+        returning one.
+    :raises TypeError: For ciphers in an AEAD mode.
+    """
+
+    def __init__(self, cipher, mac):
+        if cipher.mode in MODES_AEAD:
+            raise TypeError("AEAD modes are authenticated already")
+
+        if not hasattr(mac, 'update'):
+            mac = mac()
+
+        self.cipher = cipher
+        self.mac = mac
+        self.digest_size = mac.digest_size
+        self._data_started = False
+        self._tag = None
+
+    def update(self, assoc_data):
+        """Authenticate associated data, that is not encrypted.
+
+        :param bytes assoc_data: The piece of associated data.
+        :raises TypeError: After encryption or decryption has started."""
+        if self._data_started:
+            raise TypeError("update() can only be called before "
+                            "encrypt() or decrypt()")
+        self.mac.update(assoc_data)
+
+    def _pieces(self, data):
+        """Splits *data* in pieces of whole units of the mode."""
+        unit = self.cipher._unit_size()
+        size = max(1, PIECE_SIZE // unit) * unit
+        view = memoryview(data)
+
+        if len(view) <= size:
+            yield data
+            return
+
+        for start in range(0, len(view), size):
+            yield view[start:start + size]
+
+    def _check_length(self, data):
+        """Checks the length of all of *data* before it is split, so
+        nothing is processed on errors."""
+        if len(memoryview(data)) % self.cipher._unit_size():
+            raise ValueError("Input 'bytestring' must be a multiple of "
+                             "block_size / segment_size (CFB mode) in length")
+
+    def _check_phase(self, name):
+        if self._tag is not None:
+            raise TypeError("{} cannot be called after the tag has been "
+                            "computed".format(name))
+        self._data_started = True
+
+    def encrypt(self, plaintext):
+        """Encrypt *plaintext* and authenticate the ciphertext.
+
+        :param bytes plaintext: The next piece of data, see
+            :py:meth:`pep272_encryption.PEP272Cipher.encrypt`.
+        :rtype: bytes"""
+        self._check_phase("encrypt()")
+        self._check_length(plaintext)
+        out = bytearray()
+
+        for piece in self._pieces(plaintext):
+            ciphertext = self.cipher.encrypt(piece)
+            self.mac.update(ciphertext)
+            out += ciphertext
+
+        return bytes(out)
+
+    def decrypt(self, ciphertext):
+        """Authenticate and decrypt *ciphertext*.
+
+        The plaintext is returned before the tag can be checked, it must
+        not be used before :py:meth:`verify` succeeds.
+
+        :param bytes ciphertext: The next piece of data.
+        :rtype: bytes"""
+        self._check_phase("decrypt()")
+        self._check_length(ciphertext)
+        out = bytearray()
+
+        for piece in self._pieces(ciphertext):
+            self.mac.update(piece)
+            out += self.cipher.decrypt(piece)
+
+        return bytes(out)
+
+    def iterencrypt(self, chunks):
+        """Encrypt an iterable of chunks of any size, see
+        :py:meth:`pep272_encryption.PEP272Cipher.iterencrypt`. The tag is
+        available from :py:meth:`digest` afterwards.
+
+        :rtype: iterator"""
+        self._check_phase("iterencrypt()")
+
+        for ciphertext in self.cipher.iterencrypt(
+                piece for chunk in chunks for piece in self._pieces(chunk)):
+            self.mac.update(ciphertext)
+            yield ciphertext
+
+    def iterdecrypt(self, chunks, received_mac_tag=None):
+        """Decrypt an iterable of chunks of any size.
+
+        :param iterable chunks: The ciphertext.
+        :param bytes received_mac_tag: If given, the tag is checked after
+            the last chunk.
+        :raises ValueError: After the last chunk, when the tag does not
+            match.
+        :rtype: iterator"""
+        self._check_phase("iterdecrypt()")
+
+        def authenticated():
+            for chunk in chunks:
+                for piece in self._pieces(chunk):
+                    self.mac.update(piece)
+                    yield piece
+
+        for plaintext in self.cipher.iterdecrypt(authenticated()):
+            yield plaintext
+
+        if received_mac_tag is not None:
+            self.verify(received_mac_tag)
+
+    def digest(self):
+        """Return the tag of the associated data and ciphertext.
+
+        After calling it, no more data can be encrypted or decrypted.
+
+        :rtype: bytes"""
+        if self._tag is None:
+            self._tag = self.mac.digest()
+        return self._tag
+
+    def hexdigest(self):
+        """Return the tag as hex encoded string.
+
+        :rtype: str"""
+        return binascii.hexlify(self.digest()).decode('ascii')
+
+    def verify(self, received_mac_tag):
+        """Check the tag in constant time.
+
+        :param bytes received_mac_tag: The expected tag.
+        :raises ValueError: When the tag does not match."""
+        if not hmac.compare_digest(self.digest(), received_mac_tag):
+            raise ValueError("MAC check failed")
+
+    def encrypt_and_digest(self, plaintext):
+        """Encrypt *plaintext* and compute the tag in one step.
+
+        :return: ciphertext and tag
+        :rtype: tuple"""
+        return self.encrypt(plaintext), self.digest()
+
+    def decrypt_and_verify(self, ciphertext, received_mac_tag):
+        """Check the tag and decrypt *ciphertext* in one step.
+
+        :raises ValueError: When the tag does not match.
+        :rtype: bytes"""
+        plaintext = self.decrypt(ciphertext)
+        self.verify(received_mac_tag)
+        return plaintext
+
+
+def transcrypt(old, new, infile, outfile, chunk_size=CHUNK_SIZE,
+               workers=None, backend=None):
+    """Decrypt *infile* with *old* and write it encrypted with *new* to
+    *outfile*. The cipher objects may use different modes and block
+    sizes.
+
+    The input is read into one buffer, that is reused for every chunk.
+    Chunks are whole units of both modes, so only the plaintext and the
+    new ciphertext of a single chunk exist at a time. Cipher objects in
+    ECB or CTR mode split each chunk across workers with
+    :py:mod:`pep272_encryption.parallel`.
+
+    Tags of AEAD modes are neither read nor written: call ``old.verify()``
+    and write ``new.digest()`` afterwards.
+
+    :param old: Cipher object decrypting the input.
+    :type old: pep272_encryption.PEP272Cipher
+    :param new: Cipher object encrypting the output.
+    :type new: pep272_encryption.PEP272Cipher
+    :param infile: Binary file object with ``readinto()``.
+    :param outfile: Binary file object with ``write()``.
+    :param int chunk_size: Bytes per chunk, rounded down to whole units.
+    :param int workers: See :py:func:`pep272_encryption.parallel.encrypt`.
+    :param str backend: See :py:func:`pep272_encryption.parallel.encrypt`.
+    :return: The number of bytes read.
+    :rtype: int"""
+    unit = old._unit_size() * new._unit_size() // \
+        gcd(old._unit_size(), new._unit_size())
+    view = memoryview(bytearray(max(1, chunk_size // unit) * unit))
+
+    decrypt = _crypt_function(old, True, workers, backend)
+    encrypt = _crypt_function(new, False, workers, backend)
+    total = 0
+
+    while True:
+        length = _read_into(infile, view)
+        if not length:
+            break
+
+        total += length
+        outfile.write(encrypt(decrypt(view[:length])))
+
+    if old.mode == MODE_OCB:
+        outfile.write(encrypt(old.decrypt()))
+    if new.mode == MODE_OCB:
+        outfile.write(new.encrypt())
+
+    return total
+
+
+def _crypt_function(cipher, decrypt, workers, backend):
+    """Returns the function applying *cipher* to a chunk."""
+    if cipher.mode in (MODE_ECB, MODE_CTR):
+        function = parallel.decrypt if decrypt else parallel.encrypt
+        return lambda data: function(cipher, data, workers, backend)
+
+    return cipher.decrypt if decrypt else cipher.encrypt
+
+
+def _read_into(infile, view):
+    """Fills *view* from *infile*, it is only short at the end of file."""
+    filled = 0
+    while filled < len(view):
+        count = infile.readinto(view[filled:])
+        if not count:
+            break
+        filled += count
+
+    return filled
@@ -0,0 +1,79 @@
+from typing import Any, BinaryIO, ByteString, Callable, Iterable, \
+    Iterator, Optional, Tuple, Union
+
+from . import PEP272Cipher
+
+PIECE_SIZE: int
+CHUNK_SIZE: int
+
+
+_MAC = Any  # hmac.HMAC or a keyed hashlib object
+
+
+class EncryptThenMAC(object):
+    cipher: PEP272Cipher
+    mac: _MAC
+    digest_size: int
+
+    def __init__(self, cipher: PEP272Cipher,
+                 mac: Union[_MAC, Callable[[], _MAC]]) -> None:
+        ...
+
+    def update(self, assoc_data: ByteString) -> None:
+        ...
+
+    def _pieces(self, data: ByteString) -> Iterator[ByteString]:
+        ...
+
+    def _check_length(self, data: ByteString) -> None:
+        ...
+
+    def _check_phase(self, name: str) -> None:
+        ...
+
+    def encrypt(self, plaintext: ByteString) -> bytes:
+        ...
+
+    def decrypt(self, ciphertext: ByteString) -> bytes:
+        ...
+
+    def iterencrypt(self, chunks: Iterable[ByteString]) -> Iterator[bytes]:
+        ...
+
+    def iterdecrypt(self, chunks: Iterable[ByteString],
+                    received_mac_tag: Optional[bytes]=None
+                    ) -> Iterator[bytes]:
+        ...
+
+    def digest(self) -> bytes:
+        ...
+
+    def hexdigest(self) -> str:
+        ...
+
+    def verify(self, received_mac_tag: bytes) -> None:
+        ...
+
+    def encrypt_and_digest(self, plaintext: ByteString
+                           ) -> Tuple[bytes, bytes]:
+        ...
+
+    def decrypt_and_verify(self, ciphertext: ByteString,
+                           received_mac_tag: bytes) -> bytes:
+        ...
+
+
+def transcrypt(old: PEP272Cipher, new: PEP272Cipher, infile: BinaryIO,
+               outfile: BinaryIO, chunk_size: int=CHUNK_SIZE,
+               workers: int=None, backend: str=None) -> int:
+    ...
+
+
+def _crypt_function(cipher: PEP272Cipher, decrypt: bool,
+                    workers: Optional[int], backend: Optional[str]
+                    ) -> Callable[[ByteString], bytes]:
+    ...
+
+
+def _read_into(infile: BinaryIO, view: memoryview) -> int:
+    ...
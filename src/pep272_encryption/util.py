@@ -3,20 +3,40 @@ Utility library for compatibility with Python 2 and 3.
 A counter to use with CTR is also included.
 
 There are versions of ``chr`` and ``ord``-methods to work with bytes
-with Python 3 and strings with Python 2.
+with Python 3 and strings with Python 2. The implementation is chosen
+at import time; on Python 3 they work on integers and buffers directly.
 
 """
 
 import codecs
-import os
+import platform
 import sys
+import threading
+
+from collections import OrderedDict
+
+from . import nonceguard
+
+try:
+    from mypy_extensions import mypyc_attr
+except ImportError:  # only needed when compiling with mypyc
+    # Classes are marked as non-native, so they can still be subclassed
+    # and keep their __dict__ when compiled.
+    def mypyc_attr(*attrs, **kwattrs):  # type: ignore
+        return lambda cls: cls
 
 try:
     from ._fast_xor import fast_xor
 except ImportError:
-    fast_xor = None
+    fast_xor = None  # type: ignore
 
 PY_3 = sys.version_info.major >= 3
+PYPY = platform.python_implementation() == 'PyPy'
+
+#: Implementation of :py:func:`xor_strings` for large inputs: ``"c"`` (the
+#: extension module), ``"pypy"`` (indexed loops the JIT compiles well) or
+#: ``"python"``.
+ENGINE = 'c' if fast_xor is not None else 'pypy' if PYPY else 'python'
 
 _endian_dict = {
     "little": "little",
@@ -27,7 +47,10 @@ _endian_dict = {
 }
 
 
-if PY_3:
+if sys.version_info[0] >= 3:  # not PY_3, so type checkers skip Python 2
+
+    #: All single byte strings, indexed by their value.
+    _BYTES = tuple(bytes((i,)) for i in range(256))
 
     def b_chr(ordinal):
         """Return a byte string of one character with 0 <= ordinal <= 255.
@@ -35,7 +58,30 @@ if PY_3:
         :param int ordinal: The Unicode code point of a single char
         :return: The byte string representation of the ordinal
         :rtype: bytes"""
-        return bytes([ordinal])
+        if not 0 <= ordinal <= 255:  # like bytes(), no negative indexing
+            raise ValueError("bytes must be in range(0, 256)")
+        return _BYTES[ordinal]
+
+
+    def _xor_fallback(one, two):
+        length = min(len(one), len(two))
+        return (int.from_bytes(one[:length], 'big') ^
+                int.from_bytes(two[:length], 'big')).to_bytes(length, 'big')
+
+
+    def _xor_indexed(one, two):
+        # A plain loop over a preallocated buffer: traced by the PyPy JIT
+        # into a tight machine code loop, without the bignum conversions
+        # of _xor_fallback.
+        length = min(len(one), len(two))
+        out = bytearray(length)
+        for i in range(length):
+            out[i] = one[i] ^ two[i]
+        return bytes(out)
+
+
+    def _split_bytes(bytestring):
+        return map(_BYTES.__getitem__, bytes(bytestring))
 
 
     def to_bytes(integer, length, byteorder):
@@ -99,6 +145,24 @@ else:
         return int(codecs.encode(bytestring, "hex"), 16)
 
 
+    def _xor_fallback(one, two):
+        one, two = bytearray(one), bytearray(two)
+        return bytes(bytearray(x ^ y for x, y in zip(one, two)))
+
+
+    def _xor_indexed(one, two):
+        one, two = bytearray(one), bytearray(two)
+        length = min(len(one), len(two))
+        out = bytearray(length)
+        for i in range(length):
+            out[i] = one[i] ^ two[i]
+        return bytes(out)
+
+
+    def _split_bytes(bytestring):
+        return map(chr, bytearray(bytestring))
+
+
 def b_ord(byte):
     """Return the Unicode code point for a byte or iteration product \
 of a byte string alike object (e.g. bytearray).
@@ -111,20 +175,45 @@ convert
     return byte if isinstance(byte, int) else ord(byte)
 
 
+@mypyc_attr(native_class=False)
+class Thresholds(dict):
+    """Crossover sizes used to choose between implementations.
+
+    The values are loaded by :py:func:`pep272_encryption.calibrate.load`
+    when the first one is looked up.
+    """
+
+    def __missing__(self, key):
+        from . import calibrate
+        calibrate.load()
+        return dict.__getitem__(self, key)
+
+
+#: Thresholds of this machine, see :py:mod:`pep272_encryption.calibrate`.
+thresholds = Thresholds()
+
+
 def xor_strings(one, two):
     """xor two bytestrings together.
 
+    The C implementation is used, unless the calibration found the pure
+    Python one faster for inputs of this size. On PyPy, which does not
+    build the extension module, a loop suited to its JIT is used, see
+    :py:data:`ENGINE`.
+
     :param bytes one: First string
     :param bytes two: Second string
     :return: The xored strings
     :rtype: bytes
     """
 
-    if fast_xor is not None:
+    if fast_xor is not None and len(one) < thresholds['xor']:
         return fast_xor(one, two)
 
-    one, two = bytearray(one), bytearray(two)
-    return bytes(bytearray(x ^ y for x, y in zip(one, two)))
+    if PYPY:
+        return _xor_indexed(one, two)
+
+    return _xor_fallback(one, two)
 
 
 def split_blocks(bytestring, block_size):
@@ -133,7 +222,7 @@ def split_blocks(bytestring, block_size):
     Raises an error if len(string) % blocksize != 0.
     """
     if block_size == 1:
-        return map(b_chr, bytearray(bytestring))
+        return _split_bytes(bytestring)
 
     rest_size = len(bytestring) % block_size
 
@@ -141,13 +230,291 @@ def split_blocks(bytestring, block_size):
         raise ValueError("Input 'bytestring' must be a multiple of "
                          "block_size / segment_size (CFB mode) in length")
 
-    block_count = len(bytestring) // block_size
+    return _blocks(bytestring, block_size)
+
 
-    return (
-        bytestring[i * block_size:((i + 1) * block_size)]
-        for i in range(block_count))
+def _blocks(bytestring, block_size):
+    # A generator function: compiled with mypyc, a generator expression
+    # would build a list of all blocks.
+    for start in range(0, len(bytestring), block_size):
+        yield bytestring[start:start + block_size]
 
 
+@mypyc_attr(native_class=False)
+class KeyCache(object):
+    """Bounded least-recently-used mapping for material precomputed from
+    a key, like multiplication tables or subkeys.
+
+    Lookups are thread safe. The factory is called without holding the
+    lock, so two threads may compute the same material concurrently.
+
+    :param int maxsize: Number of entries to keep at most.
+    """
+
+    def __init__(self, maxsize=16):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, factory):
+        """Return the material cached for *key*, or create it with
+        *factory* and cache it.
+
+        :param key: A hashable key.
+        :param callable factory: Callable without arguments creating
+            the material."""
+        with self._lock:
+            try:
+                value = self._data.pop(key)
+            except KeyError:
+                pass
+            else:
+                self._data[key] = value
+                return value
+
+        value = factory()
+
+        with self._lock:
+            self._data[key] = value
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+        return value
+
+    def clear(self):
+        """Forget all cached material."""
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+@mypyc_attr(native_class=False)
+class BlockCache(object):
+    """Bounded least-recently-used cache of block cipher results, for
+    ECB mode on repetitive data like zero-filled images or padded
+    records. Encryption and decryption results are kept separately.
+
+    A cache is bound to the class, key and keyword arguments of the first
+    cipher object using it, and can only be shared by cipher objects with
+    the same ones; it is not thread safe.
+
+    :param int maxsize: Number of blocks to keep per direction.
+    :param int maxbytes: Optional limit of the cached input and output
+        bytes per direction.
+    """
+
+    def __init__(self, maxsize=4096, maxbytes=None):
+        self.maxsize = maxsize
+        self.maxbytes = maxbytes
+        #: Blocks answered without calling the block cipher.
+        self.hits = 0
+        #: Blocks passed to the block cipher.
+        self.misses = 0
+        self._tables = (OrderedDict(), OrderedDict())
+        self._bytes = [0, 0]
+        self._owner = None
+
+    def _bind(self, owner):
+        """Binds the cache to *owner* on first use.
+
+        :raises ValueError: If the cache is bound to another owner."""
+        if self._owner is None:
+            self._owner = owner
+        elif self._owner != owner:
+            raise ValueError("BlockCache is already used with another key "
+                             "or cipher class")
+
+    def map(self, direction, blocks, transform):
+        """Return the results for *blocks*. All blocks not in the cache are
+        passed to *transform* in one list, each distinct block once.
+
+        :param int direction: 0 for encryption, 1 for decryption.
+        :param list blocks: The input blocks.
+        :param callable transform: Takes a list of blocks and returns the
+            list of results.
+        :rtype: list"""
+        table = self._tables[direction]
+        results = []
+        pending = OrderedDict()
+
+        for i, block in enumerate(blocks):
+            key = block if type(block) is bytes else bytes(block)
+            try:
+                value = table.pop(key)
+            except KeyError:
+                pending.setdefault(key, []).append(i)
+                results.append(None)
+            else:
+                table[key] = value
+                results.append(value)
+
+        if pending:
+            for key, value in zip(pending, transform(list(pending))):
+                for i in pending[key]:
+                    results[i] = value
+                table[key] = value
+                self._bytes[direction] += len(key) + len(value)
+
+            self._evict(direction)
+
+        self.misses += len(pending)
+        self.hits += len(results) - len(pending)
+        return results
+
+    def _evict(self, direction):
+        table = self._tables[direction]
+        while len(table) > self.maxsize or (
+                self.maxbytes is not None and
+                self._bytes[direction] > self.maxbytes):
+            key, value = table.popitem(last=False)
+            self._bytes[direction] -= len(key) + len(value)
+
+    def clear(self):
+        """Forget all cached blocks; the counters are kept."""
+        for table in self._tables:
+            table.clear()
+        self._bytes = [0, 0]
+
+    def __len__(self):
+        return sum(len(table) for table in self._tables)
+
+    def __getstate__(self):
+        """Cached blocks are not pickled."""
+        state = self.__dict__.copy()
+        state['_tables'] = (OrderedDict(), OrderedDict())
+        state['_bytes'] = [0, 0]
+        return state
+
+
+@mypyc_attr(native_class=False)
+class BufferPool(object):
+    """Pool of reusable `bytearray` buffers, for the output of
+    :py:meth:`~pep272_encryption.PEP272Cipher.encrypt_into` and
+    :py:meth:`~pep272_encryption.PEP272Cipher.decrypt_into` in
+    long-running processes.
+
+    Buffers are bucketed by size class, powers of two from *min_size* to
+    *max_size*; larger requests are served by new buffers and dropped on
+    release. The pool can be shared between threads.
+
+        >>> pool = BufferPool()
+        >>> with pool.buffer(1000) as out:
+        ...     len(out)
+        1000
+        >>> pool.stats()['free']
+        1
+
+    :param int max_free: Free buffers kept per size class.
+    :param int min_size: Smallest size class.
+    :param int max_size: Largest size class.
+    """
+
+    def __init__(self, max_free=8, min_size=4096, max_size=2**24):
+        self.max_free = max_free
+        self.min_size = min_size
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.in_use = 0
+        self._free = {}
+        self._lock = threading.Lock()
+
+    def _size_class(self, size):
+        return max(self.min_size, 1 << (max(size, 1) - 1).bit_length())
+
+    def acquire(self, size):
+        """Take a buffer of at least *size* bytes from the pool; its
+        length is the size class. Hand it back with :py:meth:`release`.
+
+        :rtype: bytearray"""
+        size_class = self._size_class(size)
+
+        with self._lock:
+            self.in_use += 1
+            free = self._free.get(size_class)
+            if free:
+                self.hits += 1
+                return free.pop()
+            self.misses += 1
+
+        return bytearray(size_class if size_class <= self.max_size
+                         else size)
+
+    def release(self, buffer):
+        """Return a buffer taken with :py:meth:`acquire`. It must not be
+        used afterwards.
+
+        :raises ValueError: If the buffer has been returned already."""
+        size = len(buffer)
+        pooled = size <= self.max_size and size == self._size_class(size)
+
+        with self._lock:
+            free = self._free.setdefault(size, []) if pooled else []
+            if any(entry is buffer for entry in free):
+                raise ValueError("Buffer has been released already")
+
+            self.in_use -= 1
+            if pooled and len(free) < self.max_free:
+                free.append(buffer)
+
+    def buffer(self, size):
+        """Context manager lending a `memoryview` of exactly *size* bytes
+        of a pooled buffer.
+
+        :rtype: _Lease"""
+        return _Lease(self, size)
+
+    def stats(self):
+        """Occupancy of the pool: buffers in use, free buffers and their
+        bytes, free buffers per size class, and the hits and misses of
+        :py:meth:`acquire`.
+
+        :rtype: dict"""
+        with self._lock:
+            classes = dict((size, len(free))
+                           for size, free in self._free.items() if free)
+            return {
+                'in_use': self.in_use,
+                'free': sum(classes.values()),
+                'free_bytes': sum(size * count
+                                  for size, count in classes.items()),
+                'classes': classes,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+    def clear(self):
+        """Drop all free buffers."""
+        with self._lock:
+            self._free.clear()
+
+
+@mypyc_attr(native_class=False)
+class _Lease(object):
+    """A buffer lent by :py:meth:`BufferPool.buffer`."""
+
+    def __init__(self, pool, size):
+        self.pool = pool
+        self.size = size
+        self.buffer = None
+        self.view = None
+
+    def __enter__(self):
+        self.buffer = self.pool.acquire(self.size)
+        self.view = memoryview(self.buffer)[:self.size]
+        return self.view
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        release = getattr(self.view, 'release', None)
+        if release is not None:  # not on Python 2
+            release()
+        self.pool.release(self.buffer)
+        self.buffer = self.view = None
+
+
+@mypyc_attr(native_class=False)
 class Counter:
     r"""Counter for usage in CTR mode.
 
@@ -168,10 +535,12 @@ class Counter:
         For security reasons, setting this value to true is
         not recommended.
 
-    The counter is not thread safe.
+    The counter is not thread safe, see :py:class:`ThreadSafeCounter`.
 
     Without arguments, it generates a random nonce,
-    with the counter starts at 0:
+    with the counter starts at 0. If a
+    :py:mod:`~pep272_encryption.nonceguard` registry is installed, nonces
+    that have been generated before are drawn again:
 
         >>> c = Counter()  # random nonce
         >>> c().endswith(b"\x00")
@@ -215,6 +584,7 @@ class Counter:
         self.block_size = block_size or self.block_size
         self.value = initial_value
         self.wrap_around = wrap_around
+        self._registered = False
 
         iv = iv or IV
 
@@ -235,7 +605,9 @@ class Counter:
 
         else:
             if nonce is None:  # Like Pycryptodome
-                nonce = os.urandom(self.block_size // 2)
+                nonce = nonceguard.random_nonce(self.block_size // 2)
+                # Checked already, cipher objects do not register it again.
+                self._registered = True
 
             self.nonce = nonce
 
@@ -245,36 +617,124 @@ class Counter:
             self.suffix = suffix
 
         self.initial_value = self.value = initial_value
-        self.__first = True
+        self._first = True
+        self._remaining = None
 
     def __call__(self):
         """Increase the counter by 1."""
-        if (
-                not self.__first and
-                self.value == self.initial_value
-                and not self.wrap_around
-        ):
-            raise ValueError("Counter overflow detected.")
-
-        value_bytes = (
-                self.block_size -
-                len(self.nonce) -
-                len(self.suffix)
-        )
+        return self._format(self._take(1))
+
+    def reserve(self, n_blocks):
+        r"""Reserve the next *n_blocks* counter values.
+
+        The counter continues after the reserved range. The range is
+        returned as a new counter, that raises a `ValueError` when more
+        than *n_blocks* values are requested from it. Ranges can be handed
+        to different cipher objects to encrypt disjoint regions:
+
+            >>> c = Counter(nonce=b'\x00' * 3, block_size=4)
+            >>> first, second = c.reserve(2), c.reserve(2)
+            >>> first(), first(), second()
+            (b'\x00\x00\x00\x00', b'\x00\x00\x00\x01', b'\x00\x00\x00\x02')
+            >>> c()
+            b'\x00\x00\x00\x04'
+
+        :param int n_blocks: Number of counter values to reserve.
+        :raises ValueError: When the range would overflow the counter.
+        :rtype: Counter"""
+        if n_blocks < 1:
+            raise ValueError("'n_blocks' must be positive")
+
+        start = self._take(n_blocks)
+
+        reserved = Counter.__new__(Counter)
+        reserved.__dict__.update(
+            endian=self.endian, block_size=self.block_size,
+            nonce=self.nonce, suffix=self.suffix,
+            initial_value=start, value=start,
+            wrap_around=True,  # the range has been checked already
+            _first=True, _remaining=n_blocks, _registered=True)
+
+        return reserved
+
+    def _value_bytes(self):
+        return self.block_size - len(self.nonce) - len(self.suffix)
+
+    def _take(self, count):
+        """Advance the counter by *count* values and return the first.
+
+        Raises a `ValueError` if one of the values has been returned
+        before, unless wrap around is allowed."""
+        if self._remaining is not None:
+            if count > self._remaining:
+                raise ValueError("Reserved counter range exhausted.")
+            self._remaining -= count
+
+        modulus = 2**(8 * self._value_bytes())
 
-        self.__first = False
+        if not self.wrap_around:
+            # Values left until the initial value is reached again.
+            left = (self.initial_value - self.value) % modulus
+            if self._first:
+                left = left or modulus
+
+            if count > left:
+                raise ValueError("Counter overflow detected.")
+
+        start = self.value
+        self._first = False
+        self.value = (start + count) % modulus
+
+        return start
+
+    def _format(self, value):
+        """Return the counter block for *value*."""
         out = self.nonce
-        out += to_bytes(self.value,
-                        value_bytes,
+        out += to_bytes(value,
+                        self._value_bytes(),
                         self.endian)
         out += self.suffix
 
-        self.value += 1
-        self.value &= 2**(8*value_bytes)-1
-
         return out
 
 
+@mypyc_attr(native_class=False)
+class ThreadSafeCounter(Counter):
+    r"""Counter for usage in CTR mode, that can be shared between threads.
+
+    It accepts the same arguments and behaves exactly like
+    :py:class:`Counter`, but advancing it is atomic. Producing the counter
+    block happens outside of the lock.
+
+    Threads can either call it directly, or :py:meth:`~Counter.reserve`
+    ranges of counter values to encrypt disjoint regions of a message
+    concurrently, each with its own cipher object:
+
+        >>> c = ThreadSafeCounter(nonce=b'\x00' * 8)
+        >>> ranges = [c.reserve(1024) for region in range(4)]
+        >>> ranges[1]()
+        b'\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x04\x00'
+    """
+
+    def __init__(self, *args, **kwargs):
+        Counter.__init__(self, *args, **kwargs)
+        self._lock = threading.Lock()
+
+    def _take(self, count):
+        with self._lock:
+            return Counter._take(self, count)
+
+    def __getstate__(self):
+        with self._lock:
+            state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+
 if __name__ == "__main__":
     # Doctests are here for faster development.
     # They run additionally to normal tests.
@@ -1,9 +1,18 @@
-from typing import ByteString, Callable, Iterable, Union
+from typing import Any, ByteString, Callable, Dict, Hashable, Iterable, \
+    Iterator, List, Optional, Tuple, Union
 
 Buffer = Union[bytes, bytearray, memoryview]
 
 fast_xor: Union[None, Callable[[Buffer, Buffer], bytes]]
 
+PY_3: bool
+PYPY: bool
+ENGINE: str
+
+
+def mypyc_attr(*attrs: str, **kwattrs: object) -> Callable[[Any], Any]:
+    ...
+
 
 def b_chr(ordinal: int) -> bytes:
     ...
@@ -17,12 +26,124 @@ def from_bytes(bytestring: ByteString, byteorder: str) -> int:
 def to_bytes(integer: int, length: int, byteorder: str) -> bytes:
     ...
 
+class Thresholds(Dict[str, float]):
+    def __missing__(self, key: str) -> float:
+        ...
+
+thresholds: Thresholds
+
 def xor_strings(one: ByteString, two: ByteString) -> bytes:
     ...
 
 def split_blocks(bytestring: ByteString, block_size: int) -> Iterable[bytes]:
     ...
 
+def _blocks(bytestring: ByteString, block_size: int) -> Iterator[bytes]:
+    ...
+
+def _xor_fallback(one: ByteString, two: ByteString) -> bytes:
+    ...
+
+def _xor_indexed(one: ByteString, two: ByteString) -> bytes:
+    ...
+
+def _split_bytes(bytestring: ByteString) -> Iterable[bytes]:
+    ...
+
+
+class KeyCache:
+    maxsize: int
+
+    def __init__(self, maxsize: int=16):
+        ...
+
+    def get(self, key: Hashable, factory: Callable[[], Any]) -> Any:
+        ...
+
+    def clear(self) -> None:
+        ...
+
+    def __len__(self) -> int:
+        ...
+
+
+class BlockCache:
+    maxsize: int
+    maxbytes: Optional[int]
+    hits: int
+    misses: int
+
+    def __init__(self, maxsize: int=4096, maxbytes: int=None):
+        ...
+
+    def _bind(self, owner: Tuple[Any, ...]) -> None:
+        ...
+
+    def map(self, direction: int, blocks: List[ByteString],
+            transform: Callable[[List[bytes]], List[bytes]]) -> List[bytes]:
+        ...
+
+    def _evict(self, direction: int) -> None:
+        ...
+
+    def clear(self) -> None:
+        ...
+
+    def __len__(self) -> int:
+        ...
+
+    def __getstate__(self) -> Dict[str, Any]:
+        ...
+
+
+class BufferPool(object):
+    max_free: int
+    min_size: int
+    max_size: int
+    hits: int
+    misses: int
+    in_use: int
+    _free: Dict[int, List[bytearray]]
+
+    def __init__(self, max_free: int=8, min_size: int=4096,
+                 max_size: int=2**24) -> None:
+        ...
+
+    def _size_class(self, size: int) -> int:
+        ...
+
+    def acquire(self, size: int) -> bytearray:
+        ...
+
+    def release(self, buffer: bytearray) -> None:
+        ...
+
+    def buffer(self, size: int) -> '_Lease':
+        ...
+
+    def stats(self) -> Dict[str, Any]:
+        ...
+
+    def clear(self) -> None:
+        ...
+
+
+class _Lease(object):
+    pool: BufferPool
+    size: int
+    buffer: Optional[bytearray]
+    view: Optional[memoryview]
+
+    def __init__(self, pool: BufferPool, size: int) -> None:
+        ...
+
+    def __enter__(self) -> memoryview:
+        ...
+
+    def __exit__(self, exc_type: Any, exc_value: Any,
+                 traceback: Any) -> None:
+        ...
+
 
 class Counter:
     block_size: int
@@ -45,4 +166,24 @@ class Counter:
         ...
 
     def __call__(self) -> bytes:
+        ...
+
+    def reserve(self, n_blocks: int) -> 'Counter':
+        ...
+
+    def _value_bytes(self) -> int:
+        ...
+
+    def _take(self, count: int) -> int:
+        ...
+
+    def _format(self, value: int) -> bytes:
+        ...
+
+
+class ThreadSafeCounter(Counter):
+    def __getstate__(self) -> Dict[str, Any]:
+        ...
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
         ...
\ No newline at end of file
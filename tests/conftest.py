@@ -0,0 +1,6 @@
+import os
+
+# Use the default thresholds instead of measuring them and writing a cache
+# file while testing, see pep272_encryption.calibrate.
+os.environ.setdefault('PEP272_ENCRYPTION_CALIBRATE', '0')
+os.environ.setdefault('PEP272_ENCRYPTION_CACHE', os.devnull)
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+import pickle
+
+import pytest
+
+from pep272_encryption import MODE_ECB, MODE_CBC
+from pep272_encryption.util import BlockCache
+
+from test_modes import CipherClass
+
+
+TEST_KEY = b'0123456789abcdef'
+TEST_DATA = (b'\x00' * 16 * 100 + b'record 1'.ljust(16) +
+             b'record 2'.ljust(16)) * 20
+
+
+class CountingCipher(CipherClass):
+    calls = 0
+
+    def encrypt_block(self, key, block, **kwargs):
+        CountingCipher.calls += 1
+        return CipherClass.encrypt_block(self, key, block, **kwargs)
+
+    def decrypt_block(self, key, block, **kwargs):
+        CountingCipher.calls += 1
+        return CipherClass.decrypt_block(self, key, block, **kwargs)
+
+
+def test_repeated_blocks():
+    CountingCipher.calls = 0
+    cipher = CountingCipher(TEST_KEY, MODE_ECB, block_cache=16)
+
+    ciphertext = cipher.encrypt(TEST_DATA)
+    assert ciphertext == CipherClass(TEST_KEY, MODE_ECB).encrypt(TEST_DATA)
+    assert CountingCipher.calls == 3
+    assert cipher.block_cache.misses == 3
+    assert cipher.block_cache.hits == len(TEST_DATA) // 16 - 3
+
+    assert cipher.decrypt(ciphertext) == TEST_DATA
+    assert CountingCipher.calls == 6
+
+
+def test_bounded():
+    cache = BlockCache(maxsize=2)
+    cipher = CountingCipher(TEST_KEY, MODE_ECB, block_cache=cache)
+    blocks = [bytes(bytearray([i])) * 16 for i in range(3)]
+
+    for block in blocks + blocks:
+        cipher.encrypt(block)
+    assert (cache.hits, cache.misses, len(cache)) == (0, 6, 2)
+
+    cipher.encrypt(blocks[2])  # most recently used
+    assert cache.hits == 1
+
+    by_bytes = BlockCache(maxbytes=64)
+    for block in blocks:
+        by_bytes.map(0, [block], lambda batch: batch)
+    assert len(by_bytes) == 2  # 32 bytes per entry
+
+
+def test_bound_to_key():
+    cache = BlockCache()
+    CipherClass(TEST_KEY, MODE_ECB, block_cache=cache).encrypt(TEST_DATA)
+    shared = CipherClass(TEST_KEY, MODE_ECB, block_cache=cache)
+    assert shared.encrypt(TEST_DATA[:32]) == \
+        CipherClass(TEST_KEY, MODE_ECB).encrypt(TEST_DATA[:32])
+
+    with pytest.raises(ValueError):
+        CipherClass(TEST_KEY[::-1], MODE_ECB, block_cache=cache)
+    with pytest.raises(ValueError):
+        CountingCipher(TEST_KEY, MODE_ECB, block_cache=cache)
+
+
+def test_arguments():
+    assert CipherClass(TEST_KEY, MODE_ECB).block_cache is None
+
+    with pytest.raises(TypeError):
+        CipherClass(TEST_KEY, MODE_CBC, b'\x00' * 16, block_cache=16)
+
+
+def test_pickle():
+    cipher = CipherClass(TEST_KEY, MODE_ECB, block_cache=16)
+    cipher.encrypt(TEST_DATA)
+
+    restored = pickle.loads(pickle.dumps(cipher))
+    assert len(restored.block_cache) == 0
+    assert restored.block_cache.hits == cipher.block_cache.hits
+    assert restored.encrypt(TEST_DATA) == cipher.encrypt(TEST_DATA)
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+import pytest
+
+from pep272_encryption import MODE_ECB, MODE_CBC, MODE_CFB, MODE_OFB, \
+    MODE_CTR, MODE_GCM, MODE_OCB
+from pep272_encryption.util import BufferPool, Counter
+
+from test_modes import CipherClass
+from test_native import NativeAES
+
+
+TEST_KEY = b'0123456789abcdef'
+TEST_IV = b'initialization v'
+TEST_DATA = bytes(bytearray(i % 251 for i in range(960)))
+
+PARAMETERS = [
+    ((MODE_ECB,), {}),
+    ((MODE_ECB,), {'block_cache': 8}),
+    ((MODE_CBC, TEST_IV), {}),
+    ((MODE_CFB, TEST_IV), {'segment_size': 8}),
+    ((MODE_CFB, TEST_IV), {'segment_size': 128}),
+    ((MODE_OFB, TEST_IV), {}),
+    ((MODE_CTR,), {'counter': lambda: Counter(nonce=b'nonce 64')}),
+    ((MODE_GCM,), {'nonce': b'twelve bytes'}),
+    ((MODE_OCB,), {'nonce': b'twelve bytes'}),
+]
+
+
+def create(args, kwargs, cls=CipherClass):
+    kwargs = dict((name, value() if callable(value) else value)
+                  for name, value in kwargs.items())
+    return cls(TEST_KEY, *args, **kwargs)
+
+
+@pytest.mark.parametrize("args, kwargs", PARAMETERS)
+def test_into_same_result(args, kwargs):
+    reference = create(args, kwargs)
+    expected = reference.encrypt(TEST_DATA[:480]) + \
+        reference.encrypt(TEST_DATA[480:])
+
+    pool = BufferPool(min_size=512)
+    cipher = create(args, kwargs)
+    out = []
+    for piece in (TEST_DATA[:480], TEST_DATA[480:]):
+        with pool.buffer(len(piece)) as view:
+            written = cipher.encrypt_into(piece, view)
+            out.append(view[:written].tobytes())
+
+    assert b"".join(out) == expected
+    if args[0] in (MODE_GCM, MODE_OCB):
+        assert cipher.digest() == reference.digest()
+
+    plaintext = bytearray(len(expected))
+    cipher = create(args, kwargs)
+    assert cipher.decrypt_into(expected, plaintext) == len(expected)
+    assert bytes(plaintext) == TEST_DATA[:len(expected)]
+
+
+@pytest.mark.parametrize("args, kwargs", PARAMETERS[:7])
+def test_into_in_place(args, kwargs):
+    buffer = bytearray(TEST_DATA)
+    create(args, kwargs).encrypt_into(buffer, buffer)
+    assert bytes(buffer) == create(args, kwargs).encrypt(TEST_DATA)
+
+    create(args, kwargs).decrypt_into(memoryview(buffer), buffer)
+    assert bytes(buffer) == TEST_DATA
+
+
+def test_into_native():
+    out = bytearray(len(TEST_DATA))
+    cipher = NativeAES(TEST_KEY, MODE_CBC, TEST_IV)
+    assert cipher.encrypt_into(TEST_DATA, out) == len(TEST_DATA)
+    assert bytes(out) == CipherClass(TEST_KEY, MODE_CBC, TEST_IV).encrypt(
+        TEST_DATA)
+
+
+def test_into_errors():
+    cipher = CipherClass(TEST_KEY, MODE_ECB)
+
+    with pytest.raises(ValueError):
+        cipher.encrypt_into(TEST_DATA, bytearray(16))
+
+    with pytest.raises(TypeError):
+        cipher.encrypt_into(TEST_DATA, bytes(len(TEST_DATA)))
+
+    with pytest.raises(ValueError):
+        cipher.encrypt_into(TEST_DATA[:15], bytearray(16))
+
+
+def test_pool():
+    pool = BufferPool(max_free=2, min_size=16, max_size=64)
+
+    first = pool.acquire(10)
+    assert len(first) == 16
+    second = pool.acquire(17)
+    assert len(second) == 32
+    large = pool.acquire(100)
+    assert len(large) == 100
+
+    assert pool.stats()['in_use'] == 3
+    for buffer in (first, second, large):
+        pool.release(buffer)
+
+    stats = pool.stats()
+    assert stats['in_use'] == 0
+    assert stats['classes'] == {16: 1, 32: 1}
+    assert stats['free_bytes'] == 48
+    assert stats['misses'] == 3
+
+    assert pool.acquire(16) is first
+    assert pool.stats()['hits'] == 1
+
+    pool.release(first)
+    with pytest.raises(ValueError):
+        pool.release(first)
+
+    buffers = [pool.acquire(16) for _ in range(3)]
+    for buffer in buffers:
+        pool.release(buffer)
+    assert pool.stats()['classes'][16] == 2
+
+    pool.clear()
+    assert pool.stats()['free'] == 0
+
+
+def test_pool_lease():
+    pool = BufferPool(min_size=16)
+
+    with pool.buffer(20) as view:
+        assert len(view) == 20
+        assert pool.stats()['in_use'] == 1
+
+    assert pool.stats() == dict(pool.stats(), in_use=0, free=1)
+    with pytest.raises(ValueError):
+        view[0]  # released
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+import json
+
+import pytest
+
+from pep272_encryption import calibrate, util
+
+
+@pytest.fixture(autouse=True)
+def isolated(monkeypatch, tmp_path):
+    """Restores the thresholds and uses a temporary cache file."""
+    saved, loaded = dict(util.thresholds), list(calibrate._loaded)
+    monkeypatch.setenv('PEP272_ENCRYPTION_CACHE',
+                       str(tmp_path / 'calibration.json'))
+    monkeypatch.delenv('PEP272_ENCRYPTION_THRESHOLDS', raising=False)
+    util.thresholds.clear()
+    del calibrate._loaded[:]
+
+    yield
+
+    util.thresholds.clear()
+    util.thresholds.update(saved)
+    calibrate._loaded[:] = loaded
+
+
+def test_parse():
+    assert calibrate.parse("xor=none, parallel=1024,") == {
+        'xor': None, 'parallel': 1024}
+
+    with pytest.raises(ValueError):
+        calibrate.parse("unknown=1")
+
+    with pytest.raises(ValueError):
+        calibrate.parse("xor=many")
+
+
+def test_environment_override(monkeypatch):
+    monkeypatch.setenv('PEP272_ENCRYPTION_THRESHOLDS', 'xor=16')
+
+    assert util.thresholds['xor'] == 16  # loaded on first use
+    assert util.thresholds['parallel'] == calibrate.DEFAULTS['parallel']
+
+    # both implementations are used depending on the size
+    for size in (15, 16, 100):
+        one, two = b'\x0f' * size, b'\xf1' * size
+        assert util.xor_strings(one, two) == b'\xfe' * size
+
+
+def test_defaults(monkeypatch):
+    monkeypatch.setenv('PEP272_ENCRYPTION_CALIBRATE', '0')
+
+    assert calibrate.load() == calibrate.DEFAULTS
+    assert util.thresholds['xor'] == float('inf')
+
+
+def test_cache(monkeypatch):
+    values = calibrate.calibrate()
+    assert set(values) <= set(calibrate.DEFAULTS)
+
+    with open(calibrate.cache_file()) as cache:
+        assert json.load(cache) == {calibrate.signature(): values}
+
+    # A new process reads the cache instead of measuring again
+    del calibrate._loaded[:]
+    monkeypatch.setattr(calibrate, 'measure', None)
+    assert calibrate.load() == dict(calibrate.DEFAULTS, **values)
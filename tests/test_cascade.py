@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+import pickle
+
+import pytest
+
+from pep272_encryption import MODE_ECB, MODE_CBC, MODE_CFB, MODE_OFB, \
+    MODE_CTR, MODE_GCM, MODE_OCB
+from pep272_encryption import parallel
+from pep272_encryption.cascade import CascadeCipher, ede
+from pep272_encryption.util import Counter
+
+from test_modes import CipherClass
+
+
+KEYS = (b'0123456789abcdef', b'fedcba9876543210', b'key number three')
+TEST_IV = b'initialization v'
+TEST_DATA = bytes(bytearray(i % 251 for i in range(960)))
+
+
+class TripleAES(CascadeCipher):
+    block_size = 16
+    layers = ede(CipherClass, 16)
+
+
+class DoubleAES(CascadeCipher):
+    block_size = 16
+    layers = ede(CipherClass, 16, keying=2)
+
+
+class SingleAES(CascadeCipher):
+    block_size = 16
+    layers = ede(CipherClass, 16, keying=1)
+
+
+class CountingAES(CipherClass):
+    batches = 0
+
+    def encrypt_blocks(self, key, blocks, **kwargs):
+        CountingAES.batches += 1
+        return CipherClass.encrypt_blocks(self, key, blocks, **kwargs)
+
+    def decrypt_blocks(self, key, blocks, **kwargs):
+        CountingAES.batches += 1
+        return CipherClass.decrypt_blocks(self, key, blocks, **kwargs)
+
+
+class Batched(CascadeCipher):
+    block_size = 16
+    layers = ede(CountingAES, 16)
+
+
+PARAMETERS = [
+    ((MODE_ECB,), {}),
+    ((MODE_CBC, TEST_IV), {}),
+    ((MODE_CFB, TEST_IV), {'segment_size': 8}),
+    ((MODE_OFB, TEST_IV), {}),
+    ((MODE_CTR,), {'counter': lambda: Counter(nonce=b'nonce 64')}),
+    ((MODE_GCM,), {'nonce': b'twelve bytes'}),
+    ((MODE_OCB,), {'nonce': b'twelve bytes'}),
+]
+
+
+def create(cls, key, args, kwargs):
+    kwargs = dict((name, value() if callable(value) else value)
+                  for name, value in kwargs.items())
+    return cls(key, *args, **kwargs)
+
+
+def ede_block(block):
+    """Triple encryption of one block with separate cipher objects."""
+    block = CipherClass(KEYS[0], MODE_ECB).encrypt(block)
+    block = CipherClass(KEYS[1], MODE_ECB).decrypt(block)
+    return CipherClass(KEYS[2], MODE_ECB).encrypt(block)
+
+
+@pytest.mark.parametrize("args, kwargs", PARAMETERS)
+def test_keying_option_1_is_single(args, kwargs):
+    expected = create(CipherClass, KEYS[0], args, kwargs).encrypt(TEST_DATA)
+
+    assert create(SingleAES, KEYS[0], args, kwargs).encrypt(TEST_DATA) == \
+        expected
+    assert create(SingleAES, KEYS[0], args, kwargs).decrypt(expected) == \
+        TEST_DATA
+
+
+@pytest.mark.parametrize("args, kwargs", PARAMETERS)
+def test_roundtrip(args, kwargs):
+    key = b"".join(KEYS)
+    ciphertext = create(TripleAES, key, args, kwargs).encrypt(TEST_DATA)
+
+    assert ciphertext != TEST_DATA
+    assert create(TripleAES, key, args, kwargs).decrypt(ciphertext) == \
+        TEST_DATA
+
+
+def test_ede():
+    cipher = TripleAES(b"".join(KEYS), MODE_ECB)
+    assert cipher.encrypt(TEST_DATA[:32]) == \
+        ede_block(TEST_DATA[:16]) + ede_block(TEST_DATA[16:32])
+
+    cipher = DoubleAES(KEYS[0] + KEYS[1], MODE_ECB)
+    assert cipher.decrypt(cipher.encrypt(TEST_DATA)) == TEST_DATA
+    assert [layer.key for layer, _ in cipher._layers] == \
+        [KEYS[0], KEYS[1], KEYS[0]]
+
+    with pytest.raises(ValueError):
+        ede(CipherClass, 16, keying=4)
+
+
+def test_batches():
+    CountingAES.batches = 0
+    key = b"".join(KEYS)
+    ciphertext = Batched(key, MODE_ECB).encrypt(TEST_DATA)
+    assert CountingAES.batches == 3
+
+    assert ciphertext == TripleAES(key, MODE_ECB).encrypt(TEST_DATA)
+    assert Batched(key, MODE_ECB).decrypt(ciphertext) == TEST_DATA
+
+
+def test_pickle_and_parallel():
+    key = b"".join(KEYS)
+    cipher = TripleAES(key, MODE_CBC, TEST_IV)
+    head = cipher.encrypt(TEST_DATA[:32])
+    restored = pickle.loads(pickle.dumps(cipher))
+
+    expected = TripleAES(key, MODE_CBC, TEST_IV).encrypt(TEST_DATA)
+    assert head + restored.encrypt(TEST_DATA[32:]) == expected
+
+    assert parallel.encrypt(TripleAES(key, MODE_ECB), TEST_DATA, workers=2,
+                            backend='serial') == \
+        TripleAES(key, MODE_ECB).encrypt(TEST_DATA)
+
+
+def test_errors():
+    with pytest.raises(ValueError):
+        TripleAES(KEYS[0], MODE_ECB)
+
+    class Empty(CascadeCipher):
+        block_size = 16
+
+    with pytest.raises(TypeError):
+        Empty(KEYS[0], MODE_ECB)
+
+    class Mixed(CascadeCipher):
+        block_size = 8
+        layers = ede(CipherClass, 16, keying=1)
+
+    with pytest.raises(ValueError):
+        Mixed(KEYS[0], MODE_ECB)
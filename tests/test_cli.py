@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+import binascii
+import os
+import subprocess
+import sys
+import threading
+import time
+
+try:
+    import queue
+except ImportError:  # Python 2
+    import Queue as queue
+
+from Crypto.Cipher import AES
+import pytest
+
+from pep272_encryption import cli
+
+
+TEST_KEY = b'0123456789abcdef'
+TEST_HEX_KEY = binascii.hexlify(TEST_KEY).decode('ascii')
+TEST_DATA = os.urandom(16 * 1000 + 5)
+CIPHER = 'test_modes:CipherClass'
+
+
+@pytest.fixture
+def files(tmp_path):
+    source = tmp_path / 'input'
+    source.write_bytes(TEST_DATA)
+    return source, tmp_path / 'encrypted', tmp_path / 'decrypted'
+
+
+def run(action, source, target, *args):
+    return cli.main([action, str(source), str(target), '-c', CIPHER,
+                     '-k', TEST_HEX_KEY, '--chunk-size', '1000', '-q'] +
+                    list(args))
+
+
+@pytest.mark.parametrize("mode, args, reference", [
+    ("CTR", ["--nonce", "0001020304050607"],
+     lambda: AES.new(TEST_KEY, AES.MODE_CTR, nonce=b'\x00\x01\x02\x03'
+                     b'\x04\x05\x06\x07')),
+    ("OFB", ["--iv", "00" * 16],
+     lambda: AES.new(TEST_KEY, AES.MODE_OFB, iv=b'\x00' * 16)),
+    ("CFB", ["--iv", "00" * 16],
+     lambda: AES.new(TEST_KEY, AES.MODE_CFB, iv=b'\x00' * 16)),
+])
+def test_round_trip(files, mode, args, reference):
+    source, encrypted, decrypted = files
+
+    assert run('encrypt', source, encrypted, '-m', mode, *args) == 0
+    assert encrypted.read_bytes() == reference().encrypt(TEST_DATA)
+
+    assert run('decrypt', encrypted, decrypted, '-m', mode, *args) == 0
+    assert decrypted.read_bytes() == TEST_DATA
+
+
+def test_block_modes(files, tmp_path):
+    source, encrypted, decrypted = files
+    source.write_bytes(TEST_DATA[:-5])
+
+    for mode in ('ECB', 'CBC'):
+        assert run('encrypt', source, encrypted, '-m', mode,
+                   '--iv', '00' * 16) == 0
+        assert run('decrypt', encrypted, decrypted, '-m', mode,
+                   '--iv', '00' * 16) == 0
+        assert decrypted.read_bytes() == TEST_DATA[:-5]
+
+    # no padding: the input must be a multiple of the block size
+    source.write_bytes(TEST_DATA)
+    encrypted.unlink()
+    assert run('encrypt', source, encrypted, '-m', 'ECB') == 1
+    assert not encrypted.exists()
+
+
+@pytest.mark.parametrize("mode", ["GCM", "OCB"])
+def test_aead(files, mode, capsys):
+    source, encrypted, decrypted = files
+    args = ['-m', mode, '--nonce', '00' * 12]
+
+    assert run('encrypt', source, encrypted, *args) == 0
+    reference = AES.new(TEST_KEY, getattr(AES, 'MODE_' + mode),
+                        nonce=b'\x00' * 12)
+    assert encrypted.read_bytes() == b''.join(
+        reference.encrypt_and_digest(TEST_DATA))
+
+    assert run('decrypt', encrypted, decrypted, *args) == 0
+    assert decrypted.read_bytes() == TEST_DATA
+
+    assert run('decrypt', encrypted, '-', *args) == 1
+    assert 'cannot write to stdout' in capsys.readouterr().err
+
+    tampered = encrypted.read_bytes()
+    encrypted.write_bytes(tampered[:-1] + bytes(bytearray([tampered[-1] ^ 1])))
+    decrypted.unlink()
+    assert run('decrypt', encrypted, decrypted, *args) == 1
+    assert not decrypted.exists()
+    assert sorted(path.name for path in decrypted.parent.iterdir()) == \
+        ['encrypted', 'input']
+
+
+def test_keeps_existing_output(files, capsys):
+    source, encrypted, _ = files
+    encrypted.write_bytes(b'previous')
+
+    assert run('encrypt', source, encrypted, '-m', 'OFB', '--iv', '00' * 16,
+               '-c', 'test_modes:Missing') == 1
+    assert run('encrypt', source, encrypted, '-m', 'ECB') == 1
+    assert encrypted.read_bytes() == b'previous'
+    assert sorted(path.name for path in source.parent.iterdir()) == \
+        ['encrypted', 'input']
+
+
+def test_failing_output(files, monkeypatch, capsys):
+    source, encrypted, _ = files
+
+    class Full(object):
+        def write(self, data):
+            raise IOError("No space left on device")
+
+    def slow(source, mapped, chunk_size):
+        yield TEST_DATA[:16]
+        time.sleep(0.5)  # the writer fails meanwhile
+        yield TEST_DATA[16:32]
+
+    monkeypatch.setattr(cli, '_open_output', lambda path: (Full(), None))
+    monkeypatch.setattr(cli, '_read_chunks', slow)
+    status = []
+    thread = threading.Thread(target=lambda: status.append(run(
+        'encrypt', source, encrypted, '-m', 'OFB', '--iv', '00' * 16)))
+    thread.daemon = True
+    thread.start()
+    thread.join(10)
+
+    assert status == [1]
+    assert 'No space left' in capsys.readouterr().err
+
+
+def test_done_after_stop():
+    target, stop = queue.Queue(1), threading.Event()
+    target.put(b'chunk')
+    stop.set()
+
+    cli._put_done(target, stop)
+    assert target.get_nowait() is cli._DONE
+
+
+def test_empty_input(files):
+    source, encrypted, decrypted = files
+    source.write_bytes(b'')
+
+    assert run('encrypt', source, encrypted, '--nonce', '00' * 8) == 0
+    assert encrypted.read_bytes() == b''
+
+
+def test_errors(files, capsys):
+    source, encrypted, _ = files
+
+    assert run('encrypt', source, encrypted) == 1  # CTR without nonce
+    assert 'requires --nonce' in capsys.readouterr().err
+
+    with pytest.raises(ValueError):
+        cli.load_cipher('CipherClass')
+
+
+def test_module(files):
+    source, encrypted, _ = files
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(sys.path)
+
+    process = subprocess.run(
+        [sys.executable, '-m', 'pep272_encryption', 'encrypt', str(source),
+         str(encrypted), '-c', CIPHER, '-k', TEST_HEX_KEY, '-m', 'OFB',
+         '--iv', '00' * 16], env=env, stderr=subprocess.PIPE)
+
+    assert process.returncode == 0
+    assert b'MiB/s' in process.stderr
+    assert encrypted.read_bytes() == AES.new(
+        TEST_KEY, AES.MODE_OFB, iv=b'\x00' * 16).encrypt(TEST_DATA)
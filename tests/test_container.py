@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+import io
+
+import pytest
+
+from pep272_encryption import MODE_CBC, MODE_CFB, MODE_ECB
+from pep272_encryption import parallel
+from pep272_encryption.container import ContainerWriter, ContainerReader
+
+from test_modes import CipherClass
+
+
+TEST_KEY = b'0123456789abcdef'
+TEST_IV = b'initialization v'
+TEST_DATA = bytes(bytearray(i % 251 for i in range(5000)))
+
+PARAMETERS = [
+    (MODE_CBC, None),
+    (MODE_CFB, 8),
+    (MODE_CFB, 128),
+]
+
+
+def write(data, mode=MODE_CBC, segment_size=None, cls=CipherClass,
+          pieces=3, **kwargs):
+    target = io.BytesIO()
+    with ContainerWriter(target, cls, TEST_KEY, mode, TEST_IV,
+                         segment_size=segment_size, chunk_size=512,
+                         **kwargs) as writer:
+        step = len(data) // pieces + 1
+        for i in range(0, len(data), step):
+            writer.write(data[i:i + step])
+    return target
+
+
+@pytest.mark.parametrize("mode, segment_size", PARAMETERS)
+@pytest.mark.parametrize("size", [0, 100, 512, 5000])
+def test_roundtrip(mode, segment_size, size):
+    data = TEST_DATA[:size]
+    target = write(data, mode, segment_size, workers=2, backend='serial')
+
+    reader = ContainerReader(target, CipherClass, TEST_KEY, workers=2,
+                             backend='serial')
+    assert len(reader) == size
+    assert reader.read() == data
+
+
+@pytest.mark.parametrize("mode, segment_size", PARAMETERS)
+def test_chunk_ivs(mode, segment_size):
+    target = write(TEST_DATA, mode, segment_size, workers=1)
+    reader = ContainerReader(target, CipherClass, TEST_KEY)
+
+    # Every chunk is a separate ciphertext with its own IV.
+    kwargs = {'segment_size': segment_size} if segment_size else {}
+    for number in (0, 3, 9):
+        start, end = reader._offsets[number:number + 2]
+        chunk = target.getvalue()[start:end]
+        cipher = CipherClass(TEST_KEY, mode, reader.chunk_iv(number),
+                             **kwargs)
+        expected = TEST_DATA[number * 512:(number + 1) * 512]
+        assert cipher.decrypt(chunk)[:len(expected)] == expected
+
+    assert len(set(reader.chunk_iv(i) for i in range(10))) == 10
+
+
+@pytest.mark.parametrize("backend", parallel.available_backends())
+def test_parallel_same_as_serial(backend):
+    expected = write(TEST_DATA, workers=1).getvalue()
+    assert write(TEST_DATA, workers=4, backend=backend).getvalue() == \
+        expected
+
+    reader = ContainerReader(io.BytesIO(expected), CipherClass, TEST_KEY,
+                             workers=4, backend=backend)
+    assert reader.read() == TEST_DATA
+
+
+def test_random_access():
+    reader = ContainerReader(write(TEST_DATA), CipherClass, TEST_KEY,
+                             workers=2)
+    touched = []
+    crypt_chunks = reader._crypt_chunks
+
+    def spy(data, first, decrypt):
+        out = crypt_chunks(data, first, decrypt)
+        touched.extend(range(first, first + len(out)))
+        return out
+
+    reader._crypt_chunks = spy
+
+    assert reader.read(600, 100) == TEST_DATA[600:700]
+    assert touched == [1]
+
+    del touched[:]
+    assert reader.read(1000, 1100) == TEST_DATA[1000:2100]
+    assert touched == [1, 2, 3, 4]
+
+    del touched[:]
+    assert reader.read(4990) == TEST_DATA[4990:]
+    assert reader.read(4990, 100) == TEST_DATA[4990:]
+    assert reader.read(6000) == b""
+    assert touched == [9, 9]
+
+
+def test_local_class():
+    class Local(CipherClass):
+        pass
+
+    target = write(TEST_DATA, cls=Local, workers=2)
+    assert target.getvalue() == write(TEST_DATA, workers=2).getvalue()
+    assert ContainerReader(target, Local, TEST_KEY).read() == TEST_DATA
+
+
+def test_errors():
+    with pytest.raises(ValueError):
+        write(TEST_DATA, mode=MODE_ECB)
+
+    with pytest.raises(ValueError):
+        ContainerWriter(io.BytesIO(), CipherClass, TEST_KEY, chunk_size=100)
+
+    with pytest.raises(ValueError):
+        ContainerReader(io.BytesIO(b'not a container'), CipherClass,
+                        TEST_KEY)
+
+    data = bytearray(write(TEST_DATA).getvalue())
+    data[-1:] = b'x'
+    with pytest.raises(ValueError):
+        ContainerReader(io.BytesIO(bytes(data)), CipherClass, TEST_KEY)
+
+    writer = ContainerWriter(io.BytesIO(), CipherClass, TEST_KEY)
+    writer.close()
+    with pytest.raises(ValueError):
+        writer.write(b'data')
+
+    reader = ContainerReader(write(TEST_DATA), CipherClass, TEST_KEY)
+    with pytest.raises(ValueError):
+        reader.read(-1)
@@ -1,4 +1,5 @@
 #!/usr/bin/env python3
+import pytest
 
 from pep272_encryption import util
 
@@ -35,3 +36,58 @@ def test_to_bytes_big():
     assert util.to_bytes(0x030201, 5, 'big') == b'\x00\x00\x03\x02\x01'
 
     assert util.to_bytes(0, 5, 'little') == b'\x00' * 5
+
+
+def test_xor_strings_buffers():
+    expected = b'\x03\x01\x03'
+    for one in (b'\x01\x02\x03', bytearray(b'\x01\x02\x03'),
+                memoryview(b'\x01\x02\x03')):
+        assert util.xor_strings(one, b'\x02\x03\x00\xff') == expected
+        assert util.xor_strings(b'\x02\x03\x00', one) == expected
+
+    assert util.xor_strings(b'', b'\x01') == b''
+
+
+def test_xor_fallback():
+    """The pure Python implementation matches the extension module."""
+    expected = b'\x03\x01\x03'
+    for one in (b'\x01\x02\x03', bytearray(b'\x01\x02\x03'),
+                memoryview(b'\x01\x02\x03')):
+        assert util._xor_fallback(one, b'\x02\x03\x00\xff') == expected
+        assert util._xor_fallback(b'\x02\x03\x00', one) == expected
+
+    assert util._xor_fallback(b'', b'\x01') == b''
+
+
+def test_xor_indexed():
+    """The loop used on PyPy matches the other implementations."""
+    expected = b'\x03\x01\x03'
+    for one in (b'\x01\x02\x03', bytearray(b'\x01\x02\x03'),
+                memoryview(b'\x01\x02\x03')):
+        assert util._xor_indexed(one, b'\x02\x03\x00\xff') == expected
+        assert util._xor_indexed(b'\x02\x03\x00', one) == expected
+
+    assert util._xor_indexed(b'', b'\x01') == b''
+
+
+def test_xor_strings_pypy(monkeypatch):
+    monkeypatch.setattr(util, 'PYPY', True)
+    monkeypatch.setattr(util, 'fast_xor', None)
+    monkeypatch.setattr(util, '_xor_fallback', None)  # must not be used
+
+    assert util.xor_strings(b'\x01\x02\x03', b'\x02\x03\x00') == \
+        b'\x03\x01\x03'
+
+
+def test_split_single_bytes():
+    assert list(util.split_blocks(bytearray(b'ab\x00'), 1)) == \
+        [b'a', b'b', b'\x00']
+
+
+def test_b_chr():
+    assert util.b_chr(0) == b'\x00'
+    assert util.b_chr(255) == b'\xff'
+
+    for ordinal in (-1, 256):
+        with pytest.raises(ValueError):
+            util.b_chr(ordinal)
@@ -1,6 +1,10 @@
 #!/usr/bin/env python3
 
 import doctest
+import threading
+
+import pytest
+
 from pep272_encryption import util
 
 
@@ -38,4 +42,64 @@ def test_doctest_1():
 def test_doctest_2():
     c = util.Counter(IV=b'\x00' * 4, endian="little")
     assert c() == b'\x00\x00\x00\x00'
-    assert c() == b'\x01\x00\x00\x00'
\ No newline at end of file
+    assert c() == b'\x01\x00\x00\x00'
+
+
+def test_reserve_contiguous():
+    c = util.Counter(nonce=b'N', block_size=4)
+    first, second = c.reserve(3), c.reserve(2)
+
+    assert [first() for _ in range(3)] == [b'N\x00\x00' + util.b_chr(i)
+                                           for i in range(3)]
+    assert [second() for _ in range(2)] == [b'N\x00\x00\x03',
+                                            b'N\x00\x00\x04']
+    assert c() == b'N\x00\x00\x05'
+
+
+def test_reserve_exhausted():
+    reserved = util.Counter(block_size=4).reserve(2)
+    reserved()
+    reserved()
+    with pytest.raises(ValueError):
+        reserved()
+
+
+def test_reserve_overflow():
+    c = util.Counter(nonce=b'N', initial_value=0xfe, block_size=2)
+    c.reserve(0xff)
+    c()
+    with pytest.raises(ValueError):
+        c()
+
+    c = util.Counter(nonce=b'N', initial_value=0xfe, block_size=2)
+    with pytest.raises(ValueError):
+        c.reserve(0x101)
+    assert c() == b'N\xfe'  # state is kept on errors
+
+
+def test_reserve_wrap_around():
+    c = util.Counter(nonce=b'N', initial_value=0xff, block_size=2,
+                     wrap_around=True)
+    reserved = c.reserve(0x102)
+    assert reserved() == b'N\xff'
+    assert reserved() == b'N\x00'
+    assert c() == b'N\x01'
+
+
+def test_thread_safe_counter():
+    c = util.ThreadSafeCounter(block_size=8)
+    results = []
+
+    def worker():
+        own = [c() for _ in range(200)]
+        own += [r() for r in [c.reserve(3)] for _ in range(3)]
+        results.extend(own)
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(results) == len(set(results)) == 8 * 203
+    assert c.value == 8 * 203
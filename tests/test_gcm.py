@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+from Crypto.Cipher import AES
+import pytest
+
+from pep272_encryption import PEP272Cipher, MODE_GCM, MODE_CBC
+from pep272_encryption.gcm import GHASH, ghash_tables, gf_multiply
+from pep272_encryption.util import from_bytes
+
+from test_modes import CipherClass
+
+
+TEST_KEY = b'0123456789abcdef'
+TEST_NONCE = b'unique nonce'
+TEST_DATA = bytes(bytearray(range(256))) * 3
+
+
+class Cipher8(PEP272Cipher):
+    block_size = 8
+
+    def encrypt_block(self, key, block, **kwargs):
+        return block
+
+    def decrypt_block(self, key, block, **kwargs):
+        return block
+
+
+def naive_multiply(x, y):
+    """Bitwise multiplication in GF(2^128), NIST SP 800-38D Algorithm 1"""
+    z, v = 0, y
+    for i in range(127, -1, -1):
+        if (x >> i) & 1:
+            z ^= v
+        v = (v >> 1) ^ (0xE1 << 120) if v & 1 else v >> 1
+    return z
+
+
+def test_tables_match_naive_multiplication():
+    h = AES.new(TEST_KEY, AES.MODE_ECB).encrypt(b'\x00' * 16)
+    tables = ghash_tables(h)
+    h_int = from_bytes(h, 'big')
+
+    for x in (0, 1, 2**127, 0x0123456789abcdef0123456789abcdef,
+              2**128 - 1):
+        assert gf_multiply(tables, x) == naive_multiply(x, h_int)
+
+
+def test_ghash_split_updates():
+    tables = ghash_tables(b'\x42' * 16)
+    one, two = GHASH(tables), GHASH(tables)
+    one.update(TEST_DATA[:100])
+    for i in range(100):
+        two.update(TEST_DATA[i:i + 1])
+    assert one.digest() == two.digest()
+
+
+@pytest.mark.parametrize("nonce_length", [1, 8, 12, 16, 60])
+@pytest.mark.parametrize("length", [0, 1, 15, 16, 17, 100])
+def test_encrypt_and_digest(nonce_length, length):
+    nonce = TEST_NONCE[:1] * nonce_length
+    reference = AES.new(TEST_KEY, AES.MODE_GCM, nonce=nonce)
+    compare = CipherClass(TEST_KEY, MODE_GCM, nonce=nonce)
+
+    reference.update(b'header')
+    compare.update(b'header')
+
+    assert (reference.encrypt_and_digest(TEST_DATA[:length]) ==
+            compare.encrypt_and_digest(TEST_DATA[:length]))
+
+
+def test_decrypt_and_verify():
+    ciphertext, tag = AES.new(TEST_KEY, AES.MODE_GCM, nonce=TEST_NONCE,
+                              mac_len=12).encrypt_and_digest(TEST_DATA)
+
+    compare = CipherClass(TEST_KEY, MODE_GCM, TEST_NONCE, mac_len=12)
+    assert compare.decrypt_and_verify(ciphertext, tag) == TEST_DATA
+
+    tampered = CipherClass(TEST_KEY, MODE_GCM, TEST_NONCE, mac_len=12)
+    with pytest.raises(ValueError):
+        tampered.decrypt_and_verify(b'\x00' + ciphertext[1:], tag)
+
+
+def test_stateful_pieces():
+    reference = AES.new(TEST_KEY, AES.MODE_GCM, nonce=TEST_NONCE)
+    compare = CipherClass(TEST_KEY, MODE_GCM, nonce=TEST_NONCE)
+
+    for data in (b'a', b'bc', b'd' * 33):
+        compare.update(data)
+        reference.update(data)
+
+    ciphertext = b''.join(compare.encrypt(TEST_DATA[i:i + 7])
+                          for i in range(0, len(TEST_DATA), 7))
+
+    assert ciphertext == reference.encrypt(TEST_DATA)
+    assert compare.digest() == reference.digest()
+
+
+def test_random_nonce():
+    one = CipherClass(TEST_KEY, MODE_GCM)
+    two = CipherClass(TEST_KEY, MODE_GCM)
+    assert len(one.nonce) == 16
+    assert one.nonce != two.nonce
+
+
+def test_misuse():
+    c = CipherClass(TEST_KEY, MODE_GCM, nonce=TEST_NONCE)
+    c.encrypt(b'data')
+    with pytest.raises(TypeError):
+        c.update(b'too late')
+
+    c.digest()
+    with pytest.raises(TypeError):
+        c.encrypt(b'more')
+
+    with pytest.raises(TypeError):
+        CipherClass(TEST_KEY, MODE_CBC, IV=b'\x00' * 16).digest()
+
+
+def test_invalid_parameters():
+    with pytest.raises(ValueError):
+        Cipher8(TEST_KEY, MODE_GCM, nonce=TEST_NONCE)
+
+    with pytest.raises(ValueError):
+        CipherClass(TEST_KEY, MODE_GCM, nonce=TEST_NONCE, mac_len=17)
+
+    with pytest.raises(ValueError):
+        CipherClass(TEST_KEY, MODE_GCM, nonce=TEST_NONCE, mac_len=3)
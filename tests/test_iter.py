@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+import itertools
+
+import pytest
+
+from pep272_encryption import MODE_ECB, MODE_CBC, MODE_CFB, \
+    MODE_OFB, MODE_CTR, MODE_GCM, MODE_OCB
+from pep272_encryption.util import Counter
+
+from test_modes import CipherClass
+
+
+TEST_KEY = b'0123456789abcdef'
+TEST_IV = b'\x01' * 16
+TEST_DATA = bytes(bytearray(range(256))) * 4
+
+
+PARAMETERS = [
+    (MODE_ECB, {}),
+    (MODE_CBC, {'IV': TEST_IV}),
+    (MODE_CFB, {'IV': TEST_IV, 'segment_size': 8}),
+    (MODE_CFB, {'IV': TEST_IV, 'segment_size': 64}),
+    (MODE_OFB, {'IV': TEST_IV}),
+    (MODE_CTR, {}),
+    (MODE_GCM, {'nonce': TEST_IV}),
+    (MODE_OCB, {'nonce': TEST_IV[:12]}),
+]
+
+
+def new(mode, kwargs):
+    if mode == MODE_CTR:
+        kwargs = dict(kwargs, counter=Counter(nonce=b'\x02' * 8))
+    return CipherClass(TEST_KEY, mode, **kwargs)
+
+
+def chunked(data, sizes):
+    sizes = itertools.cycle(sizes)
+    position = 0
+    while position < len(data):
+        size = next(sizes)
+        yield data[position:position + size]
+        position += size
+
+
+@pytest.mark.parametrize("mode,kwargs", PARAMETERS)
+@pytest.mark.parametrize("sizes", [[1], [7, 0, 3], [16], [100, 1], [4096]])
+def test_iterencrypt(mode, kwargs, sizes):
+    expected = new(mode, kwargs).encrypt(TEST_DATA)
+    if mode == MODE_OCB:
+        expected = new(mode, kwargs).encrypt_and_digest(TEST_DATA)[0]
+
+    pieces = list(new(mode, kwargs).iterencrypt(chunked(TEST_DATA, sizes)))
+    assert b''.join(pieces) == expected
+    assert all(pieces)
+
+
+@pytest.mark.parametrize("mode,kwargs", PARAMETERS)
+def test_iterdecrypt(mode, kwargs):
+    ciphertext = new(mode, kwargs).encrypt(TEST_DATA)
+    if mode == MODE_OCB:
+        ciphertext = new(mode, kwargs).encrypt_and_digest(TEST_DATA)[0]
+
+    plaintext = new(mode, kwargs).iterdecrypt(chunked(ciphertext, [5, 33]))
+    assert b''.join(plaintext) == TEST_DATA
+
+
+def test_carry_is_bounded():
+    c = new(MODE_CBC, {'IV': TEST_IV})
+    pieces = c.iterencrypt(chunked(TEST_DATA, [15]))
+    assert next(pieces) == new(MODE_CBC, {'IV': TEST_IV}).encrypt(
+        TEST_DATA[:16])
+
+
+@pytest.mark.parametrize("mode,kwargs", [PARAMETERS[i] for i in (0, 1, 3)])
+def test_incomplete_stream(mode, kwargs):
+    with pytest.raises(ValueError):
+        list(new(mode, kwargs).iterencrypt([TEST_DATA, b'x' * 3]))
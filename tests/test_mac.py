@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+from Crypto.Cipher import AES
+from Crypto.Hash import CMAC as ReferenceCMAC
+import pytest
+
+from pep272_encryption import PEP272Cipher, MODE_ECB
+from pep272_encryption.mac import CBCMAC, CMAC
+
+from test_modes import CipherClass
+
+
+TEST_KEY = b'0123456789abcdef'
+TEST_DATA = bytes(bytearray(range(256))) * 3
+
+
+class Xor8(PEP272Cipher):
+    block_size = 8
+
+    def encrypt_block(self, key, block, **kwargs):
+        return bytes(bytearray(a ^ b for a, b in zip(bytearray(key),
+                                                     bytearray(block))))
+
+    decrypt_block = encrypt_block
+
+
+def cipher():
+    return CipherClass(TEST_KEY, MODE_ECB)
+
+
+@pytest.mark.parametrize("length", [0, 1, 15, 16, 17, 32, 100, 768])
+def test_cmac(length):
+    expected = ReferenceCMAC.new(TEST_KEY, TEST_DATA[:length],
+                                 ciphermod=AES).digest()
+    assert CMAC(cipher(), TEST_DATA[:length]).digest() == expected
+
+
+@pytest.mark.parametrize("piece", [1, 5, 16, 17, 40])
+def test_cmac_pieces(piece):
+    mac = CMAC(cipher())
+    for i in range(0, len(TEST_DATA), piece):
+        mac.update(TEST_DATA[i:i + piece])
+
+    assert mac.digest() == ReferenceCMAC.new(TEST_KEY, TEST_DATA,
+                                             ciphermod=AES).digest()
+
+
+def test_cmac_rfc4493():
+    key = bytes(bytearray.fromhex("2b7e151628aed2a6abf7158809cf4f3c"))
+    msg = bytes(bytearray.fromhex("6bc1bee22e409f96e93d7e117393172a"))
+    mac = CMAC(CipherClass(key, MODE_ECB), msg)
+    assert mac.hexdigest() == "070a16b46b4d4144f79bdd9dd04a287c"
+    mac.hexverify("070a16b46b4d4144f79bdd9dd04a287c")
+
+
+def test_cmac_64bit_block():
+    mac = CMAC(Xor8(b'k' * 8, MODE_ECB), TEST_DATA[:20], mac_len=4)
+    assert mac.digest_size == 4
+    assert len(mac.digest()) == 4
+
+
+def test_digest_continue_copy():
+    mac = CMAC(cipher(), TEST_DATA[:20])
+    copy = mac.copy()
+    mac.digest()
+    mac.update(TEST_DATA[20:])
+
+    assert mac.digest() == CMAC(cipher(), TEST_DATA).digest()
+    assert copy.digest() == CMAC(cipher(), TEST_DATA[:20]).digest()
+
+
+def test_verify():
+    mac = CMAC(cipher(), TEST_DATA)
+    mac.verify(mac.digest())
+
+    with pytest.raises(ValueError):
+        mac.verify(b'\x00' * 16)
+
+
+def test_cbcmac():
+    expected = AES.new(TEST_KEY, AES.MODE_CBC, iv=b'\x00' * 16).encrypt(
+        TEST_DATA)[-16:]
+
+    mac = CBCMAC(cipher())
+    for i in range(0, len(TEST_DATA), 50):
+        mac.update(TEST_DATA[i:i + 50])
+
+    assert mac.digest() == expected
+
+
+@pytest.mark.parametrize("length", [0, 1, 17])
+def test_cbcmac_unaligned(length):
+    with pytest.raises(ValueError):
+        CBCMAC(cipher(), TEST_DATA[:length]).digest()
+
+
+def test_invalid_parameters():
+    with pytest.raises(ValueError):
+        CMAC(cipher(), mac_len=17)
+
+    class Cipher12(CipherClass):
+        block_size = 12
+
+    with pytest.raises(ValueError):
+        CMAC(Cipher12(TEST_KEY, MODE_ECB))
+
+
+def test_constant_memory():
+    tracemalloc = pytest.importorskip("tracemalloc")
+
+    data = b'\x00' * 2**16
+    CMAC(cipher()).update(data)  # fill lazily loaded caches first
+    mac = CMAC(cipher())
+
+    tracemalloc.start()
+    try:
+        mac.update(data)
+        mac.digest()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    assert peak < 2**12
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""Peak memory of encrypt() and decrypt() relative to the payload.
+
+The limit is PEP272_MEMORY_FACTOR times the payload (default: 3) plus a
+small constant for the cipher object and bookkeeping.
+"""
+import os
+
+import pytest
+
+from pep272_encryption import MODE_ECB, MODE_CBC, MODE_CFB, MODE_OFB, \
+    MODE_CTR
+from pep272_encryption.util import Counter
+
+from test_modes import CipherClass, Identity
+
+tracemalloc = pytest.importorskip("tracemalloc")
+
+
+FACTOR = float(os.environ.get('PEP272_MEMORY_FACTOR', 3))
+SLACK = 2**17
+TEST_KEY = b'0123456789abcdef'
+TEST_IV = b'\x00' * 16
+
+MODES = [
+    ("ECB", MODE_ECB, dict),
+    ("CBC", MODE_CBC, lambda: {'IV': TEST_IV}),
+    ("CFB-8", MODE_CFB, lambda: {'IV': TEST_IV}),
+    ("CFB-128", MODE_CFB, lambda: {'IV': TEST_IV, 'segment_size': 128}),
+    ("OFB", MODE_OFB, lambda: {'IV': TEST_IV}),
+    ("CTR", MODE_CTR, lambda: {'counter': Counter(b'\x00' * 8)}),
+]
+
+
+def measure(function, data):
+    """Returns the peak and the retained memory of function(data)."""
+    tracemalloc.start()
+    try:
+        result = function(data)
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert len(result) == len(data)
+    return peak, current
+
+
+@pytest.mark.parametrize("cipher_class, size", [
+    (Identity, 2**18), (Identity, 2**20), (CipherClass, 2**16)])
+@pytest.mark.parametrize("name, mode, kwargs", MODES)
+def test_peak(name, mode, kwargs, size, cipher_class):
+    if name == "CFB-8":  # one block cipher call per byte
+        size //= 16
+
+    data = os.urandom(size)
+    limit = FACTOR * size + SLACK
+
+    for decrypt in (False, True):
+        cipher = cipher_class(TEST_KEY, mode, **kwargs())
+        function = cipher.decrypt if decrypt else cipher.encrypt
+        peak, retained = measure(function, data)
+
+        assert peak <= limit, "{} {}: peak {} is above {}".format(
+            name, "decrypt" if decrypt else "encrypt", peak, limit)
+        assert retained <= size + SLACK
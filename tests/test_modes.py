@@ -1,4 +1,6 @@
 #!/usr/bin/env python3
+import threading
+
 from Crypto.Cipher import AES
 from Crypto.Util import Counter
 from pep272_encryption import PEP272Cipher
@@ -97,7 +99,26 @@ def test_ctr():
 
     assert reference.encrypt(TEST_BLOCK) == compare.encrypt(TEST_BLOCK)
     assert reference.encrypt(TEST_BLOCK) == compare.encrypt(TEST_BLOCK)
-    
+
+
+def test_threads():
+    """Separate cipher objects can be used in parallel."""
+    data = TEST_BLOCK * 50
+    expected = AES.new(TEST_KEY, AES.MODE_CBC, iv=TEST_IV).encrypt(data)
+    results = []
+
+    def worker():
+        results.append(CipherClass(TEST_KEY, AES.MODE_CBC,
+                                   IV=TEST_IV).encrypt(data))
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == [expected] * 8
+
 
 if __name__ == "__main__":
     for i in ("ecb", "cbc", "cfb8", "cfb128", "ofb", "ctr"):
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+import pickle
+
+import pytest
+
+from Crypto.Cipher import AES
+
+from pep272_encryption import MODE_ECB, MODE_CBC, MODE_CFB, MODE_OFB, \
+    MODE_CTR
+from pep272_encryption.util import Counter
+
+from test_modes import CipherClass, FakeCounter
+
+
+TEST_KEY = b'0123456789abcdef'
+TEST_IV = b'initialization v'
+TEST_NONCE = b'nonce 64'
+TEST_DATA = bytes(bytearray(i % 251 for i in range(960)))
+
+
+class NativeAES(CipherClass):
+    created = 0
+
+    def native_mode(self, key, mode, params, **kwargs):
+        NativeAES.created += 1
+
+        if mode == MODE_ECB:
+            return AES.new(key, AES.MODE_ECB)
+        if mode == MODE_CBC:
+            return AES.new(key, AES.MODE_CBC, iv=params['IV'])
+        if mode == MODE_CFB:
+            return AES.new(key, AES.MODE_CFB, iv=params['IV'],
+                           segment_size=params['segment_size'])
+        if mode == MODE_OFB:
+            return AES.new(key, AES.MODE_OFB, iv=params['IV'])
+
+        counter = params['counter']
+        if counter.suffix or counter.endian != 'big':
+            return None
+        return AES.new(key, AES.MODE_CTR, nonce=counter.nonce,
+                       initial_value=counter.value)
+
+
+PARAMETERS = [
+    ((MODE_ECB,), {}),
+    ((MODE_CBC, TEST_IV), {}),
+    ((MODE_CFB, TEST_IV), {'segment_size': 8}),
+    ((MODE_CFB, TEST_IV), {'segment_size': 128}),
+    ((MODE_OFB, TEST_IV), {}),
+    ((MODE_CTR,), {'counter': lambda: Counter(nonce=TEST_NONCE)}),
+]
+
+
+def create(cls, args, kwargs):
+    kwargs = dict((name, value() if callable(value) else value)
+                  for name, value in kwargs.items())
+    return cls(TEST_KEY, *args, **kwargs)
+
+
+@pytest.mark.parametrize("args, kwargs", PARAMETERS)
+def test_same_result(args, kwargs):
+    split = 32 if args[0] in (MODE_ECB, MODE_CBC) or \
+        kwargs.get('segment_size') == 128 else 37
+    NativeAES.created = 0
+
+    generic = create(CipherClass, args, kwargs)
+    native = create(NativeAES, args, kwargs)
+
+    expected = generic.encrypt(TEST_DATA[:split])
+    assert native.encrypt(TEST_DATA[:split]) == expected
+    assert native.IV == generic.IV
+
+    expected = generic.encrypt(TEST_DATA[split:])
+    assert native.encrypt(TEST_DATA[split:]) == expected
+    assert native.IV == generic.IV
+    assert NativeAES.created == 2
+
+    ciphertext = create(CipherClass, args, kwargs).encrypt(TEST_DATA)
+    native = create(NativeAES, args, kwargs)
+    assert native.decrypt(ciphertext[:split]) + \
+        native.decrypt(ciphertext[split:]) == TEST_DATA
+
+
+@pytest.mark.parametrize("args, kwargs", PARAMETERS)
+def test_pickle_continues(args, kwargs):
+    split = 32 if args[0] in (MODE_ECB, MODE_CBC) or \
+        kwargs.get('segment_size') == 128 else 37
+    native = create(NativeAES, args, kwargs)
+    native.encrypt(TEST_DATA[:split])
+    restored = pickle.loads(pickle.dumps(native))
+
+    assert restored.encrypt(TEST_DATA[split:]) == \
+        create(CipherClass, args, kwargs).encrypt(TEST_DATA)[split:]
+
+
+def test_ctr_declined():
+    NativeAES.created = 0
+    counter = Counter(nonce=TEST_NONCE[:7], suffix=b'x')
+    native = NativeAES(TEST_KEY, MODE_CTR, counter=counter)
+    generic = CipherClass(TEST_KEY, MODE_CTR,
+                          counter=Counter(nonce=TEST_NONCE[:7], suffix=b'x'))
+
+    for chunk in (TEST_DATA[:40], TEST_DATA[40:]):
+        assert native.encrypt(chunk) == generic.encrypt(chunk)
+
+    assert NativeAES.created == 1
+    assert counter.value == generic._counter.value
+
+
+def test_not_delegated():
+    NativeAES.created = 0
+    NativeAES(TEST_KEY, MODE_CTR, counter=FakeCounter()).encrypt(TEST_DATA)
+    NativeAES(TEST_KEY, MODE_ECB, block_cache=8).encrypt(TEST_DATA)
+    NativeAES(TEST_KEY, MODE_OFB, TEST_IV).encrypt(TEST_DATA[:15])
+    assert NativeAES.created == 0
+
+    assert not CipherClass(TEST_KEY, MODE_ECB)._native
+
+    with pytest.raises(ValueError):
+        NativeAES(TEST_KEY, MODE_CBC, TEST_IV).encrypt(TEST_DATA[:15])
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+import pickle
+
+import pytest
+
+from pep272_encryption import MODE_CBC, MODE_CTR, MODE_ECB, MODE_GCM
+from pep272_encryption import nonceguard, parallel
+from pep272_encryption.nonceguard import NonceRegistry, NonceReuseError, \
+    BloomFilter
+from pep272_encryption.util import Counter
+
+from test_modes import CipherClass
+
+
+TEST_KEY = b'0123456789abcdef'
+OTHER_KEY = b'fedcba9876543210'
+TEST_IV = b'initialization v'
+TEST_DATA = b'sixteen byte msg'
+
+
+@pytest.fixture
+def registry():
+    yield nonceguard.install(capacity=64)
+    nonceguard.uninstall()
+
+
+def test_reused_iv(registry):
+    CipherClass(TEST_KEY, MODE_CBC, TEST_IV).encrypt(TEST_DATA)
+    CipherClass(OTHER_KEY, MODE_CBC, TEST_IV).encrypt(TEST_DATA)
+
+    cipher = CipherClass(TEST_KEY, MODE_CBC, TEST_IV)
+    with pytest.raises(NonceReuseError):
+        cipher.encrypt(TEST_DATA)
+
+
+@pytest.mark.parametrize("mode", [MODE_CBC, MODE_CTR])
+def test_decryption_not_registered(registry, mode):
+    def create():
+        if mode == MODE_CTR:
+            return CipherClass(TEST_KEY, mode,
+                               counter=Counter(nonce=b'nonce 64'))
+        return CipherClass(TEST_KEY, mode, TEST_IV)
+
+    ciphertext = create().encrypt(TEST_DATA)
+
+    for _ in range(3):
+        assert create().decrypt(ciphertext) == TEST_DATA
+    assert len(registry) == 1
+
+
+def test_registered_once(registry):
+    cipher = CipherClass(TEST_KEY, MODE_GCM, nonce=TEST_IV[:12])
+    cipher.encrypt(TEST_DATA)
+    cipher.encrypt(TEST_DATA)
+    assert len(registry) == 1
+
+    CipherClass(TEST_KEY, MODE_ECB).encrypt(TEST_DATA)
+    assert len(registry) == 1
+
+    # A copy taken before encrypting continues with the same nonce.
+    cipher = CipherClass(TEST_KEY, MODE_GCM, nonce=TEST_IV[1:13])
+    copy = pickle.loads(pickle.dumps(cipher))
+    cipher.encrypt(TEST_DATA)
+    with pytest.raises(NonceReuseError):
+        copy.encrypt(TEST_DATA)
+
+
+def test_counter(registry):
+    def encrypt(counter):
+        CipherClass(TEST_KEY, MODE_CTR, counter=counter).encrypt(TEST_DATA)
+
+    encrypt(Counter(nonce=b'nonce 64'))
+    encrypt(Counter(nonce=b'nonce 65'))
+    with pytest.raises(NonceReuseError):
+        encrypt(Counter(nonce=b'nonce 64'))
+    with pytest.raises(NonceReuseError):  # overlapping ranges
+        encrypt(Counter(nonce=b'nonce 65', initial_value=1))
+
+    encrypt(Counter(IV=TEST_IV))
+    encrypt(Counter(IV=TEST_IV[:-1] + b'w'))
+    with pytest.raises(NonceReuseError):
+        encrypt(Counter(IV=TEST_IV))
+
+    # Random nonces are registered by the counter, reserved ranges are
+    # part of their counter.
+    counter = Counter()
+    before = len(registry)
+    encrypt(counter)
+    encrypt(counter.reserve(1))
+    assert len(registry) == before
+
+
+def test_parallel(registry, monkeypatch):
+    monkeypatch.setattr(parallel, 'MIN_SLICE_SIZE', 16)
+
+    def crypt(function, data):
+        cipher = CipherClass(TEST_KEY, MODE_CTR,
+                             counter=Counter(nonce=b'parallel'))
+        return function(cipher, data, workers=2, backend='serial')
+
+    ciphertext = crypt(parallel.encrypt, TEST_DATA * 8)
+    assert crypt(parallel.decrypt, ciphertext) == TEST_DATA * 8
+    assert len(registry) == 1
+
+    with pytest.raises(NonceReuseError):
+        crypt(parallel.encrypt, TEST_DATA * 8)
+
+
+def test_random_nonce_redrawn(registry, monkeypatch):
+    nonces = iter([b'same', b'same', b'same', b'new!'])
+    monkeypatch.setattr(nonceguard.os, 'urandom', lambda size: next(nonces))
+
+    assert nonceguard.random_nonce(4) == b'same'
+    assert nonceguard.random_nonce(4) == b'new!'
+
+    monkeypatch.setattr(nonceguard.os, 'urandom', lambda size: b'same')
+    with pytest.raises(NonceReuseError):
+        nonceguard.random_nonce(4)
+
+
+def test_not_installed():
+    assert nonceguard.registry is None
+    for _ in range(2):
+        CipherClass(TEST_KEY, MODE_CBC, TEST_IV).encrypt(TEST_DATA)
+
+
+def test_growth_and_cap():
+    registry = NonceRegistry(capacity=16, error_rate=1e-6)
+    for i in range(100):
+        assert not registry.add(b'', TEST_KEY, b'%d' % i)
+
+    assert len(registry._filters) == 3
+    assert all(registry.add(b'', TEST_KEY, b'%d' % i) for i in range(100))
+
+    registry = NonceRegistry(capacity=16, error_rate=1e-6, max_bytes=200)
+    for i in range(100):
+        registry.add(b'', TEST_KEY, b'%d' % i)
+
+    assert registry.saturated
+    assert registry.nbytes <= 200
+    assert all(registry.add(b'', TEST_KEY, b'%d' % i) for i in range(100))
+
+
+def test_error_rate():
+    bloom = BloomFilter(1000, 0.01)
+    for i in range(1000):
+        bloom.add(NonceRegistry._digest(b'', b'', b'%d' % i))
+
+    false = sum(NonceRegistry._digest(b'', b'', b'x%d' % i) in bloom
+                for i in range(10000))
+    assert false < 300
+
+
+def test_persistence(tmpdir):
+    path = str(tmpdir.join('nonces'))
+
+    nonceguard.install(path=path, capacity=4)
+    for i in range(10):
+        CipherClass(TEST_KEY, MODE_GCM, nonce=b'%12d' % i).encrypt(TEST_DATA)
+    nonceguard.uninstall()
+
+    registry = nonceguard.install(path=path, capacity=4)
+    try:
+        assert len(registry) == 10
+        with pytest.raises(NonceReuseError):
+            CipherClass(TEST_KEY, MODE_GCM, nonce=b'%12d' % 3).encrypt(
+                TEST_DATA)
+    finally:
+        nonceguard.uninstall()
+
+    saved = tmpdir.join('nonces').read(mode='rb')
+    for size in (len(saved) - 1, nonceguard._HEADER.size + 3):
+        tmpdir.join('nonces').write(saved[:size], mode='wb')
+        with pytest.raises(ValueError):
+            NonceRegistry(path=path)
+
+    tmpdir.join('nonces').write(b'garbage!' * 2, mode='wb')
+    with pytest.raises(ValueError):
+        NonceRegistry(path=path)
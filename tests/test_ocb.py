@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+from Crypto.Cipher import AES
+import pytest
+
+from pep272_encryption import MODE_OCB, MODE_ECB
+from pep272_encryption import ocb
+
+from test_modes import CipherClass
+
+
+TEST_KEY = b'0123456789abcdef'
+TEST_NONCE = b'unique nonce'
+TEST_DATA = bytes(bytearray(range(256))) * 3
+
+
+class BatchCipher(CipherClass):
+    """Encrypts batches with a single call, and records their sizes."""
+    batches = []
+
+    def encrypt_blocks(self, key, blocks, **kwargs):
+        blocks = list(blocks)
+        self.batches.append(len(blocks))
+        encrypted = AES.new(key, AES.MODE_ECB).encrypt(b''.join(blocks))
+        return [encrypted[i:i + 16] for i in range(0, len(encrypted), 16)]
+
+
+def reference(nonce=TEST_NONCE, mac_len=16):
+    return AES.new(TEST_KEY, AES.MODE_OCB, nonce=nonce, mac_len=mac_len)
+
+
+def test_fold():
+    blocks = [0x1234 << 100, 0xff, 2**128 - 1, 7, 42]
+    for count in range(1, len(blocks) + 1):
+        wide, expected = 0, 0
+        for block in blocks[:count]:
+            wide = wide << 128 | block
+            expected ^= block
+        assert ocb.fold(wide, count) == expected
+
+
+@pytest.mark.parametrize("nonce_length", [1, 7, 12, 15])
+@pytest.mark.parametrize("length", [0, 1, 15, 16, 17, 100, 768])
+def test_encrypt_and_digest(nonce_length, length):
+    nonce = TEST_NONCE[:1] * nonce_length
+    expected = reference(nonce)
+    compare = CipherClass(TEST_KEY, MODE_OCB, nonce=nonce)
+
+    expected.update(b'header' * length)
+    compare.update(b'header' * length)
+
+    assert (expected.encrypt_and_digest(TEST_DATA[:length]) ==
+            compare.encrypt_and_digest(TEST_DATA[:length]))
+
+
+@pytest.mark.parametrize("mac_len", [8, 12, 16])
+def test_decrypt_and_verify(mac_len):
+    ciphertext, tag = reference(mac_len=mac_len).encrypt_and_digest(
+        TEST_DATA)
+
+    compare = CipherClass(TEST_KEY, MODE_OCB, TEST_NONCE, mac_len=mac_len)
+    assert compare.decrypt_and_verify(ciphertext, tag) == TEST_DATA
+
+    tampered = CipherClass(TEST_KEY, MODE_OCB, TEST_NONCE, mac_len=mac_len)
+    with pytest.raises(ValueError):
+        tampered.decrypt_and_verify(ciphertext[:-1] + b'\x00', tag)
+
+
+def test_stateful_pieces():
+    expected = reference()
+    compare = CipherClass(TEST_KEY, MODE_OCB, nonce=TEST_NONCE)
+
+    for data in (b'a', b'bc', b'd' * 33):
+        compare.update(data)
+        expected.update(data)
+
+    ciphertext = b''.join(compare.encrypt(TEST_DATA[i:i + 7])
+                          for i in range(0, len(TEST_DATA), 7))
+    ciphertext += compare.encrypt()
+
+    assert len(ciphertext) == len(TEST_DATA)
+    assert ciphertext == expected.encrypt(TEST_DATA) + expected.encrypt()
+    assert compare.digest() == expected.digest()
+
+
+def test_batches():
+    BatchCipher.batches = []
+    data = b'\x00' * 16 * (ocb.BATCH_BLOCKS + 3)
+
+    compare = BatchCipher(TEST_KEY, MODE_OCB, nonce=TEST_NONCE)
+    assert (compare.encrypt_and_digest(data) ==
+            reference().encrypt_and_digest(data))
+    assert BatchCipher.batches == [ocb.BATCH_BLOCKS, 3]
+
+
+def test_ecb_uses_batches():
+    BatchCipher.batches = []
+    compare = BatchCipher(TEST_KEY, MODE_ECB)
+    assert (compare.encrypt(TEST_DATA) ==
+            AES.new(TEST_KEY, AES.MODE_ECB).encrypt(TEST_DATA))
+    assert BatchCipher.batches == [len(TEST_DATA) // 16]
+
+
+def test_misuse():
+    c = CipherClass(TEST_KEY, MODE_OCB, nonce=TEST_NONCE)
+    assert c.encrypt(b'incomplete') == b''
+    with pytest.raises(TypeError):
+        c.digest()
+
+    c.encrypt()
+    with pytest.raises(TypeError):
+        c.encrypt(b'more')
+
+
+def test_invalid_parameters():
+    with pytest.raises(ValueError):
+        CipherClass(TEST_KEY, MODE_OCB, nonce=b'\x00' * 16)
+
+    with pytest.raises(ValueError):
+        CipherClass(TEST_KEY, MODE_OCB, nonce=TEST_NONCE, mac_len=7)
+
+    assert len(CipherClass(TEST_KEY, MODE_OCB).nonce) == 15
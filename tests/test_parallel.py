@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+import pickle
+
+import pytest
+
+from pep272_encryption import MODE_ECB, MODE_CTR, MODE_CBC, StreamCipher
+from pep272_encryption import calibrate, parallel
+from pep272_encryption.util import Counter, thresholds
+
+from test_modes import CipherClass
+
+
+TEST_KEY = b'0123456789abcdef'
+TEST_DATA = bytes(bytearray(range(256))) * 40 + b'tail'
+TEST_NONCE = b'nonce 64'
+
+
+class Keystream(StreamCipher):
+    """Keystream of the position, continued by the cipher object."""
+    position = 0
+
+    def keystream(self, length):
+        out = bytearray((self.position + n) % 256 for n in range(length))
+        self.position += length
+        return bytes(out)
+
+
+@pytest.fixture(autouse=True)
+def small_slices(monkeypatch):
+    monkeypatch.setattr(parallel, 'MIN_SLICE_SIZE', 1024)
+
+
+def test_backend_selection():
+    assert 'serial' in parallel.available_backends()
+    assert parallel._select_backend(None) == parallel.available_backends()[0]
+
+    with pytest.raises(ValueError):
+        parallel.encrypt(CipherClass(TEST_KEY, MODE_ECB), b'', backend='x')
+
+
+@pytest.mark.parametrize("backend", parallel.available_backends())
+def test_ecb(backend):
+    data = TEST_DATA[:-4]
+    ciphertext = parallel.encrypt(CipherClass(TEST_KEY, MODE_ECB), data,
+                                  workers=4, backend=backend)
+
+    assert ciphertext == CipherClass(TEST_KEY, MODE_ECB).encrypt(data)
+    assert parallel.decrypt(CipherClass(TEST_KEY, MODE_ECB), ciphertext,
+                            workers=4, backend=backend) == data
+
+
+@pytest.mark.parametrize("backend", parallel.available_backends())
+def test_ctr_continues(backend):
+    """The cipher object continues after the data processed in parallel."""
+    expected = CipherClass(TEST_KEY, MODE_CTR, counter=Counter(TEST_NONCE))
+    expected = expected.encrypt(TEST_DATA)
+
+    cipher = CipherClass(TEST_KEY, MODE_CTR, counter=Counter(TEST_NONCE))
+    ciphertext = parallel.encrypt(cipher, TEST_DATA[:-4], workers=3,
+                                  backend=backend)
+    ciphertext += cipher.encrypt(TEST_DATA[-4:])
+
+    assert ciphertext == expected
+
+
+def test_ctr_tail():
+    cipher = CipherClass(TEST_KEY, MODE_CTR, counter=Counter(TEST_NONCE))
+    ciphertext = parallel.encrypt(cipher, TEST_DATA, workers=4)
+    ciphertext += cipher.encrypt(b'more')
+
+    expected = CipherClass(TEST_KEY, MODE_CTR, counter=Counter(TEST_NONCE))
+    assert ciphertext == expected.encrypt(TEST_DATA + b'more')
+
+
+def test_ctr_mid_block():
+    """The rest of a started keystream block is used first."""
+    cipher = CipherClass(TEST_KEY, MODE_CTR, counter=Counter(TEST_NONCE))
+    ciphertext = cipher.encrypt(b'x')
+    ciphertext += parallel.encrypt(cipher, TEST_DATA, workers=4)
+
+    expected = CipherClass(TEST_KEY, MODE_CTR, counter=Counter(TEST_NONCE))
+    assert ciphertext == expected.encrypt(b'x' + TEST_DATA)
+
+
+def test_serial_fallback():
+    iv = b'\x00' * 16
+    data = TEST_DATA[:-4]
+    assert (parallel.encrypt(CipherClass(TEST_KEY, MODE_CBC, iv), data) ==
+            CipherClass(TEST_KEY, MODE_CBC, iv).encrypt(data))
+
+    # Plain callables cannot be split
+    cipher = CipherClass(TEST_KEY, MODE_CTR, counter=Counter().__call__)
+    assert parallel._spec(cipher) is None
+
+    class Local(CipherClass):
+        pass
+
+    assert parallel._spec(Local(TEST_KEY, MODE_ECB)) is None
+
+    with pytest.raises(ValueError):
+        parallel.encrypt(CipherClass(TEST_KEY, MODE_ECB), b'incomplete')
+
+
+def test_stream_cipher_serial():
+    assert parallel._spec(Keystream(TEST_KEY, MODE_ECB)) is None
+    assert parallel.encrypt(Keystream(TEST_KEY, MODE_ECB), TEST_DATA,
+                            workers=4) == \
+        Keystream(TEST_KEY, MODE_ECB).encrypt(TEST_DATA)
+
+
+def test_spec_thresholds(monkeypatch):
+    saved = dict(thresholds)
+    monkeypatch.setattr(calibrate, '_loaded', [])  # not loaded yet
+    thresholds.clear()
+    try:
+        spec = pickle.loads(parallel._spec(CipherClass(TEST_KEY, MODE_ECB)))
+    finally:
+        thresholds.clear()
+        thresholds.update(saved)
+
+    assert spec[-1] and 'parallel' in spec[-1]
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+from pep272_encryption import MODE_ECB, MODE_CBC, MODE_CFB, MODE_OFB, \
+    MODE_CTR, MODE_GCM, MODE_OCB
+from pep272_encryption.util import Counter, ThreadSafeCounter
+
+from test_modes import CipherClass
+
+
+TEST_KEY = b'0123456789abcdef'
+TEST_IV = b'\x00' * 16
+TEST_DATA = bytes(bytearray(range(256))) * 4
+
+PARAMETERS = [
+    (MODE_ECB, dict),
+    (MODE_CBC, lambda: {'IV': TEST_IV}),
+    (MODE_CFB, lambda: {'IV': TEST_IV}),
+    (MODE_CFB, lambda: {'IV': TEST_IV, 'segment_size': 128}),
+    (MODE_OFB, lambda: {'IV': TEST_IV}),
+    (MODE_CTR, lambda: {'counter': Counter(b'\x00' * 8)}),
+    (MODE_CTR, lambda: {'counter': ThreadSafeCounter(b'\x00' * 8)}),
+    (MODE_GCM, lambda: {'nonce': b'\x00' * 12}),
+    (MODE_OCB, lambda: {'nonce': b'\x00' * 12}),
+]
+
+
+class CountingCipher(CipherClass):
+    calls = 0
+
+    def encrypt_block(self, key, block, **kwargs):
+        CountingCipher.calls += 1
+        return CipherClass.encrypt_block(self, key, block, **kwargs)
+
+
+def encrypt_rest(cipher, data):
+    """Runs in a worker process."""
+    return cipher.encrypt(data)
+
+
+@pytest.mark.parametrize("mode, kwargs", PARAMETERS)
+def test_resume(mode, kwargs):
+    """A pickled cipher continues where the original stopped."""
+    expected = CipherClass(TEST_KEY, mode, **kwargs())
+    expected = expected.encrypt(TEST_DATA)
+
+    cipher = CipherClass(TEST_KEY, mode, **kwargs())
+    split = 80 if cipher._unit_size() > 1 else 37
+    first = cipher.encrypt(TEST_DATA[:split])
+
+    state = pickle.dumps(cipher)
+    assert len(state) < 1024  # no tables, no processed data
+
+    restored = pickle.loads(state)
+    assert first + restored.encrypt(TEST_DATA[split:]) == expected
+
+
+@pytest.mark.parametrize("mode", [MODE_GCM, MODE_OCB])
+def test_resume_aead(mode):
+    expected = CipherClass(TEST_KEY, mode, nonce=b'\x00' * 12)
+    expected.update(b'header')
+    expected = expected.encrypt_and_digest(TEST_DATA)
+
+    cipher = CipherClass(TEST_KEY, mode, nonce=b'\x00' * 12)
+    cipher.update(b'header')
+    first = cipher.encrypt(TEST_DATA[:100])
+
+    restored = pickle.loads(pickle.dumps(cipher))
+    rest, tag = restored.encrypt_and_digest(TEST_DATA[100:])
+    assert (first + rest, tag) == expected
+
+
+def test_no_replay():
+    cipher = CountingCipher(TEST_KEY, MODE_CTR, counter=Counter(b'\x00' * 8))
+    cipher.encrypt(TEST_DATA)
+
+    calls = CountingCipher.calls
+    restored = pickle.loads(pickle.dumps(cipher))
+    assert CountingCipher.calls == calls
+
+    restored.encrypt(b'x' * 16)
+    assert CountingCipher.calls == calls + 1
+
+
+def test_process_pool():
+    cipher = CipherClass(TEST_KEY, MODE_CTR, counter=Counter(b'\x00' * 8))
+    first = cipher.encrypt(TEST_DATA[:5])
+
+    with ProcessPoolExecutor(1) as pool:
+        rest = pool.submit(encrypt_rest, cipher, TEST_DATA[5:]).result()
+
+    expected = CipherClass(TEST_KEY, MODE_CTR, counter=Counter(b'\x00' * 8))
+    assert first + rest == expected.encrypt(TEST_DATA)
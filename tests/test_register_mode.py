@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+import pickle
+
+import pytest
+
+from pep272_encryption import Mode, register_mode, unregister_mode, \
+    MODE_ECB, MODE_CBC, MODE_OFB
+from pep272_encryption import parallel
+from pep272_encryption.util import xor_strings
+
+from test_modes import CipherClass
+
+
+TEST_KEY = b'0123456789abcdef'
+TEST_IV = b'initialization v'
+TEST_DATA = bytes(bytearray(i % 251 for i in range(4096)))
+
+MODE_TWEAKED = 100
+MODE_CHAINED = 101
+MODE_STREAM = 102
+
+
+def tweak(index):
+    return (b'%016d' % index)[-16:]
+
+
+def whiten(cipher, blocks, index, decrypt):
+    return [xor_strings(block, tweak(index + n))
+            for n, block in enumerate(blocks)]
+
+
+def chain(cipher, block, decrypt):
+    """CBC, keeping the chaining value in the cipher object."""
+    if decrypt:
+        out = xor_strings(cipher.decrypt_block(cipher.key, block),
+                          cipher._status)
+        cipher._status = block
+        return out
+
+    cipher._status = cipher.encrypt_block(
+        cipher.key, xor_strings(block, cipher._status))
+    return cipher._status
+
+
+def keystream(cipher, count):
+    """OFB."""
+    out = []
+    for _ in range(count):
+        cipher._status = cipher.encrypt_block(cipher.key, cipher._status)
+        out.append(cipher._status)
+    return b"".join(out)
+
+
+# Registered on import, so that parallel workers know the mode.
+register_mode(MODE_TWEAKED, Mode(Mode.BLOCKS, before=whiten, after=whiten,
+                                 parallel=True))
+register_mode(MODE_CHAINED, Mode(Mode.CHAINED, chain=chain, iv=True))
+register_mode(MODE_STREAM, Mode(Mode.KEYSTREAM, keystream=keystream,
+                                iv=True))
+
+
+def tweaked(data, decrypt=False):
+    """The tweaked mode with a separate ECB cipher object per block."""
+    function = (CipherClass(TEST_KEY, MODE_ECB).decrypt if decrypt else
+                CipherClass(TEST_KEY, MODE_ECB).encrypt)
+    return b"".join(
+        xor_strings(function(xor_strings(data[i:i + 16], tweak(i // 16))),
+                    tweak(i // 16))
+        for i in range(0, len(data), 16))
+
+
+def test_blocks():
+    expected = tweaked(TEST_DATA)
+
+    cipher = CipherClass(TEST_KEY, MODE_TWEAKED)
+    assert cipher.encrypt(TEST_DATA[:160]) + cipher.encrypt(TEST_DATA[160:]) \
+        == expected
+    assert CipherClass(TEST_KEY, MODE_TWEAKED).decrypt(expected) == TEST_DATA
+    assert tweaked(expected, True) == TEST_DATA
+
+    out = bytearray(len(TEST_DATA))
+    CipherClass(TEST_KEY, MODE_TWEAKED).encrypt_into(TEST_DATA, out)
+    assert bytes(out) == expected
+
+
+def test_blocks_parallel(monkeypatch):
+    monkeypatch.setattr(parallel, 'MIN_SLICE_SIZE', 1024)
+
+    cipher = CipherClass(TEST_KEY, MODE_TWEAKED)
+    head = cipher.encrypt(TEST_DATA[:64])
+    body = parallel.encrypt(cipher, TEST_DATA[64:], workers=3,
+                            backend='serial')
+    assert head + body == tweaked(TEST_DATA)
+    assert cipher._mode_index == len(TEST_DATA) // 16
+
+    assert parallel.decrypt(CipherClass(TEST_KEY, MODE_TWEAKED),
+                            tweaked(TEST_DATA), workers=3,
+                            backend='serial') == TEST_DATA
+
+
+@pytest.mark.parametrize("mode, builtin", [(MODE_CHAINED, MODE_CBC),
+                                           (MODE_STREAM, MODE_OFB)])
+def test_same_as_builtin(mode, builtin):
+    data = TEST_DATA if mode == MODE_CHAINED else TEST_DATA[:1000]
+    expected = CipherClass(TEST_KEY, builtin, TEST_IV).encrypt(data)
+
+    cipher = CipherClass(TEST_KEY, mode, TEST_IV)
+    assert cipher.encrypt(data[:48]) + cipher.encrypt(data[48:]) == expected
+    assert CipherClass(TEST_KEY, mode, TEST_IV).decrypt(expected) == data
+
+    chunks = (data[i:i + 40] for i in range(0, len(data), 40))
+    assert b"".join(CipherClass(TEST_KEY, mode, TEST_IV).iterencrypt(
+        chunks)) == expected
+
+    cipher = CipherClass(TEST_KEY, mode, TEST_IV)
+    head = cipher.encrypt(data[:32])
+    restored = pickle.loads(pickle.dumps(cipher))
+    assert head + restored.encrypt(data[32:]) == expected
+
+
+def test_errors():
+    with pytest.raises(ValueError):
+        register_mode(MODE_CBC, Mode(Mode.BLOCKS))
+    with pytest.raises(ValueError):
+        register_mode(MODE_TWEAKED, Mode(Mode.BLOCKS))
+
+    with pytest.raises(ValueError):
+        Mode('unknown')
+    with pytest.raises(TypeError):
+        Mode(Mode.CHAINED)
+
+    with pytest.raises(TypeError):  # IV required
+        CipherClass(TEST_KEY, MODE_CHAINED)
+
+    register_mode(200, Mode(Mode.BLOCKS))
+    assert CipherClass(TEST_KEY, 200).encrypt(TEST_DATA[:32]) == \
+        CipherClass(TEST_KEY, MODE_ECB).encrypt(TEST_DATA[:32])
+
+    unregister_mode(200)
+    with pytest.raises(ValueError):
+        CipherClass(TEST_KEY, 200).encrypt(TEST_DATA[:32])
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+import pickle
+import sys
+
+import pytest
+
+from pep272_encryption import MODE_CBC, MODE_OFB, MODE_CTR
+from pep272_encryption import nonceguard
+from pep272_encryption.nonceguard import NonceReuseError
+from pep272_encryption.session import SessionKey
+from pep272_encryption.util import Counter
+
+from test_modes import CipherClass
+
+
+TEST_KEY = b'0123456789abcdef'
+TEST_IV = b'initialization v'
+TEST_DATA = bytes(bytearray(i % 251 for i in range(5000)))
+
+
+def reference(mode, iv=TEST_IV):
+    if mode == MODE_CTR:
+        return CipherClass(TEST_KEY, mode, counter=Counter(IV=iv))
+    return CipherClass(TEST_KEY, mode, iv)
+
+
+@pytest.mark.parametrize("mode", [MODE_OFB, MODE_CTR])
+def test_same_as_cipher(mode):
+    expected = reference(mode).encrypt(TEST_DATA)
+    keys = SessionKey(CipherClass, TEST_KEY, mode)
+
+    session = keys.session(TEST_IV)
+    pieces = [session.encrypt(TEST_DATA[start:end]) for start, end in
+              ((0, 5), (5, 21), (21, 37), (37, 4000), (4000, 5000))]
+    assert b"".join(pieces) == expected
+
+    assert keys.session(TEST_IV).decrypt(expected) == TEST_DATA
+
+    # Sessions of one key are independent.
+    first, second = keys.session(TEST_IV), keys.session(b'\x00' * 16)
+    assert first.encrypt(TEST_DATA[:100]) == expected[:100]
+    assert second.encrypt(TEST_DATA[:100]) == \
+        reference(mode, b'\x00' * 16).encrypt(TEST_DATA[:100])
+    assert first.encrypt(TEST_DATA[100:200]) == expected[100:200]
+
+
+def test_compact():
+    session = SessionKey(CipherClass, TEST_KEY, MODE_CTR).session(TEST_IV)
+    session.encrypt(TEST_DATA[:7])
+
+    assert not hasattr(session, '__dict__')
+    assert sys.getsizeof(session) < sys.getsizeof(
+        reference(MODE_CTR).__dict__)
+
+    restored = pickle.loads(pickle.dumps(session, protocol=2))
+    assert restored.encrypt(TEST_DATA[7:100]) == \
+        reference(MODE_CTR).encrypt(TEST_DATA[:100])[7:]
+
+
+def test_counter_overflow():
+    session = SessionKey(CipherClass, TEST_KEY, MODE_CTR).session(
+        b'\xff' * 15 + b'\xfe')
+    session.encrypt(TEST_DATA[:32])
+
+    with pytest.raises(ValueError):
+        session.encrypt(TEST_DATA[:1])
+
+
+def test_nonce_guard():
+    nonceguard.install(capacity=64)
+    try:
+        keys = SessionKey(CipherClass, TEST_KEY, MODE_CTR)
+        keys.session(TEST_IV).encrypt(TEST_DATA[:16])
+        keys.session(TEST_IV).decrypt(TEST_DATA[:16])
+
+        with pytest.raises(NonceReuseError):
+            keys.session(TEST_IV).encrypt(TEST_DATA[:16])
+    finally:
+        nonceguard.uninstall()
+
+    # Uninstalled before the first encryption.
+    session = keys.session(TEST_IV)
+    assert session.encrypt(TEST_DATA[:16]) == \
+        reference(MODE_CTR).encrypt(TEST_DATA[:16])
+
+
+def test_errors():
+    with pytest.raises(ValueError):
+        SessionKey(CipherClass, TEST_KEY, MODE_CBC)
+
+    with pytest.raises(ValueError):
+        SessionKey(CipherClass, TEST_KEY, MODE_OFB).session(TEST_IV[:8])
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+import binascii
+import hashlib
+import hmac
+import functools
+import io
+
+import pytest
+
+from pep272_encryption import MODE_ECB, MODE_CBC, MODE_CFB, MODE_OFB, \
+    MODE_CTR, MODE_GCM, MODE_OCB
+from pep272_encryption import parallel, stream
+from pep272_encryption.stream import EncryptThenMAC, transcrypt
+from pep272_encryption.util import Counter
+
+from test_modes import CipherClass, Identity
+
+
+TEST_KEY = b'0123456789abcdef'
+MAC_KEY = b'authentication key'
+TEST_IV = b'initialization v'
+TEST_NONCE = b'nonce 64'
+TEST_HEADER = b'header: ' + TEST_IV
+TEST_DATA = bytes(bytearray(i % 251 for i in range(5000)))
+
+
+def ctr_cipher():
+    return CipherClass(TEST_KEY, MODE_CTR, counter=Counter(nonce=TEST_NONCE))
+
+
+def new_mac():
+    return hmac.new(MAC_KEY, digestmod='sha256')
+
+
+def two_pass(cipher, data):
+    ciphertext = cipher.encrypt(data)
+    mac = new_mac()
+    mac.update(TEST_HEADER)
+    mac.update(ciphertext)
+    return ciphertext, mac.digest()
+
+
+@pytest.fixture(autouse=True)
+def small_pieces(monkeypatch):
+    monkeypatch.setattr(stream, 'PIECE_SIZE', 1000)
+
+
+@pytest.mark.parametrize("factory", [
+    ctr_cipher,
+    lambda: CipherClass(TEST_KEY, MODE_CBC, TEST_IV),
+    lambda: CipherClass(TEST_KEY, MODE_CFB, TEST_IV, segment_size=24),
+])
+def test_matches_two_passes(factory):
+    data = TEST_DATA[:len(TEST_DATA) // 48 * 48]
+    etm = EncryptThenMAC(factory(), new_mac())
+    etm.update(TEST_HEADER)
+    ciphertext, tag = etm.encrypt_and_digest(data)
+
+    assert (ciphertext, tag) == two_pass(factory(), data)
+    assert etm.hexdigest() == binascii.hexlify(tag).decode()
+
+    etm = EncryptThenMAC(factory(), new_mac)
+    etm.update(TEST_HEADER)
+    assert etm.decrypt_and_verify(ciphertext, tag) == data
+
+
+def test_streaming():
+    ciphertext, tag = two_pass(ctr_cipher(), TEST_DATA)
+    chunks = [TEST_DATA[i:i + 777] for i in range(0, len(TEST_DATA), 777)]
+
+    etm = EncryptThenMAC(ctr_cipher(), new_mac())
+    etm.update(TEST_HEADER)
+    assert b''.join(etm.iterencrypt(chunks)) == ciphertext
+    assert etm.digest() == tag
+
+    chunks = [ciphertext[i:i + 3001] for i in range(0, len(ciphertext), 3001)]
+    etm = EncryptThenMAC(ctr_cipher(), new_mac())
+    etm.update(TEST_HEADER)
+    assert b''.join(etm.iterdecrypt(chunks, tag)) == TEST_DATA
+
+
+def test_tampering():
+    ciphertext, tag = two_pass(ctr_cipher(), TEST_DATA)
+    tampered = bytearray(ciphertext)
+    tampered[1234] ^= 1
+
+    etm = EncryptThenMAC(ctr_cipher(), new_mac())
+    etm.update(TEST_HEADER)
+    with pytest.raises(ValueError, match="MAC check failed"):
+        etm.decrypt_and_verify(bytes(tampered), tag)
+
+    etm = EncryptThenMAC(ctr_cipher(), new_mac())
+    with pytest.raises(ValueError):  # header missing
+        list(etm.iterdecrypt([ciphertext], tag))
+
+
+def test_keyed_hashlib():
+    mac = functools.partial(hashlib.blake2b, key=MAC_KEY, digest_size=32)
+    etm = EncryptThenMAC(ctr_cipher(), mac)
+    ciphertext = etm.encrypt(TEST_DATA)
+    assert etm.digest() == mac(ciphertext).digest()
+    assert etm.digest_size == 32
+
+
+def test_order():
+    etm = EncryptThenMAC(ctr_cipher(), new_mac())
+    etm.encrypt(b'data')
+    with pytest.raises(TypeError):
+        etm.update(b'header')
+
+    etm.digest()
+    with pytest.raises(TypeError):
+        etm.encrypt(b'more data')
+
+    with pytest.raises(TypeError):
+        EncryptThenMAC(CipherClass(TEST_KEY, MODE_GCM, nonce=TEST_IV),
+                       new_mac())
+
+
+def test_unaligned_not_processed():
+    expected = EncryptThenMAC(CipherClass(TEST_KEY, MODE_CBC, TEST_IV),
+                              new_mac())
+    expected.encrypt(TEST_DATA[:4992])
+
+    etm = EncryptThenMAC(CipherClass(TEST_KEY, MODE_CBC, TEST_IV), new_mac())
+    with pytest.raises(ValueError):
+        etm.encrypt(TEST_DATA[:4995])
+
+    etm.encrypt(TEST_DATA[:4992])
+    assert etm.digest() == expected.digest()
+
+
+@pytest.mark.parametrize("factory", [
+    lambda: CipherClass(TEST_KEY, MODE_ECB),
+    lambda: CipherClass(TEST_KEY, MODE_CBC, TEST_IV),
+    lambda: CipherClass(TEST_KEY, MODE_CFB, TEST_IV, segment_size=24),
+])
+def test_streaming_unaligned(factory):
+    data = TEST_DATA[:4992]
+    ciphertext, tag = two_pass(factory(), data)
+    sizes = [10, 22] * (len(data) // 32)
+    offsets = [sum(sizes[:n]) for n in range(len(sizes) + 1)]
+
+    etm = EncryptThenMAC(factory(), new_mac())
+    etm.update(TEST_HEADER)
+    assert b''.join(etm.iterencrypt(
+        data[start:end] for start, end in zip(offsets, offsets[1:]))) \
+        == ciphertext
+    assert etm.digest() == tag
+
+    etm = EncryptThenMAC(factory(), new_mac())
+    etm.update(TEST_HEADER)
+    assert b''.join(etm.iterdecrypt(
+        [ciphertext[start:end] for start, end in zip(offsets, offsets[1:])],
+        tag)) == data
+
+
+class Identity64(Identity):
+    block_size = 8
+
+
+class ShortReads(io.BytesIO):
+    def readinto(self, buffer):
+        return io.BytesIO.readinto(self, memoryview(buffer)[:100])
+
+
+@pytest.mark.parametrize("old, new", [
+    (lambda: CipherClass(TEST_KEY, MODE_CBC, TEST_IV), ctr_cipher),
+    (ctr_cipher, lambda: Identity64(TEST_KEY, MODE_ECB)),
+    (lambda: CipherClass(TEST_KEY, MODE_CFB, TEST_IV, segment_size=24),
+     lambda: Identity64(TEST_KEY, MODE_CBC, TEST_IV[:8])),
+    (lambda: CipherClass(TEST_KEY, MODE_OFB, TEST_IV),
+     lambda: CipherClass(TEST_KEY, MODE_CFB, TEST_IV, segment_size=40)),
+])
+def test_transcrypt(old, new):
+    data = TEST_DATA[:len(TEST_DATA) // 240 * 240]
+    destination = io.BytesIO()
+
+    assert transcrypt(old(), new(), ShortReads(old().encrypt(data)),
+                      destination, chunk_size=1000) == len(data)
+    assert destination.getvalue() == new().encrypt(data)
+
+
+def test_transcrypt_aead():
+    old = CipherClass(TEST_KEY, MODE_GCM, nonce=TEST_IV)
+    ciphertext, tag = old.encrypt_and_digest(TEST_DATA)
+    old = CipherClass(TEST_KEY, MODE_GCM, nonce=TEST_IV)
+    new = CipherClass(TEST_KEY, MODE_OCB, nonce=TEST_NONCE)
+    destination = io.BytesIO()
+
+    transcrypt(old, new, io.BytesIO(ciphertext), destination,
+               chunk_size=999)
+    old.verify(tag)
+
+    expected = CipherClass(TEST_KEY, MODE_OCB, nonce=TEST_NONCE)
+    assert (destination.getvalue(), new.digest()) == \
+        expected.encrypt_and_digest(TEST_DATA)
+
+
+def test_transcrypt_parallel(monkeypatch):
+    monkeypatch.setattr(parallel, 'MIN_SLICE_SIZE', 512)
+    data = TEST_DATA[:4096]
+    old = CipherClass(TEST_KEY, MODE_ECB)
+    destination = io.BytesIO()
+
+    transcrypt(old, ctr_cipher(), io.BytesIO(old.encrypt(data)),
+               destination, workers=4, backend='serial')
+    assert destination.getvalue() == ctr_cipher().encrypt(data)
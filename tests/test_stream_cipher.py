@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+import pickle
+
+import pytest
+
+from pep272_encryption import StreamCipher, MODE_ECB, MODE_CBC
+
+
+TEST_KEY = b'stream key'
+TEST_DATA = bytes(bytearray(i % 251 for i in range(1000)))
+
+
+class CountingStream(StreamCipher):
+    """Keystream of key bytes plus a running position."""
+    calls = 0
+
+    def __init__(self, key, mode=MODE_ECB, **kwargs):
+        self.position = 0
+        StreamCipher.__init__(self, key, mode, **kwargs)
+
+    def keystream(self, length):
+        CountingStream.calls += 1
+        key = bytearray(self.key)
+        out = bytearray((key[(self.position + n) % len(key)] +
+                         self.position + n) % 256 for n in range(length))
+        self.position += length
+        return bytes(out)
+
+
+class Rot(StreamCipher):
+    """Overrides the stream functions instead of the keystream."""
+
+    def encrypt_stream(self, data):
+        return bytes(bytearray((b + 1) % 256 for b in bytearray(data)))
+
+    def decrypt_stream(self, data):
+        return bytes(bytearray((b - 1) % 256 for b in bytearray(data)))
+
+
+def test_whole_buffer():
+    CountingStream.calls = 0
+    ciphertext = CountingStream(TEST_KEY).encrypt(TEST_DATA)
+    assert CountingStream.calls == 1
+
+    cipher = CountingStream(TEST_KEY)
+    assert cipher.encrypt(TEST_DATA[:333]) + cipher.encrypt(TEST_DATA[333:]) \
+        == ciphertext
+    assert CountingStream(TEST_KEY).decrypt(ciphertext) == TEST_DATA
+
+    # Same as the single byte block function.
+    cipher = CountingStream(TEST_KEY)
+    assert b"".join(cipher.encrypt_block(TEST_KEY, TEST_DATA[i:i + 1])
+                    for i in range(len(TEST_DATA))) == ciphertext
+
+
+def test_into_and_iter():
+    expected = CountingStream(TEST_KEY).encrypt(TEST_DATA)
+
+    out = bytearray(len(TEST_DATA))
+    assert CountingStream(TEST_KEY).encrypt_into(TEST_DATA, out) == \
+        len(TEST_DATA)
+    assert bytes(out) == expected
+
+    chunks = (TEST_DATA[i:i + 7] for i in range(0, len(TEST_DATA), 7))
+    assert b"".join(CountingStream(TEST_KEY).iterencrypt(chunks)) == expected
+
+
+def test_stream_functions():
+    assert Rot(TEST_KEY, MODE_ECB).encrypt(b'abc') == b'bcd'
+    assert Rot(TEST_KEY, MODE_ECB).decrypt(b'bcd') == b'abc'
+
+    with pytest.raises(NotImplementedError):
+        StreamCipher(TEST_KEY, MODE_ECB).encrypt(b'abc')
+
+
+def test_pickle():
+    cipher = CountingStream(TEST_KEY)
+    head = cipher.encrypt(TEST_DATA[:100])
+    restored = pickle.loads(pickle.dumps(cipher))
+
+    assert head + restored.encrypt(TEST_DATA[100:]) == \
+        CountingStream(TEST_KEY).encrypt(TEST_DATA)
+
+
+def test_errors():
+    with pytest.raises(ValueError):
+        CountingStream(TEST_KEY, MODE_CBC, IV=b'x')
+
+    with pytest.raises(TypeError):
+        CountingStream(TEST_KEY, block_cache=8)